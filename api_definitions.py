@@ -1,15 +1,29 @@
 import logging
 from copy import deepcopy
-from flask import current_app, jsonify, request
+from datetime import datetime
+from typing import Dict
+import os
+from flask import current_app, jsonify, request, send_file
 from flask_restx import Resource, fields, Api
 from model import Client, ClientTypes
 from auth import auth_lib_helper
+from client_index import client_index
+from client_sync import client_sync
 from keycloak_api_client.keycloak import keycloak_client
+from reconcile import apply_plan, describe_plan, plan_reconciliation, summarize_plan
+from rotation_jobs import rotation_jobs
+from snapshot import snapshots
 from utils import (
-    KeycloakAPIError, ResourceNotFoundError,
+    ClientDefinitionError, KeycloakAPIError, RateLimiter, ResourceNotFoundError, UserDefinitionError,
+    decode_cursor,
+    encode_cursor,
     get_request_data,
+    get_request_items,
     is_xml,
+    json_array_response,
     json_response,
+    ndjson_response,
+    run_concurrently,
     validate_protocol,
     validate_protocol_data,
 )
@@ -25,6 +39,7 @@ api = Api(
 
 ns = api.namespace("client", description="Client operations")
 user_ns = api.namespace("user", description="Methods for handling user operations")
+bulk_ns = api.namespace("bulk", description="Operations on many clients or users at once")
 
 # Models
 model = ns.model("Client", {"clientId": fields.String}, required=False)
@@ -61,9 +76,7 @@ class TokenExchangePermissions(Resource):
     @auth_lib_helper.oidc_validate_api
     def put(self, target_client_id, requestor_client_id):
         """Grants token exchange permissions"""
-
-        target_client = keycloak_client.get_client_object(target_client_id)
-        requestor_client = keycloak_client.get_client_object(requestor_client_id)
+        target_client, requestor_client = self.__get_clients(target_client_id, requestor_client_id)
 
         verify_error = self.__verify_clients(
             target_client, requestor_client, target_client_id, requestor_client_id
@@ -74,6 +87,8 @@ class TokenExchangePermissions(Resource):
         ret = keycloak_client.grant_token_exchange_permissions(
             target_client, requestor_client
         )
+        if ret is None:
+            return "Already granted", 200
         if ret.status_code == 200 or ret.status_code == 201:
             return ret.reason, 200
         else:
@@ -82,8 +97,7 @@ class TokenExchangePermissions(Resource):
     @auth_lib_helper.oidc_validate_api
     def delete(self, target_client_id, requestor_client_id):
         """Revokes token exchange permissions"""
-        target_client = keycloak_client.get_client_object(target_client_id)
-        requestor_client = keycloak_client.get_client_object(requestor_client_id)
+        target_client, requestor_client = self.__get_clients(target_client_id, requestor_client_id)
 
         verify_error = self.__verify_clients(
             target_client, requestor_client, target_client_id, requestor_client_id
@@ -102,6 +116,25 @@ class TokenExchangePermissions(Resource):
         else:
             return ret.reason, 400
 
+    def __get_clients(self, target_client_id, requestor_client_id):
+        """
+        Looks up the target and requestor client objects concurrently
+        """
+        app = current_app._get_current_object()
+
+        def get_client(client_id):
+            with app.app_context():
+                return keycloak_client.get_client_object(client_id)
+
+        clients = {}
+        for client_id, client, error in run_concurrently(
+            get_client, [target_client_id, requestor_client_id], 2
+        ):
+            if error is not None:
+                raise error
+            clients[client_id] = client
+        return clients[target_client_id], clients[requestor_client_id]
+
     def __verify_clients(
         self, target_client, requestor_client, target_client_name, requestor_client_name
     ):
@@ -128,6 +161,57 @@ class Scopes(Resource):
             return json_response("Cannot get scopes", 400)
 
 
+@ns.route("/search")
+class ClientSearch(Resource):
+    @ns.doc(
+        params={
+            "clientId": "Exact clientId",
+            "prefix": "Beginning of the clientId",
+            "redirectHost": "Host of one of the redirect URIs, e.g. 'app.cern.ch' or '*.cern.ch'",
+            "attribute": "Attribute as 'key=value', or 'key' for any value. Can be repeated",
+            "limit": "Maximum number of clients returned",
+        }
+    )
+    @auth_lib_helper.oidc_validate_api
+    def get(self):
+        """
+        Search the clients matching all the given criteria, in an index kept by the adapter
+        Changes made to the clients outside of the adapter can take up to CLIENT_INDEX_MAX_AGE seconds to show.
+        """
+        max_limit = current_app.config["CLIENT_MAX_PAGE_SIZE"]
+        limit = request.args.get("limit", current_app.config["CLIENT_PAGE_SIZE"], type=int)
+        if limit < 1 or limit > max_limit:
+            return json_response(f"'limit' must be between 1 and {max_limit}", 400)
+        attributes = [
+            tuple(attribute.split("=", 1)) if "=" in attribute else (attribute, None)
+            for attribute in request.args.getlist("attribute")
+        ]
+        criteria = {
+            "client_id": request.args.get("clientId"),
+            "prefix": request.args.get("prefix"),
+            "redirect_host": request.args.get("redirectHost"),
+        }
+        if not attributes and all(value is None for value in criteria.values()):
+            return json_response(
+                "At least one of 'clientId', 'prefix', 'redirectHost' or 'attribute' is required", 400
+            )
+        try:
+            return json_response(client_index.search(attributes=attributes, limit=limit, **criteria))
+        except KeycloakAPIError as e:
+            logging.error(f"Error indexing clients: {e}")
+            return json_response(f"Error indexing clients: {e.message}", e.status_code)
+
+
+@ns.route("/search/status")
+class ClientSearchStatus(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def get(self):
+        """
+        Get the size of the client search index, and the lag and event throughput of its sync from the admin events
+        """
+        return json_response(client_sync.status())
+
+
 @ns.route("/<path:client_id>/default-scopes")
 class DefaultClientScopes(Resource):
     @auth_lib_helper.oidc_validate_api
@@ -183,7 +267,7 @@ class ClientDetails(Resource):
     @ns.doc(body=model)
     @auth_lib_helper.oidc_validate_api
     def put(self, protocol, client_id):
-        """Update a client"""
+        """Update a client. The X-Client-Changed header is false if the client already matched the request."""
         data = get_request_data(request)
         if protocol == "saml":
             client_type = ClientTypes.SAML
@@ -196,7 +280,10 @@ class ClientDetails(Resource):
         updated_client = keycloak_client.update_client_properties(
             client_id, client, client_type=client_type)
         if updated_client:
-            return jsonify(updated_client.definition)
+            response = jsonify(updated_client.definition)
+            if updated_client.changed is not None:
+                response.headers["X-Client-Changed"] = str(updated_client.changed).lower()
+            return response
         else:
             return json_response(
                 "Cannot update '{0}' properties. Check if client exists or properties are valid".format(
@@ -253,41 +340,52 @@ class CommonCreator(Resource):
         self.protocol_mappers = current_app.config["CLIENT_DEFAULTS"]
         self.auth_protocols = current_app.config["AUTH_PROTOCOLS"]
 
-    def common_create(self, data):
+    def build_client(self, data) -> Client:
         """
-        Common create method for all the endpoints
+        Builds the client to create from the request data
+        Raises ClientDefinitionError if the data is not a valid client definition
         """
-
         protocol = data["protocol"]
         selected_protocol_definition_key = deepcopy(self.auth_protocols[protocol])
-        client_type = ClientTypes.OIDC
-
-        if selected_protocol_definition_key in data:
-            if is_xml(data[selected_protocol_definition_key]):
-                # If data looks like XML then this is SAML, use the client description converter to create client
-                client_description = keycloak_client.client_description_converter(
-                    data[selected_protocol_definition_key]
-                )
-                data.pop(selected_protocol_definition_key)
-                client_type = ClientTypes.SAML
-                client = Client(client_description, ClientTypes.SAML)
 
-            elif protocol == ClientTypes.OIDC:
-                client = Client(data, ClientTypes.OIDC)
-            else:
-                return json_response("Unsupported client protocol '{}' or bad definition".format(protocol), 400)
-        else:
-            return json_response(
+        if selected_protocol_definition_key not in data:
+            raise ClientDefinitionError(
                 "The request is missing '{}'. It must be passed as a json field".format(
                     selected_protocol_definition_key
-                ),
-                400,
+                )
+            )
+        if is_xml(data[selected_protocol_definition_key]):
+            # If data looks like XML then this is SAML, use the client description converter to create client
+            client_description = keycloak_client.client_description_converter(
+                data[selected_protocol_definition_key]
             )
+            data.pop(selected_protocol_definition_key)
+            return Client(client_description, ClientTypes.SAML)
+        elif protocol == ClientTypes.OIDC:
+            return Client(data, ClientTypes.OIDC)
+        raise ClientDefinitionError(
+            "Unsupported client protocol '{}' or bad definition".format(protocol)
+        )
+
+    def create_client(self, client: Client) -> Dict:
+        """
+        Merges the client with the defaults and creates it
+        Returns: the definition of the new client
+        """
+        client.merge_definition_and_defaults()
+        new_client_response = keycloak_client.create_new_client(client)
+        return Client(new_client_response, client.type).definition
+
+    def common_create(self, data):
+        """
+        Common create method for all the endpoints
+        """
         try:
-            client.merge_definition_and_defaults()
-            new_client_response = keycloak_client.create_new_client(client)
-            new_client = Client(new_client_response, client_type)
-            return jsonify(new_client.definition)
+            client = self.build_client(data)
+        except ClientDefinitionError as e:
+            return json_response(str(e), 400)
+        try:
+            return jsonify(self.create_client(client))
         except KeycloakAPIError as e:
             logging.error(f"Error creating new client: {e}")
             return json_response(
@@ -315,6 +413,57 @@ class CreatorDetails(CommonCreator):
 
 @ns.route("/")
 class Creator(CommonCreator):
+    @ns.doc(
+        params={
+            "cursor": "Cursor of the page, as returned in 'nextCursor'. First page if not given",
+            "pageSize": "Number of clients in the page",
+            "stream": "Stream all the clients from the cursor, as 'json' (a JSON array) or 'ndjson'",
+        }
+    )
+    @auth_lib_helper.oidc_validate_api
+    def get(self):
+        """
+        List the clients of the realm, one page at a time, or streamed
+        Note that clients created or deleted while paging can shift the following pages.
+        """
+        max_page_size = current_app.config["CLIENT_MAX_PAGE_SIZE"]
+        page_size = request.args.get("pageSize", current_app.config["CLIENT_PAGE_SIZE"], type=int)
+        if page_size < 1 or page_size > max_page_size:
+            return json_response(f"'pageSize' must be between 1 and {max_page_size}", 400)
+        first = self.__get_first(request.args.get("cursor"))
+        if first is None:
+            return json_response("Invalid cursor", 400)
+        stream = request.args.get("stream")
+        if stream not in [None, "json", "ndjson"]:
+            return json_response("'stream' must be 'json' or 'ndjson'", 400)
+
+        if stream:
+            clients = keycloak_client.iter_clients(page_size, prefetch=True, first=first)
+            if stream == "ndjson":
+                return ndjson_response(clients)
+            return json_array_response(clients)
+
+        try:
+            page = keycloak_client.get_clients_page(first, page_size)
+        except KeycloakAPIError as e:
+            logging.error(f"Error listing clients: {e}")
+            return json_response(f"Error listing clients: {e.message}", e.status_code)
+        next_cursor = encode_cursor({"first": first + page_size}) if len(page) == page_size else None
+        return json_response({"clients": page, "nextCursor": next_cursor})
+
+    @staticmethod
+    def __get_first(cursor):
+        """
+        Returns the index of the first client of the page of the cursor, None if the cursor is not valid
+        """
+        if cursor is None:
+            return 0
+        try:
+            first = decode_cursor(cursor)["first"]
+        except (ValueError, TypeError, KeyError):
+            return None
+        return first if isinstance(first, int) and first >= 0 else None
+
     @ns.doc(body=model)
     @auth_lib_helper.oidc_validate_api
     def post(self):
@@ -325,6 +474,677 @@ class Creator(CommonCreator):
         return self.common_create(data)
 
 
+def bulk_error(error, action):
+    """
+    Converts an exception raised while processing a bulk item into the item's status and error
+    action: what was being done, e.g. "creating client"
+    """
+    if isinstance(error, (ClientDefinitionError, UserDefinitionError)):
+        return {"status": 400, "error": str(error)}
+    elif isinstance(error, ResourceNotFoundError):
+        return {"status": 404, "error": str(error)}
+    elif isinstance(error, KeycloakAPIError):
+        logging.error(f"Error {action}: {error}")
+        return {"status": error.status_code, "error": f"Error {action}: {error.message}"}
+    logging.error(f"Unknown error {action}: {error!r}")
+    return {"status": 500, "error": f"Unknown error {action}"}
+
+
+@bulk_ns.route("/clients")
+class BulkCreator(CommonCreator):
+    @bulk_ns.expect([model])
+    @bulk_ns.doc(params={"concurrency": "Number of clients created at the same time"})
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Create many clients, sent as a JSON array or as newline delimited JSON (application/x-ndjson).
+        The result of every client is streamed back as a line of JSON as soon as it is created.
+        """
+        items = get_request_items(request)
+        if items is None:
+            return json_response(
+                "The request must be a JSON array or newline delimited JSON of client definitions", 400
+            )
+        app = current_app._get_current_object()
+        max_workers = current_app.config["BULK_MAX_WORKERS"]
+        concurrency = min(request.args.get("concurrency", max_workers, type=int), max_workers)
+
+        def create(indexed_item):
+            _, data = indexed_item
+            with app.app_context():
+                if not isinstance(data, dict):
+                    raise ClientDefinitionError("Invalid client definition")
+                validation_error = self.validate_item(data)
+                if validation_error:
+                    raise ClientDefinitionError(validation_error)
+                return self.create_client(self.build_client(data))
+
+        def results():
+            for (index, data), created, error in run_concurrently(
+                create, enumerate(items), max(concurrency, 1)
+            ):
+                result = {"index": index}
+                if isinstance(data, dict):
+                    result["clientId"] = data.get("clientId")
+                if error is None:
+                    result.update(status=200, clientId=created.get("clientId"), client=created)
+                else:
+                    result.update(bulk_error(error, "creating client"))
+                yield result
+
+        return ndjson_response(results())
+
+    @bulk_ns.doc(body=[fields.String], params={"concurrency": "Number of clients deleted at the same time"})
+    @auth_lib_helper.oidc_validate_api
+    def delete(self):
+        """
+        Delete many clients, by clientId, sent as a JSON array or as newline delimited JSON.
+        The result of every client is streamed back as a line of JSON as soon as it is deleted.
+        """
+        client_ids = get_request_items(request)
+        if client_ids is None:
+            return json_response(
+                "The request must be a JSON array or newline delimited JSON of clientIds", 400
+            )
+        max_workers = current_app.config["BULK_MAX_WORKERS"]
+        concurrency = min(request.args.get("concurrency", max_workers, type=int), max_workers)
+        rate_limiter = RateLimiter(current_app.config["BULK_RATE_LIMIT"])
+        first_indexes = {}
+        for index, client_id in enumerate(client_ids):
+            if isinstance(client_id, str):
+                first_indexes.setdefault(client_id, index)
+        try:
+            # A single listing instead of a search per client
+            clientids = {
+                client["clientId"]: client["id"] for client in keycloak_client.stream_all_clients()
+            }
+        except KeycloakAPIError as e:
+            logging.error(f"Error listing clients: {e}")
+            return json_response(f"Error listing clients: {e.message}", e.status_code)
+
+        def delete(indexed_client_id):
+            index, client_id = indexed_client_id
+            self.validate_deletion(index, client_id, first_indexes, clientids)
+            rate_limiter.wait()
+            keycloak_client.delete_client_by_id(clientids[client_id])
+
+        def results():
+            for (index, client_id), _, error in run_concurrently(
+                delete, enumerate(client_ids), max(concurrency, 1)
+            ):
+                result = {"index": index, "clientId": client_id}
+                if error is None:
+                    result["status"] = 200
+                else:
+                    result.update(bulk_error(error, "deleting client"))
+                yield result
+
+        return ndjson_response(results())
+
+    @staticmethod
+    def validate_deletion(index, client_id, first_indexes, clientids):
+        """
+        Validates the clientId of a bulk deletion item
+        first_indexes: the index of the first occurrence of every clientId
+        clientids: the IDs of the existing clients, by clientId
+        """
+        if not isinstance(client_id, str):
+            raise ClientDefinitionError("Invalid clientId")
+        if first_indexes[client_id] != index:
+            raise ClientDefinitionError("Duplicate clientId '{}'".format(client_id))
+        if client_id not in clientids:
+            raise ResourceNotFoundError("Client '{}' not found".format(client_id))
+
+    def build_clients(self, items, action):
+        """
+        Builds the clients of a bulk request and merges them with the defaults. The SAML definitions
+        are converted by Keycloak, so the clients are built concurrently.
+        action: what the clients are built for, e.g. "importing client"
+        Returns: the (index, client) pairs, and the results of the invalid or duplicate items, in order
+        """
+        app = current_app._get_current_object()
+
+        def build(indexed_item):
+            _, data = indexed_item
+            with app.app_context():
+                if not isinstance(data, dict):
+                    raise ClientDefinitionError("Invalid client definition")
+                validation_error = self.validate_item(data)
+                if validation_error:
+                    raise ClientDefinitionError(validation_error)
+                client = self.build_client(data)
+                client.merge_definition_and_defaults()
+                return client
+
+        built = sorted(
+            run_concurrently(build, enumerate(items), current_app.config["BULK_MAX_WORKERS"]),
+            key=lambda outcome: outcome[0][0],
+        )
+        clients = []
+        errors = []
+        client_ids = set()
+        for (index, data), client, error in built:
+            if error is None and client.definition["clientId"] in client_ids:
+                error = ClientDefinitionError(
+                    "Duplicate clientId '{}'".format(client.definition["clientId"])
+                )
+            if error is None:
+                client_ids.add(client.definition["clientId"])
+                clients.append((index, client))
+                continue
+            result = {"index": index}
+            if isinstance(data, dict):
+                result["clientId"] = data.get("clientId")
+            result.update(bulk_error(error, action))
+            errors.append(result)
+        return clients, errors
+
+    def validate_item(self, data):
+        """
+        Checks the protocol of a bulk item, returns an error message if it is not valid
+        """
+        if "protocol" not in data:
+            return "The client definition is missing 'protocol'"
+        if data["protocol"] not in self.auth_protocols:
+            return "The protocol is invalid. Accepted protocols: {}".format(
+                str(self.auth_protocols)
+            )
+
+
+@bulk_ns.route("/clients/import")
+class BulkImporter(BulkCreator):
+    IF_RESOURCE_EXISTS = ["FAIL", "SKIP", "OVERWRITE"]
+
+    @bulk_ns.expect([model])
+    @bulk_ns.doc(
+        params={
+            "chunkSize": "Number of clients sent to Keycloak in a single import",
+            "ifResourceExists": "What to do with existing clients: FAIL, SKIP (default) or OVERWRITE",
+        }
+    )
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Import many clients with Keycloak partial imports, sent as a JSON array or as newline delimited JSON.
+        Much faster than creating them one by one. OVERWRITE recreates the existing clients, with new IDs.
+        The result of every client is streamed back as a line of JSON once its chunk is imported.
+        """
+        items = get_request_items(request)
+        if items is None:
+            return json_response(
+                "The request must be a JSON array or newline delimited JSON of client definitions", 400
+            )
+        if_resource_exists = request.args.get("ifResourceExists", "SKIP").upper()
+        if if_resource_exists not in self.IF_RESOURCE_EXISTS:
+            return json_response(
+                "Invalid ifResourceExists. Accepted values: {}".format(self.IF_RESOURCE_EXISTS), 400
+            )
+        max_chunk_size = current_app.config["BULK_IMPORT_CHUNK_SIZE"]
+        chunk_size = max(min(request.args.get("chunkSize", max_chunk_size, type=int), max_chunk_size), 1)
+        # The imported clients are completed on worker threads
+        app = current_app._get_current_object()
+
+        def results():
+            clients, errors = self.build_clients(items, "importing client")
+            yield from errors
+
+            for start in range(0, len(clients), chunk_size):
+                chunk = clients[start:start + chunk_size]
+                try:
+                    imported = keycloak_client.import_clients(
+                        [client for _, client in chunk], if_resource_exists, app=app
+                    )
+                except Exception as e:
+                    imported = [(None, e)] * len(chunk)
+                for (index, client), (imported_client, error) in zip(chunk, imported):
+                    result = {"index": index, "clientId": client.definition["clientId"]}
+                    if error is None:
+                        result.update(status=200, **imported_client)
+                    else:
+                        result.update(bulk_error(error, "importing client"))
+                    yield result
+
+        return ndjson_response(results())
+
+
+@bulk_ns.route("/clients/reconcile")
+class BulkReconciler(BulkCreator):
+    @bulk_ns.expect([model])
+    @bulk_ns.doc(
+        params={
+            "dryRun": "Only return the plan, without applying it",
+            "prune": "Also delete the clients that are not in the request, except Keycloak's built-in ones",
+            "source": "Where the current clients are read from: 'listing' (default) or 'mirror', the client index",
+            "concurrency": "Number of clients changed at the same time",
+        }
+    )
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Reconcile the clients with the desired definitions, sent as a JSON array or as newline delimited JSON.
+        Only the creations, updates, default scope changes and deletions needed are planned and applied.
+        The result of every action is streamed back as a line of JSON, then a summary line.
+        Note that the protocol mappers and optional scopes of the existing clients are not reconciled.
+        """
+        items = get_request_items(request)
+        if items is None:
+            return json_response(
+                "The request must be a JSON array or newline delimited JSON of client definitions", 400
+            )
+        source = request.args.get("source", "listing")
+        if source not in ["listing", "mirror"]:
+            return json_response("'source' must be 'listing' or 'mirror'", 400)
+        dry_run = request.args.get("dryRun", "false").lower() == "true"
+        prune = request.args.get("prune", "false").lower() == "true"
+        max_workers = current_app.config["BULK_MAX_WORKERS"]
+        concurrency = min(request.args.get("concurrency", max_workers, type=int), max_workers)
+
+        clients, errors = self.build_clients(items, "building client")
+        if errors:
+            # The desired state must be complete, otherwise valid clients could be pruned
+            return json_response(errors, 400)
+        try:
+            if source == "listing":
+                current_clients = keycloak_client.stream_all_clients()
+            else:
+                current_clients = client_index.get_clients(fresh=True)
+            plan = plan_reconciliation([client for _, client in clients], current_clients, prune)
+        except KeycloakAPIError as e:
+            logging.error(f"Error listing clients: {e}")
+            return json_response(f"Error listing clients: {e.message}", e.status_code)
+        logging.info(f"Client reconciliation plan: {summarize_plan(plan)}")
+        if dry_run:
+            return json_response({"plan": describe_plan(plan), "summary": summarize_plan(plan)})
+        return ndjson_response(self.apply_results(plan, max(concurrency, 1)))
+
+    def apply_results(self, plan, concurrency):
+        """
+        Applies the plan, and yields the result of every action, then a summary
+        """
+        failed = 0
+        for action, error in apply_plan(
+            plan, self.create_client, concurrency, current_app.config["BULK_RATE_LIMIT"]
+        ):
+            result = {"clientId": action["clientId"], "action": action["action"]}
+            if error is None:
+                result["status"] = 200
+            else:
+                failed += 1
+                result.update(bulk_error(error, f"reconciling client ({action['action']})"))
+            yield result
+        yield {"summary": dict(summarize_plan(plan), failed=failed)}
+
+
+@bulk_ns.route("/default-scopes/<path:scope_name>")
+class BulkDefaultClientScopes(Resource):
+    KEYCLOAK_PROTOCOLS = {ClientTypes.OIDC: "openid-connect", ClientTypes.SAML: "saml"}
+
+    @bulk_ns.doc(
+        description="The body selects the clients: {\"all\": true}, {\"protocol\": \"openid\"} "
+        "or {\"clientIds\": [...]}",
+        params={"concurrency": "Number of clients updated at the same time"},
+    )
+    @auth_lib_helper.oidc_validate_api
+    def put(self, scope_name):
+        """Add a default client scope to the selected clients that do not have it yet"""
+        return self.rollout(scope_name, "put")
+
+    @bulk_ns.doc(
+        description="The body selects the clients: {\"all\": true}, {\"protocol\": \"openid\"} "
+        "or {\"clientIds\": [...]}",
+        params={"concurrency": "Number of clients updated at the same time"},
+    )
+    @auth_lib_helper.oidc_validate_api
+    def delete(self, scope_name):
+        """Delete a default client scope from the selected clients that have it"""
+        return self.rollout(scope_name, "delete")
+
+    def select_clients(self, selector, clients, scope):
+        """
+        Selects the clients of the scope's protocol
+        Returns: the selected clients, and the results of the requested clientIds that cannot be selected
+        """
+        if "clientIds" not in selector:
+            protocol = self.KEYCLOAK_PROTOCOLS.get(selector.get("protocol"))
+            selected = [
+                client
+                for client in clients
+                if protocol in (None, client["protocol"])
+                and client["protocol"] == scope.get("protocol", client["protocol"])
+            ]
+            return selected, []
+        clients_by_client_id = {client["clientId"]: client for client in clients}
+        selected = []
+        errors = []
+        for client_id in dict.fromkeys(selector["clientIds"]):
+            client = clients_by_client_id.get(client_id)
+            if client is None:
+                errors.append({"clientId": client_id, "status": 404, "error": f"Client '{client_id}' not found"})
+            elif client["protocol"] != scope.get("protocol", client["protocol"]):
+                errors.append(
+                    {
+                        "clientId": client_id,
+                        "status": 400,
+                        "error": f"Scope '{scope['name']}' is not a {client['protocol']} scope",
+                    }
+                )
+            else:
+                selected.append(client)
+        return selected, errors
+
+    def rollout(self, scope_name, request_type):
+        """
+        Adds ("put") or deletes ("delete") the scope on the selected clients that need it, concurrently.
+        Streams a line of JSON per changed client, with the progress, then a summary line.
+        """
+        selector = get_request_data(request)
+        selector_error = self.validate_selector(selector)
+        if selector_error:
+            return json_response(selector_error, 400)
+        try:
+            scope = next((x for x in keycloak_client.get_scopes() if x["name"] == scope_name), None)
+            if scope is None:
+                return json_response(f"Scope '{scope_name}' not found", 404)
+            # The listing includes the default scopes of every client. Only keep what is needed of it.
+            clients = [
+                {key: client.get(key) for key in ["id", "clientId", "protocol", "defaultClientScopes"]}
+                for client in keycloak_client.stream_all_clients()
+            ]
+        except KeycloakAPIError as e:
+            logging.error(f"Error listing clients and scopes: {e}")
+            return json_response(f"Error listing clients and scopes: {e.message}", e.status_code)
+
+        selected, errors = self.select_clients(selector, clients, scope)
+
+        add = request_type == "put"
+        to_change = [
+            client for client in selected
+            if (scope_name in (client["defaultClientScopes"] or [])) != add
+        ]
+        max_workers = current_app.config["BULK_MAX_WORKERS"]
+        concurrency = min(request.args.get("concurrency", max_workers, type=int), max_workers)
+        rate_limiter = RateLimiter(current_app.config["BULK_RATE_LIMIT"])
+        logging.info(
+            f"{'Adding' if add else 'Deleting'} default scope '{scope_name}': "
+            f"{len(to_change)} of {len(selected)} selected clients to change"
+        )
+
+        def apply(client):
+            rate_limiter.wait()
+            keycloak_client.set_client_default_scope(client["id"], scope["id"], request_type)
+
+        def results():
+            yield from errors
+            failed = 0
+            for done, (client, _, error) in enumerate(
+                run_concurrently(apply, to_change, max(concurrency, 1)), 1
+            ):
+                result = {
+                    "clientId": client["clientId"],
+                    "action": "added" if add else "deleted",
+                    "progress": {"done": done, "total": len(to_change)},
+                }
+                if error is None:
+                    result["status"] = 200
+                else:
+                    failed += 1
+                    result.update(bulk_error(error, "updating client scopes"))
+                yield result
+            yield {
+                "summary": {
+                    "scope": scope_name,
+                    "selected": len(selected),
+                    "unchanged": len(selected) - len(to_change),
+                    "changed": len(to_change) - failed,
+                    "failed": failed + len(errors),
+                }
+            }
+
+        return ndjson_response(results())
+
+    def validate_selector(self, selector):
+        """
+        Checks the client selector, returns an error message if it is not valid
+        """
+        if not isinstance(selector, dict) or len(selector) != 1 or not (
+            selector.get("all") is True
+            or selector.get("protocol") in self.KEYCLOAK_PROTOCOLS
+            or (
+                isinstance(selector.get("clientIds"), list)
+                and all(isinstance(client_id, str) for client_id in selector["clientIds"])
+            )
+        ):
+            return (
+                "Select the clients with exactly one of: {\"all\": true}, "
+                "{\"protocol\": \"openid\" or \"saml\"} or {\"clientIds\": [...]}"
+            )
+
+
+@bulk_ns.route("/token-exchange-permissions")
+class BulkTokenExchangePermissions(Resource):
+    @bulk_ns.doc(description="The body is a list of {\"target\": clientId, \"requestor\": clientId}")
+    @auth_lib_helper.oidc_validate_api
+    def put(self):
+        """Grants token exchange permissions for many target and requestor clients"""
+        return self.update_permissions(grant=True)
+
+    @bulk_ns.doc(description="The body is a list of {\"target\": clientId, \"requestor\": clientId}")
+    @auth_lib_helper.oidc_validate_api
+    def delete(self):
+        """Revokes token exchange permissions for many target and requestor clients"""
+        return self.update_permissions(grant=False)
+
+    def update_permissions(self, grant):
+        """
+        Grants or revokes the permissions of the requested pairs, returns the result of every pair
+        """
+        items = request.get_json(silent=True)
+        if not isinstance(items, list) or not all(
+            isinstance(item, dict)
+            and isinstance(item.get("target"), str)
+            and isinstance(item.get("requestor"), str)
+            for item in items
+        ):
+            return json_response(
+                "The request must be a JSON array of {\"target\": clientId, \"requestor\": clientId}", 400
+            )
+        pairs = [(item["target"], item["requestor"]) for item in items]
+        action = "granting" if grant else "revoking"
+        try:
+            errors = keycloak_client.bulk_update_token_exchange_permissions(pairs, grant)
+        except KeycloakAPIError as e:
+            logging.error(f"Error {action} token exchange permissions: {e}")
+            return json_response(
+                f"Error {action} token exchange permissions: {e.message}", e.status_code
+            )
+        results = []
+        for target, requestor in pairs:
+            result = {"target": target, "requestor": requestor, "status": 200}
+            error = errors[(target, requestor)]
+            if error is not None:
+                result.update(bulk_error(error, f"{action} token exchange permissions"))
+            results.append(result)
+        return json_response(results)
+
+
+def rotation_job_data(job):
+    """
+    The status of a secret rotation job, without its list of clients
+    """
+    return {key: value for key, value in job.items() if key != "clients"}
+
+
+@bulk_ns.route("/secret-rotations")
+class SecretRotations(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def get(self):
+        """List the client secret rotation jobs"""
+        return json_response([rotation_job_data(job) for job in rotation_jobs.list_jobs()])
+
+    @bulk_ns.doc(
+        description="The body selects the OpenID clients, with {\"all\": true} or {\"clientIds\": [...]}. "
+        "Optionally: \"batchSize\", \"batchInterval\" (seconds) and \"startAt\" (ISO 8601, UTC by default)"
+    )
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Start a job rotating the secrets of many confidential OpenID clients, in staggered batches
+        """
+        data = get_request_data(request)
+        error = self.validate_job(data)
+        if error:
+            return json_response(error, 400)
+        try:
+            clients = rotation_jobs.select_clients(data.get("clientIds"))
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+        except KeycloakAPIError as e:
+            logging.error(f"Error listing clients: {e}")
+            return json_response(f"Error listing clients: {e.message}", e.status_code)
+        job = rotation_jobs.create_job(
+            clients,
+            data.get("batchSize"),
+            data.get("batchInterval"),
+            datetime.fromisoformat(data["startAt"]) if data.get("startAt") else None,
+        )
+        return json_response(rotation_job_data(job), 202)
+
+    def validate_job(self, data):
+        """
+        Checks the job definition, returns an error message if it is not valid
+        """
+        if ("all" in data) == ("clientIds" in data) or not (
+            data.get("all") is True
+            or (
+                isinstance(data.get("clientIds"), list)
+                and all(isinstance(client_id, str) for client_id in data["clientIds"])
+            )
+        ):
+            return "Select the clients with exactly one of: {\"all\": true} or {\"clientIds\": [...]}"
+        if "batchSize" in data and (not isinstance(data["batchSize"], int) or data["batchSize"] < 1):
+            return "'batchSize' must be a positive integer"
+        if "batchInterval" in data and (
+            not isinstance(data["batchInterval"], (int, float)) or data["batchInterval"] < 0
+        ):
+            return "'batchInterval' must be a positive number of seconds"
+        if data.get("startAt"):
+            try:
+                datetime.fromisoformat(data["startAt"])
+            except (TypeError, ValueError):
+                return "'startAt' must be an ISO 8601 date and time"
+
+
+@bulk_ns.route("/secret-rotations/<string:job_id>")
+class SecretRotationDetails(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def get(self, job_id):
+        """Get the progress of a client secret rotation job"""
+        try:
+            return json_response(rotation_job_data(rotation_jobs.get_job(job_id)))
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+
+
+@bulk_ns.route("/secret-rotations/<string:job_id>/pause")
+class SecretRotationPause(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def post(self, job_id):
+        """Pause a client secret rotation job before its next batch"""
+        try:
+            return json_response(rotation_job_data(rotation_jobs.pause(job_id)), 202)
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+
+
+@bulk_ns.route("/secret-rotations/<string:job_id>/resume")
+class SecretRotationResume(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def post(self, job_id):
+        """Resume a paused or failed client secret rotation job from its last completed batch"""
+        try:
+            return json_response(rotation_job_data(rotation_jobs.resume(job_id)), 202)
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+
+
+@bulk_ns.route("/snapshots")
+class SnapshotExports(Resource):
+    @bulk_ns.doc(params={"includeSecrets": "Also export the client secrets and private keys"})
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Start exporting a snapshot of the realm's clients, client scopes, client policies and
+        token-exchange permissions, as gzip-compressed NDJSON files
+        """
+        include_secrets = request.args.get("includeSecrets", "false").lower() == "true"
+        return json_response({"id": snapshots.start_export(include_secrets=include_secrets)}, 202)
+
+
+@bulk_ns.route("/snapshots/<string:snapshot_id>")
+class SnapshotDetails(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def get(self, snapshot_id):
+        """Get the manifest of a snapshot, with the progress, counts and timings of every resource"""
+        try:
+            return json_response(snapshots.get_manifest(snapshot_id))
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+
+
+@bulk_ns.route("/snapshots/<string:snapshot_id>/resume")
+class SnapshotResume(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def post(self, snapshot_id):
+        """Resume an interrupted snapshot export from its last exported page"""
+        try:
+            return json_response({"id": snapshots.start_export(snapshot_id)}, 202)
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+
+
+@bulk_ns.route("/snapshots/<string:snapshot_id>/import")
+class SnapshotImport(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def post(self, snapshot_id):
+        """
+        Start importing a snapshot in the realm: client scopes, clients, client policies, then
+        token-exchange permissions. The resources identical to the snapshot ones are skipped.
+        """
+        try:
+            snapshots.start_import(snapshot_id)
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+        except ValueError as e:
+            return json_response(str(e), 400)
+        return json_response({"id": snapshot_id}, 202)
+
+    @auth_lib_helper.oidc_validate_api
+    def get(self, snapshot_id):
+        """Get the report of the last import of a snapshot, with the outcomes and throughput of every resource"""
+        try:
+            return json_response(snapshots.get_import_report(snapshot_id))
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+
+
+@bulk_ns.route("/snapshots/<string:snapshot_id>/<string:resource>")
+class SnapshotResource(Resource):
+    @auth_lib_helper.oidc_validate_api
+    def get(self, snapshot_id, resource):
+        """Download the gzip-compressed NDJSON file of a snapshot resource, e.g. clients"""
+        try:
+            manifest = snapshots.get_manifest(snapshot_id)
+        except ResourceNotFoundError as e:
+            return json_response(str(e), 404)
+        if resource not in manifest["resources"]:
+            return json_response(f"Resource '{resource}' not found in snapshot '{snapshot_id}'", 404)
+        return send_file(
+            os.path.join(snapshots.get_path(snapshot_id), manifest["resources"][resource]["file"]),
+            mimetype="application/gzip",
+            as_attachment=True,
+        )
+
+
 @user_ns.route("/logout/<string:user_id>")
 class UserLogout(Resource):
     @auth_lib_helper.oidc_validate_api
@@ -340,6 +1160,61 @@ class UserLogout(Resource):
         return json_response(response.text, 200)
 
 
+@bulk_ns.route("/logout")
+class BulkUserLogout(Resource):
+    @bulk_ns.doc(
+        description="The body holds the users, as {\"userIds\": [...]} or {\"usernames\": [...]}, "
+        "and optionally the \"realms\" to log them out from: main (default), mfa and/or guest",
+        params={"concurrency": "Number of logouts sent at the same time"},
+    )
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Logout many users from all their sessions, in one or more realms
+        Returns the result of every user in every realm
+        """
+        data = get_request_data(request)
+        realm_names = {
+            "main": keycloak_client.realm,
+            "mfa": keycloak_client.mfa_realm,
+            "guest": keycloak_client.guest_realm,
+        }
+        realms = data.get("realms", ["main"])
+        if not isinstance(realms, list) or not realms or not all(realm in realm_names for realm in realms):
+            return json_response(
+                "'realms' must be a list of: {}".format(list(realm_names)), 400
+            )
+        by_username = "usernames" in data
+        users = data.get("usernames" if by_username else "userIds")
+        if ("usernames" in data) == ("userIds" in data) or not (
+            isinstance(users, list) and all(isinstance(user, str) and user for user in users)
+        ):
+            return json_response(
+                "The request must have either a 'userIds' or a 'usernames' list", 400
+            )
+        max_workers = current_app.config["BULK_MAX_WORKERS"]
+        concurrency = min(request.args.get("concurrency", max_workers, type=int), max_workers)
+
+        def logout(user_and_realm):
+            user, realm = user_and_realm
+            user_id = user
+            if by_username:
+                # Raises ResourceNotFoundError if the user does not exist in the realm
+                user_id = keycloak_client.get_user_by_username(user, realm=realm_names[realm])["id"]
+            keycloak_client.logout_user(user_id, realm_names[realm])
+
+        results = {user: {} for user in users}
+        for (user, realm), _, error in run_concurrently(
+            logout,
+            [(user, realm) for user in results for realm in dict.fromkeys(realms)],
+            max(concurrency, 1),
+        ):
+            results[user][realm] = {"status": 200} if error is None else bulk_error(error, "logging out user")
+        return json_response(
+            [{"user": user, "realms": user_results} for user, user_results in results.items()]
+        )
+
+
 @user_ns.route("/<username>")
 class UserDetails(Resource):
     @user_ns.doc(body=user_model)
@@ -381,6 +1256,77 @@ class UserDetailsGuest(Resource):
                 400,
             )
 
+
+class BulkUserUpdater(Resource):
+    is_guest = False
+
+    @bulk_ns.doc(
+        description="The body is a list of {\"username\": ..., \"properties\": {...}}, "
+        "with \"email\" instead of \"username\" for guest users",
+        params={"concurrency": "Number of users updated at the same time"},
+    )
+    @auth_lib_helper.oidc_validate_api
+    def put(self):
+        """
+        Update many users, sent as a JSON array or as newline delimited JSON.
+        Users whose properties do not change are not updated.
+        The result of every user is streamed back as a line of JSON as soon as it is updated.
+        """
+        items = get_request_items(request)
+        if items is None:
+            return json_response(
+                "The request must be a JSON array or newline delimited JSON of users and properties", 400
+            )
+        realm = keycloak_client.guest_realm if self.is_guest else keycloak_client.realm
+        user_key = "email" if self.is_guest else "username"
+        max_workers = current_app.config["BULK_MAX_WORKERS"]
+        concurrency = min(request.args.get("concurrency", max_workers, type=int), max_workers)
+        rate_limiter = RateLimiter(current_app.config["BULK_RATE_LIMIT"])
+
+        def update(indexed_item):
+            _, item = indexed_item
+            if (
+                not isinstance(item, dict)
+                or not isinstance(item.get(user_key), str)
+                or not isinstance(item.get("properties"), dict)
+            ):
+                raise UserDefinitionError(
+                    f"Each item must have a '{user_key}' and a 'properties' object"
+                )
+            rate_limiter.wait()
+            user = keycloak_client.get_user_by_username(item[user_key], self.is_guest, realm)
+            changes = keycloak_client.get_user_changes(user, **item["properties"])
+            if changes:
+                keycloak_client.update_user_object(user, realm, **changes)
+            return user, list(changes)
+
+        def results():
+            for (index, item), updated, error in run_concurrently(
+                update, enumerate(items), max(concurrency, 1)
+            ):
+                result = {"index": index}
+                if isinstance(item, dict):
+                    result[user_key] = item.get(user_key)
+                if error is None:
+                    user, changed = updated
+                    result.update(status=200, changed=changed, user=user)
+                else:
+                    result.update(bulk_error(error, "updating user"))
+                yield result
+
+        return ndjson_response(results())
+
+
+@bulk_ns.route("/users")
+class BulkUserDetails(BulkUserUpdater):
+    pass
+
+
+@bulk_ns.route("/users/guest")
+class BulkUserDetailsGuest(BulkUserUpdater):
+    is_guest = True
+
+
 #
 # Routes for MFA settings
 #
@@ -391,16 +1337,19 @@ class UserDetailsGuest(Resource):
 # POST   /<username>/authenticator/[method]/reset : resets method credentials for user (disables and enables method)
 
 
-def is_otp_enabled(client, username):
+def is_otp_enabled(client, username, snapshot=None):
     """
     Check if OTP is enabled for the user
     """
     return client.is_credential_enabled_for_user(
-        username, client.REQUIRED_ACTION_CONFIGURE_OTP, client.CREDENTIAL_TYPE_OTP
+        username,
+        client.REQUIRED_ACTION_CONFIGURE_OTP,
+        client.CREDENTIAL_TYPE_OTP,
+        snapshot=snapshot,
     )
 
 
-def is_webauthn_enabled(client, username):
+def is_webauthn_enabled(client, username, snapshot=None):
     """
     Check if WebAuthN is enabled for the user
     """
@@ -408,6 +1357,7 @@ def is_webauthn_enabled(client, username):
         username,
         client.REQUIRED_ACTION_WEBAUTHN_REGISTER,
         client.CREDENTIAL_TYPE_WEBAUTHN,
+        snapshot=snapshot,
     )
 
 
@@ -419,31 +1369,59 @@ class MfaSettings(Resource):
         Gets all the MFA settings for the user
         """
         try:
-            otp_enabled, otp_preferred, otp_credential_id, otp_must_initialize, webauthn_enabled, webauthn_preferred, webauthn_credential_id, webauthn_must_initialize = keycloak_client.get_user_mfa_settings(
-                username
-            )
             return json_response(
-                {
-                    "otp": {
-                        "enabled": otp_enabled,
-                        "preferred": otp_preferred,
-                        "initialization_required": otp_must_initialize,
-                        "credential_id": otp_credential_id,
-                        "text": "OTP (One Time Password)",
-                    },
-                    "webauthn": {
-                        "enabled": webauthn_enabled,
-                        "preferred": webauthn_preferred,
-                        "initialization_required": webauthn_must_initialize,
-                        "credential_id": webauthn_credential_id,
-                        "text": "WebAuthn (e.g. Yubikey)",
-                    },
-                }
+                mfa_settings_data(keycloak_client.get_user_mfa_settings(username))
             )
         except ResourceNotFoundError as e:
             return str(e), 404
 
 
+def mfa_settings_data(mfa_settings):
+    """
+    Converts the settings returned by `get_user_mfa_settings` to the MFA settings of the API
+    """
+    otp_enabled, otp_preferred, otp_credential_id, otp_must_initialize, webauthn_enabled, webauthn_preferred, webauthn_credential_id, webauthn_must_initialize = mfa_settings
+    return {
+        "otp": {
+            "enabled": otp_enabled,
+            "preferred": otp_preferred,
+            "initialization_required": otp_must_initialize,
+            "credential_id": otp_credential_id,
+            "text": "OTP (One Time Password)",
+        },
+        "webauthn": {
+            "enabled": webauthn_enabled,
+            "preferred": webauthn_preferred,
+            "initialization_required": webauthn_must_initialize,
+            "credential_id": webauthn_credential_id,
+            "text": "WebAuthn (e.g. Yubikey)",
+        },
+    }
+
+
+@bulk_ns.route("/users/authenticator")
+class BulkMfaSettings(Resource):
+    @bulk_ns.doc(body=[fields.String])
+    @auth_lib_helper.oidc_validate_api
+    def post(self):
+        """
+        Gets the MFA settings of many users, sent as a JSON array of usernames.
+        Returns the settings by username, and the users that could not be found under "errors".
+        """
+        usernames = request.get_json(silent=True)
+        if not isinstance(usernames, list) or not all(isinstance(u, str) for u in usernames):
+            return json_response("The request must be a JSON array of usernames", 400)
+        users, errors = {}, {}
+        for username, snapshot, error in keycloak_client.get_mfa_snapshots(set(usernames)):
+            if error is None:
+                users[username] = mfa_settings_data(
+                    keycloak_client.get_user_mfa_settings(username, snapshot=snapshot)
+                )
+            else:
+                errors[username] = bulk_error(error, "getting MFA settings")
+        return json_response({"users": users, "errors": errors})
+
+
 @user_ns.route("/<username>/authenticator/otp")
 class OTP(Resource):
     @auth_lib_helper.oidc_validate_user_or_api
@@ -459,12 +1437,13 @@ class OTP(Resource):
     def post(self, username):
         """Enables OTP credentials for a user"""
         try:
-            is_enabled, _ = is_otp_enabled(keycloak_client, username)
+            snapshot = keycloak_client.get_mfa_snapshot(username)
+            is_enabled, _ = is_otp_enabled(keycloak_client, username, snapshot)
         except ResourceNotFoundError as e:
             return str(e), 404
 
         if not is_enabled:
-            keycloak_client.enable_otp_for_user(username)
+            keycloak_client.enable_otp_for_user(username, snapshot=snapshot)
             return "OTP Enabled", 200
         else:
             return "OTP already enabled", 200
@@ -473,19 +1452,20 @@ class OTP(Resource):
     def delete(self, username):
         """Disables and removes OTP credentials for a user"""
         try:
-            otp_enabled, _ = is_otp_enabled(keycloak_client, username)
-            webauthn_enabled, _ = is_webauthn_enabled(keycloak_client, username)
+            snapshot = keycloak_client.get_mfa_snapshot(username)
+            otp_enabled, _ = is_otp_enabled(keycloak_client, username, snapshot)
+            webauthn_enabled, _ = is_webauthn_enabled(keycloak_client, username, snapshot)
         except ResourceNotFoundError as e:
             return str(e), 404
         if not otp_enabled:
             return "OTP already disabled", 200
-        if not webauthn_enabled and not keycloak_client.is_user_migrated_by_username(username):
+        if not webauthn_enabled and not snapshot.migrated:
             # non-migrated users shouldn't be able to disable both 2FA methods
             return (
                 "Cannot disable OTP if WebAuthn is not enabled. At least one MFA method must always be enabled for the user.",
                 403,
             )
-        keycloak_client.disable_otp_for_user(username)
+        keycloak_client.disable_otp_for_user(username, snapshot=snapshot)
         return "OTP Disabled", 200
 
 
@@ -495,12 +1475,13 @@ class OTPReset(Resource):
     def post(self, username):
         """Enables and resets OTP credentials for a user"""
         try:
-            is_enabled, _ = is_otp_enabled(keycloak_client, username)
+            snapshot = keycloak_client.get_mfa_snapshot(username)
+            is_enabled, _ = is_otp_enabled(keycloak_client, username, snapshot)
         except ResourceNotFoundError as e:
             return str(e), 404
         if is_enabled:
-            keycloak_client.disable_otp_for_user(username)
-        keycloak_client.enable_otp_for_user(username)
+            keycloak_client.disable_otp_for_user(username, snapshot=snapshot)
+        keycloak_client.enable_otp_for_user(username, snapshot=snapshot)
         return "OTP Enabled and Reset", 200
 
 
@@ -519,11 +1500,12 @@ class WebAuthn(Resource):
     def post(self, username):
         """Enables WebAuthn credentials for a user"""
         try:
-            is_enabled, _ = is_webauthn_enabled(keycloak_client, username)
+            snapshot = keycloak_client.get_mfa_snapshot(username)
+            is_enabled, _ = is_webauthn_enabled(keycloak_client, username, snapshot)
         except ResourceNotFoundError as e:
             return str(e), 404
         if not is_enabled:
-            keycloak_client.enable_webauthn_for_user(username)
+            keycloak_client.enable_webauthn_for_user(username, snapshot=snapshot)
             return "WebAuthn Enabled", 200
         else:
             return "WebAuthn already enabled", 200
@@ -532,19 +1514,20 @@ class WebAuthn(Resource):
     def delete(self, username):
         """Disables and removes WebAuthn credentials for a user"""
         try:
-            otp_enabled, _ = is_otp_enabled(keycloak_client, username)
-            webauthn_enabled, _ = is_webauthn_enabled(keycloak_client, username)
+            snapshot = keycloak_client.get_mfa_snapshot(username)
+            otp_enabled, _ = is_otp_enabled(keycloak_client, username, snapshot)
+            webauthn_enabled, _ = is_webauthn_enabled(keycloak_client, username, snapshot)
         except ResourceNotFoundError as e:
             return str(e), 404
         if not webauthn_enabled:
             return "WebAuthn already disabled", 200
-        if not otp_enabled and not keycloak_client.is_user_migrated_by_username(username):
+        if not otp_enabled and not snapshot.migrated:
             # non-migrated users shouldn't be able to disable both 2FA methods
             return (
                 "Cannot disable WebAuthn if OTP is not enabled. At least one MFA method must always be enabled for the user.",
                 403,
             )
-        keycloak_client.disable_webauthn_for_user(username)
+        keycloak_client.disable_webauthn_for_user(username, snapshot=snapshot)
         return "WebAuthn Disabled", 200
 
 
@@ -554,12 +1537,13 @@ class WebAuthnReset(Resource):
     def post(self, username):
         """Enables and resets WebAuthn credentials for a user"""
         try:
-            is_enabled, _ = is_webauthn_enabled(keycloak_client, username)
+            snapshot = keycloak_client.get_mfa_snapshot(username)
+            is_enabled, _ = is_webauthn_enabled(keycloak_client, username, snapshot)
         except ResourceNotFoundError as e:
             return str(e), 404
         if is_enabled:
-            keycloak_client.disable_webauthn_for_user(username)
-        keycloak_client.enable_webauthn_for_user(username)
+            keycloak_client.disable_webauthn_for_user(username, snapshot=snapshot)
+        keycloak_client.enable_webauthn_for_user(username, snapshot=snapshot)
         return "WebAuthn Enabled and Reset", 200
 
 
@@ -4,8 +4,12 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from flask import redirect
 from api_definitions import api
 from auth import auth_lib_helper
+from client_index import client_index
+from client_sync import client_sync
 from keycloak_api_client.keycloak import keycloak_client
 from log_utils import configure_logging
+from rotation_jobs import rotation_jobs
+from snapshot import snapshot_cli, snapshots
 from flask import Blueprint
 
 index_bp = Blueprint("index", __name__)
@@ -68,6 +72,30 @@ def configure_keycloak_client(app: Flask):
     keycloak_client.init_app(app)
 
 
+def configure_rotation_jobs(app: Flask):
+    """
+    Configures the client secret rotation jobs, and resumes the unfinished ones
+    """
+    rotation_jobs.init_app(app)
+
+
+def configure_client_index(app: Flask):
+    """
+    Configures the client search index, kept fresh by the writes of the keycloak client
+    and, if enabled, by the sync from the admin events
+    """
+    client_index.init_app(app)
+    client_sync.init_app(app)
+
+
+def configure_snapshots(app: Flask):
+    """
+    Configures the realm snapshots, for the API and the 'flask snapshot' commands
+    """
+    snapshots.init_app(app)
+    app.cli.add_command(snapshot_cli)
+
+
 def configure_authlib_helper(app: Flask):
     """
     Configures the authorization helper
@@ -98,6 +126,9 @@ def create_app() -> Flask:
     configure_keycloak_dependent_variables(app)
     configure_keycloak_client(app)
     configure_authlib_helper(app)
+    configure_rotation_jobs(app)
+    configure_snapshots(app)
+    configure_client_index(app)
 
     if app.config.get("OAUTH_AUTH_URL", None):
         app.config["OAUTH_AUTHORIZATIONS"]["oauth2"]["authorizationUrl"] = app.config[
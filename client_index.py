@@ -0,0 +1,309 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from keycloak_api_client.keycloak import keycloak_client
+from log_utils import configure_logging
+from utils import KeycloakAPIError, run_concurrently
+
+# Never kept in memory nor returned by the searches
+SECRET_PROPERTIES = ["secret", "registrationAccessToken"]
+# The client attributes holding private keys, left out as the secrets
+SECRET_ATTRIBUTES = ["saml.signing.private.key", "saml.encryption.private.key"]
+
+
+def without_secrets(client) -> Dict[str, Any]:
+    """
+    Returns a copy of the client representation without its secrets and private keys
+    """
+    client = {key: value for key, value in client.items() if key not in SECRET_PROPERTIES}
+    if client.get("attributes"):
+        client["attributes"] = {
+            key: value for key, value in client["attributes"].items() if key not in SECRET_ATTRIBUTES
+        }
+    return client
+
+
+def redirect_uri_host(uri) -> Optional[str]:
+    """
+    Returns the lowercase host of a redirect URI, e.g. "*.cern.ch", or None for relative URIs such as "/*"
+    """
+    try:
+        host = urlparse(uri).hostname
+    except ValueError:
+        return None
+    return host.lower() if host else None
+
+
+class _IndexData:
+    """
+    The client representations by ID, and their postings
+    """
+
+    def __init__(self, clients=()):
+        self.clients: Dict[str, Dict[str, Any]] = {}
+        self.ids: Dict[str, str] = {}
+        self.hosts: Dict[str, set] = {}
+        self.attributes: Dict[Tuple[str, str], set] = {}
+        self.attribute_keys: Dict[str, set] = {}
+        for client in clients:
+            self._add_postings(client)
+        # The clientIds in order, for the prefix searches
+        self.sorted_client_ids: List[str] = sorted(self.ids)
+
+    def add(self, client):
+        self.remove(client["id"])
+        if client["clientId"] in self.ids:
+            self.remove(self.ids[client["clientId"]])
+        self._add_postings(client)
+        insort(self.sorted_client_ids, client["clientId"])
+
+    def remove(self, clientid):
+        client = self.clients.pop(clientid, None)
+        if client is None:
+            return
+        del self.ids[client["clientId"]]
+        del self.sorted_client_ids[bisect_left(self.sorted_client_ids, client["clientId"])]
+        for host in self._hosts(client):
+            self._discard(self.hosts, host, clientid)
+        for key, value in (client.get("attributes") or {}).items():
+            self._discard(self.attributes, (key, value), clientid)
+            self._discard(self.attribute_keys, key, clientid)
+
+    def _add_postings(self, client):
+        client = without_secrets(client)
+        clientid = client["id"]
+        self.clients[clientid] = client
+        self.ids[client["clientId"]] = clientid
+        for host in self._hosts(client):
+            self.hosts.setdefault(host, set()).add(clientid)
+        for key, value in (client.get("attributes") or {}).items():
+            self.attributes.setdefault((key, value), set()).add(clientid)
+            self.attribute_keys.setdefault(key, set()).add(clientid)
+
+    @staticmethod
+    def _hosts(client):
+        hosts = {redirect_uri_host(uri) for uri in client.get("redirectUris") or []}
+        hosts.discard(None)
+        return hosts
+
+    @staticmethod
+    def _discard(postings, key, clientid):
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(clientid)
+            if not ids:
+                del postings[key]
+
+
+class ClientIndex:
+    """
+    In-memory index of the realm's clients, to search them without listing them from Keycloak.
+    Built from a single client listing on the first search, and kept fresh by the adapter's own
+    writes to Keycloak. It is also rebuilt in the background once older than CLIENT_INDEX_MAX_AGE
+    seconds, to pick up the changes made by other Keycloak admins.
+    """
+
+    def __init__(self):
+        self.max_age = 0
+        self.max_workers = 8
+        self.logger = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._data: Optional[_IndexData] = None
+        self._built_at = None
+        self._stale = True
+        # IDs of the clients written to since the index was built, fetched again on the next search
+        self._dirty = set()
+
+    def init_app(self, app):
+        """
+        Configure the index, and subscribe it to the writes sent to Keycloak
+        """
+        self.max_age = app.config["CLIENT_INDEX_MAX_AGE"]
+        self.max_workers = app.config["KEYCLOAK_MAX_WORKERS"]
+        self.logger = configure_logging(app.config["LOG_DIR"])
+        keycloak_client.add_write_listener(self.on_write)
+
+    def build(self):
+        """
+        (Re)builds the index from a single client listing
+        """
+        with self._build_lock:
+            self._build()
+
+    def load(self, clients):
+        """
+        Replaces the index with the given client representations, e.g. a saved copy of the index
+        """
+        with self._build_lock:
+            self._build(clients)
+
+    def _build(self, clients=None):
+        started = time.monotonic()
+        with self._lock:
+            # The writes sent during the listing are applied on top of it
+            self._dirty.clear()
+            self._stale = False
+        data = _IndexData(keycloak_client.stream_all_clients() if clients is None else clients)
+        with self._lock:
+            self._data = data
+            self._built_at = time.monotonic()
+        if self.logger:
+            self.logger.info(
+                "Indexed {0} clients in {1:.1f}s".format(len(data.clients), time.monotonic() - started)
+            )
+
+    def get_clients(self, fresh=False) -> List[Dict[str, Any]]:
+        """
+        Returns the indexed client representations, without their secrets
+        fresh: build or refresh the index first, as a search would
+        """
+        if fresh:
+            self._ensure_fresh()
+        with self._lock:
+            return list(self._data.clients.values()) if self._data is not None else []
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._data.clients) if self._data is not None else 0
+
+    def invalidate(self, clientids, deleted=()):
+        """
+        Marks clients as changed in Keycloak, to fetch them again on the next search or `refresh`
+        deleted: clients known to be deleted, dropped from the index right away
+        """
+        with self._lock:
+            for clientid in deleted:
+                if self._data is not None:
+                    self._data.remove(clientid)
+            # Also fetched again after a deletion, in case a rebuild listed the client before it
+            self._dirty.update(clientids)
+            self._dirty.update(deleted)
+
+    def search(self, client_id=None, prefix=None, redirect_host=None, attributes=None, limit=100) -> Dict[str, Any]:
+        """
+        Returns the clients matching all the given criteria, ordered by clientId
+        client_id: the exact clientId
+        prefix: the beginning of the clientId
+        redirect_host: a host of the redirect URIs, e.g. "app.cern.ch" or "*.cern.ch"
+        attributes: list of (key, value) attributes, value None for any value
+        limit: maximum number of clients returned
+        Returns: {"total": number of matching clients, "clients": the first `limit` ones}
+        """
+        self._ensure_fresh()
+        with self._lock:
+            data = self._data
+            postings = []
+            if client_id is not None:
+                postings.append({data.ids[client_id]} if client_id in data.ids else set())
+            if redirect_host is not None:
+                postings.append(data.hosts.get(redirect_host.lower(), set()))
+            for key, value in attributes or []:
+                if value is None:
+                    postings.append(data.attribute_keys.get(key, set()))
+                else:
+                    postings.append(data.attributes.get((key, value), set()))
+
+            if not postings:
+                # Only a prefix: a range of the sorted clientIds
+                prefix = prefix or ""
+                start = bisect_left(data.sorted_client_ids, prefix)
+                end = bisect_left(data.sorted_client_ids, prefix + "\U0010ffff")
+                client_ids = data.sorted_client_ids[start:min(end, start + limit)]
+                return {
+                    "total": end - start,
+                    "clients": [data.clients[data.ids[client_id]] for client_id in client_ids],
+                }
+
+            # Intersect from the shortest postings, so the cost depends on the matches, not the realm
+            postings.sort(key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids.intersection_update(posting)
+            clients = [data.clients[clientid] for clientid in ids]
+            if prefix:
+                clients = [client for client in clients if client["clientId"].startswith(prefix)]
+            clients.sort(key=lambda client: client["clientId"])
+            return {"total": len(clients), "clients": clients[:limit]}
+
+    def on_write(self, request_type, url, response):
+        """
+        Write listener of the Keycloak client: tracks the clients changed by the adapter
+        """
+        parts = urlparse(url).path.split("/admin/realms/", 1)
+        if len(parts) != 2:
+            return
+        path = parts[1].strip("/").split("/")
+        if path[0] != keycloak_client.realm or len(path) < 2:
+            return
+        if path[1] == "partialImport":
+            self._stale = True
+        elif path[1] != "clients":
+            return
+        elif len(path) == 2 and request_type == "post":
+            # Keycloak answers the creation with the URL of the new client
+            location = response.headers.get("Location", "")
+            if location:
+                self.invalidate([location.rstrip("/").rsplit("/", 1)[-1]])
+        elif len(path) == 3 and request_type == "delete":
+            self.invalidate([], deleted=[path[2]])
+        elif len(path) >= 3:
+            self.invalidate([path[2]])
+
+    def _ensure_fresh(self):
+        if self._data is None or self._stale:
+            with self._build_lock:
+                # Another search may have built it in the meantime
+                if self._data is None or self._stale:
+                    self._build()
+        elif self.max_age and time.monotonic() - self._built_at > self.max_age:
+            if not self._build_lock.locked():
+                threading.Thread(target=self._rebuild, name="client-index", daemon=True).start()
+        self.refresh()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            if self.logger:
+                self.logger.exception("Cannot rebuild the client index")
+
+    def refresh(self) -> int:
+        """
+        Fetches the clients changed since the last refresh again
+        Returns: the number of clients fetched
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty or self._data is None:
+            # Without an index yet, the changes are part of the next build
+            return 0
+
+        def get_client(clientid):
+            try:
+                return keycloak_client.get_client_by_id(clientid)
+            except KeycloakAPIError as e:
+                if e.status_code == 404:
+                    return None
+                raise
+
+        for clientid, client, error in run_concurrently(get_client, dirty, self.max_workers):
+            with self._lock:
+                if error is not None:
+                    # Keep serving the previous version, and try again on the next search
+                    self._dirty.add(clientid)
+                    if self.logger:
+                        self.logger.error(
+                            "Cannot refresh client '{0}' in the index: {1}".format(clientid, error)
+                        )
+                elif client is None:
+                    self._data.remove(clientid)
+                else:
+                    self._data.add(client)
+        return len(dirty)
+
+
+client_index: ClientIndex = ClientIndex()
@@ -0,0 +1,256 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator
+
+from client_index import client_index
+from keycloak_api_client.keycloak import keycloak_client
+from log_utils import configure_logging
+from snapshot import private_opener, read_records
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _event_key(event):
+    # Older Keycloak versions do not give the admin events an ID
+    return event.get("id") or "{0}:{1}:{2}".format(
+        event["time"], event.get("operationType"), event.get("resourcePath")
+    )
+
+
+class CursorLostError(Exception):
+    pass
+
+
+class ClientSync:
+    """
+    Keeps the client index in sync with Keycloak by polling the realm's admin events from a cursor,
+    and fetching again only the clients they changed.
+
+    The index is saved with its cursor, so a restart only replays the events since the last save
+    instead of listing all the clients. It falls back to a full resync when the cursor is lost:
+    nothing saved, the events since the cursor expired, or more than CLIENT_SYNC_MAX_EVENTS to apply.
+    Note that the realm must have admin events enabled.
+    """
+
+    def __init__(self):
+        self.interval = 0
+        self.cursor = None
+        self.logger = None
+        self._lock = threading.Lock()
+        self._saved_at = None
+        self._last_poll = None
+        self.stats = {
+            "polls": 0,
+            "events": 0,
+            "clientsFetched": 0,
+            "fullResyncs": 0,
+            "lastPollAt": None,
+            "lastFullResyncAt": None,
+            "lastEvents": 0,
+            "lastEventsPerSecond": 0,
+            "lastEventDelaySeconds": None,
+            "lastError": None,
+        }
+
+    def init_app(self, app):
+        """
+        Configure the sync based on the app config, and start it if CLIENT_SYNC_INTERVAL is set
+        """
+        self.interval = app.config["CLIENT_SYNC_INTERVAL"]
+        self.page_size = app.config["CLIENT_SYNC_PAGE_SIZE"]
+        self.max_events = app.config["CLIENT_SYNC_MAX_EVENTS"]
+        self.mirror_file = app.config["CLIENT_MIRROR_FILE"]
+        self.save_interval = app.config["CLIENT_MIRROR_SAVE_INTERVAL"]
+        self.logger = configure_logging(app.config["LOG_DIR"])
+        if self.interval:
+            threading.Thread(target=self._run, name="client-sync", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                if self.cursor is None:
+                    self.load()
+                self.sync()
+                self.stats["lastError"] = None
+            except Exception as e:
+                self.logger.exception("Client sync failed")
+                self.stats["lastError"] = str(e)
+            time.sleep(self.interval)
+
+    def load(self):
+        """
+        Loads the saved index and its cursor, or fully resyncs the index if there is none
+        """
+        with self._lock:
+            try:
+                records = read_records(self.mirror_file)
+                header = next(records)
+                if header.get("realm") != keycloak_client.realm:
+                    raise ValueError("saved for realm '{0}'".format(header.get("realm")))
+                client_index.load(records)
+                self.cursor = header["cursor"]
+                self._saved_at = time.monotonic()
+                self.logger.info("Loaded the client index saved at {0}".format(header["savedAt"]))
+            except (OSError, EOFError, ValueError, KeyError, StopIteration) as e:
+                self.logger.info("No usable saved client index ({0!r}), resyncing".format(e))
+                self._full_resync()
+
+    def full_resync(self):
+        """
+        Rebuilds the index from a full client listing
+        """
+        with self._lock:
+            self._full_resync()
+
+    def _full_resync(self):
+        # The cursor is taken first: the events sent during the listing are replayed by the next sync
+        cursor = self._latest_cursor()
+        client_index.build()
+        self.cursor = cursor
+        self.stats["fullResyncs"] += 1
+        self.stats["lastFullResyncAt"] = _now()
+        self.save()
+
+    def sync(self) -> int:
+        """
+        Applies the client events since the cursor to the index
+        Returns: the number of events applied
+        """
+        with self._lock:
+            started = time.monotonic()
+            try:
+                events = self._events_since_cursor()
+            except CursorLostError as e:
+                self.logger.warning("Client sync cursor lost ({0}), resyncing".format(e))
+                self._full_resync()
+                events = []
+
+            changed, deleted = set(), set()
+            for event in reversed(events):
+                path = (event.get("resourcePath") or "").split("/")
+                if len(path) < 2 or path[0] != "clients":
+                    continue
+                if event.get("operationType") == "DELETE" and len(path) == 2:
+                    deleted.add(path[1])
+                    changed.discard(path[1])
+                else:
+                    changed.add(path[1])
+                    deleted.discard(path[1])
+            client_index.invalidate(changed, deleted=deleted)
+            fetched = client_index.refresh()
+
+            if events:
+                newest = max(event["time"] for event in events)
+                seen = [_event_key(event) for event in events if event["time"] == newest]
+                if newest == self.cursor["time"]:
+                    seen += self.cursor["seen"]
+                self.cursor = {"time": newest, "seen": seen}
+            seconds = time.monotonic() - started
+            self._last_poll = time.time()
+            self.stats["polls"] += 1
+            self.stats["events"] += len(events)
+            self.stats["clientsFetched"] += fetched
+            self.stats["lastPollAt"] = _now()
+            self.stats["lastEvents"] = len(events)
+            self.stats["lastEventsPerSecond"] = round(len(events) / seconds, 1) if seconds else 0
+            if events:
+                # From the oldest event to its change being visible in the index
+                self.stats["lastEventDelaySeconds"] = round(
+                    self._last_poll - min(event["time"] for event in events) / 1000, 1
+                )
+            if events and time.monotonic() - self._saved_at > self.save_interval:
+                self.save()
+            return len(events)
+
+    def _events_since_cursor(self):
+        """
+        Returns the client events newer than the cursor, newest first
+        Raises CursorLostError if the events since the cursor cannot all be replayed
+        """
+        if self.cursor is None:
+            raise CursorLostError("no cursor")
+        events = []
+        found = not self.cursor["time"]
+        seen = set(self.cursor["seen"])
+        keys = set()
+        for event in self._iter_events():
+            if event["time"] < self.cursor["time"]:
+                found = True
+                break
+            key = _event_key(event)
+            if event["time"] == self.cursor["time"] and key in seen:
+                found = True
+                continue
+            if key in keys:
+                # The pages shift when new events are recorded while paging
+                continue
+            keys.add(key)
+            events.append(event)
+            if len(events) > self.max_events:
+                raise CursorLostError("more than {0} events to apply".format(self.max_events))
+        if not found:
+            # Events are expired oldest first, so the one at the cursor went too
+            raise CursorLostError("the events since the cursor expired")
+        return events
+
+    def _latest_cursor(self):
+        cursor = {"time": 0, "seen": []}
+        for event in self._iter_events():
+            if event["time"] < cursor["time"]:
+                break
+            cursor["time"] = event["time"]
+            cursor["seen"].append(_event_key(event))
+        return cursor
+
+    def _iter_events(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the client admin events, newest first
+        """
+        first = 0
+        while True:
+            page = keycloak_client.get_admin_events(first, self.page_size, ["CLIENT"])
+            yield from page
+            if len(page) < self.page_size:
+                return
+            first += self.page_size
+
+    def save(self):
+        """
+        Saves the index and its cursor, as gzip-compressed NDJSON. The file can be shared by several processes.
+        """
+        path = "{0}.{1}.tmp".format(self.mirror_file, os.getpid())
+        # Only readable by the owner, as the snapshots
+        with open(path, "wb", opener=private_opener) as raw_file, gzip.open(
+            raw_file, "wt", encoding="utf-8"
+        ) as mirror_file:
+            header = {"realm": keycloak_client.realm, "cursor": self.cursor, "savedAt": _now()}
+            mirror_file.write(json.dumps(header) + "\n")
+            for client in client_index.get_clients():
+                mirror_file.write(json.dumps(client) + "\n")
+        os.replace(path, self.mirror_file)
+        self._saved_at = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Returns the sync lag and event throughput
+        """
+        return dict(
+            self.stats,
+            enabled=bool(self.interval),
+            clients=client_index.count(),
+            cursor=(
+                datetime.fromtimestamp(self.cursor["time"] / 1000, timezone.utc).isoformat()
+                if self.cursor and self.cursor["time"] else None
+            ),
+            # How old the index may be
+            lagSeconds=round(time.time() - self._last_poll, 1) if self._last_poll else None,
+        )
+
+
+client_sync: ClientSync = ClientSync()
@@ -11,6 +11,57 @@ KEYCLOAK_CLIENT_SECRET = "DELETED"
 # Note this is the realm where clients will be created
 KEYCLOAK_REALM = "cern"
 
+# Maximum number of concurrent requests sent to Keycloak by a single operation
+KEYCLOAK_MAX_WORKERS = 8
+
+# Maximum number of Keycloak responses memoized during a single request
+KEYCLOAK_READ_MEMO_SIZE = 256
+
+# Maximum number of items processed concurrently by the bulk endpoints
+BULK_MAX_WORKERS = 8
+
+# Maximum number of clients sent to Keycloak in a single partialImport request
+BULK_IMPORT_CHUNK_SIZE = 100
+
+# Maximum number of requests per second sent to Keycloak by a bulk operation (0 for no limit)
+BULK_RATE_LIMIT = 20
+
+# Default and maximum number of clients returned in a page of the client listing
+CLIENT_PAGE_SIZE = 100
+CLIENT_MAX_PAGE_SIZE = 1000
+
+# Seconds after which the client search index is rebuilt in the background, to pick up the
+# changes not made through the adapter (0 to only rebuild it after a partialImport, e.g. when
+# CLIENT_SYNC_INTERVAL is set)
+CLIENT_INDEX_MAX_AGE = 3600
+
+# Client index sync from the realm's admin events, which must be enabled in Keycloak
+# Seconds between two polls of the admin events (0 to disable the sync)
+CLIENT_SYNC_INTERVAL = 0
+# Number of admin events fetched in each request
+CLIENT_SYNC_PAGE_SIZE = 100
+# Above this number of events to apply, the index is rebuilt from a full listing instead
+CLIENT_SYNC_MAX_EVENTS = 1000
+# File where the index is saved with its event cursor, shared by all the processes, and
+# minimum seconds between two saves
+CLIENT_MIRROR_FILE = "/tmp/client-mirror.ndjson.gz"
+CLIENT_MIRROR_SAVE_INTERVAL = 600
+
+# Client secret rotation jobs
+# Directory where the progress of the jobs is persisted, shared by all the processes
+ROTATION_JOBS_DIR = "/tmp/rotation-jobs"
+# Default number of secrets rotated in each batch, and seconds between batches
+ROTATION_BATCH_SIZE = 20
+ROTATION_BATCH_INTERVAL = 60
+# Resume the unfinished jobs when the application starts
+ROTATION_JOBS_AUTO_RESUME = True
+
+# Realm snapshots
+# Directory where the snapshots exported through the API are written
+SNAPSHOT_DIR = "/tmp/snapshots"
+# Number of resources fetched from Keycloak in each request of an export
+SNAPSHOT_PAGE_SIZE = 100
+
 # OAuth config (for the Swagger UI)
 # The client ID used to login from the UI
 OAUTH_AUTH_URL = "https://keycloak-dev.cern.ch/auth/realms/cern/protocol/openid-connect/auth"
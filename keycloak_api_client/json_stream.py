@@ -0,0 +1,102 @@
+import codecs
+import json
+import re
+from itertools import chain
+from typing import Any, Iterable, Iterator
+
+# The characters that change the nesting of the JSON document, outside of strings
+_STRUCTURE = re.compile(r'[\[\]{}",]')
+# The characters that can end a string, or escape the next character
+_STRING = re.compile(r'["\\]')
+
+
+def iter_json_array(chunks: Iterable[bytes], encoding="utf-8") -> Iterator[Any]:
+    """
+    Yields the elements of a JSON array one by one, as soon as they are complete in the byte chunks.
+    Only the element being read is kept in memory, never the whole document.
+    Raises ValueError if the document is not a JSON array.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    scanner = _ArrayScanner()
+    for chunk in chain(chunks, [None]):
+        yield from scanner.feed(decoder.decode(b"", final=True) if chunk is None else decoder.decode(chunk))
+        if scanner.done:
+            return
+    raise ValueError("Incomplete JSON array")
+
+
+class _ArrayScanner:
+    """
+    Finds the elements of a JSON array in a text that is fed one chunk at a time
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0  # where to continue scanning the buffer
+        self.start = None  # where the current element starts in the buffer
+        self.depth = 0
+        self.in_string = False
+        self.done = False
+
+    def feed(self, text) -> Iterator[Any]:
+        """
+        Yields the elements completed by the text
+        """
+        self.buffer += text
+        while not self.done and self._skip_string():
+            match = _STRUCTURE.search(self.buffer, self.position)
+            if match is None:
+                self.position = len(self.buffer)
+                break
+            self.position = match.end()
+            yield from self._on_structure(match)
+        # Drop what has already been yielded
+        keep_from = self.position if self.start is None else self.start
+        self.buffer = self.buffer[keep_from:]
+        self.position -= keep_from
+        if self.start is not None:
+            self.start = 0
+
+    def _skip_string(self):
+        """
+        Moves past the end of the string being scanned, if any. Returns False if it ends in the next chunks.
+        """
+        while self.in_string:
+            match = _STRING.search(self.buffer, self.position)
+            if match is None:
+                self.position = len(self.buffer)
+                return False
+            if match.group() == '"':
+                self.in_string = False
+                self.position = match.end()
+            elif match.end() == len(self.buffer):
+                # The escaped character is in the next chunk
+                self.position = match.start()
+                return False
+            else:
+                self.position = match.end() + 1
+        return True
+
+    def _on_structure(self, match) -> Iterator[Any]:
+        """
+        Follows the nesting of the document, and yields the element ended by the character, if any
+        """
+        char = match.group()
+        if self.depth == 0 and char != "[":
+            raise ValueError("The document is not a JSON array")
+        if char == '"':
+            self.in_string = True
+        elif char in "[{":
+            self.depth += 1
+            if self.depth == 1:
+                self.start = self.position
+        elif char in "]}":
+            self.depth -= 1
+            if self.depth == 0:
+                self.done = True
+                element = self.buffer[self.start:match.start()]
+                if element.strip():
+                    yield json.loads(element)
+        elif self.depth == 1:
+            yield json.loads(self.buffer[self.start:match.start()])
+            self.start = self.position
@@ -2,14 +2,80 @@
 
 import json
 import logging
-from model import Client, ClientTypes
-from typing import Dict, Any
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from model import Client, ClientTypes, UserMfaSnapshot, definition_matches
+from typing import Dict, Any, List, Tuple
 from copy import deepcopy
+from urllib.parse import urlparse
 
 import requests
+from flask import g, has_request_context
+from requests.adapters import HTTPAdapter
 
+from keycloak_api_client.json_stream import iter_json_array
 from log_utils import configure_logging
-from utils import ResourceNotFoundError, KeycloakAPIError
+from utils import ResourceNotFoundError, KeycloakAPIError, run_concurrently
+
+
+class _MemoizedResponse:
+    """
+    The parsed JSON of a memoized GET response, standing in for the response on later reads
+    """
+
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def text(self):
+        return json.dumps(self._data)
+
+    def json(self):
+        # The callers may change what they read
+        return deepcopy(self._data)
+
+
+class _ReadMemo:
+    """
+    The most recently used GET responses of a request, as parsed JSON
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response):
+        try:
+            entry = _MemoizedResponse(json.loads(response.text))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, matches):
+        """
+        Drops the entries whose key matches
+        """
+        with self._lock:
+            for key in [key for key in self._entries if matches(key)]:
+                del self._entries[key]
 
 
 class KeycloakAPIClient:
@@ -31,7 +97,9 @@ class KeycloakAPIClient:
             app.config["KEYCLOAK_CLIENT_SECRET"],
             app.config["LOG_DIR"],
             mfa_migrated_role=app.config["MFA_MIGRATED_ROLE"],
+            max_workers=app.config.get("KEYCLOAK_MAX_WORKERS", 8),
         )
+        self.read_memo_size = app.config.get("KEYCLOAK_READ_MEMO_SIZE", 256)
 
     def __initialize(
         self,
@@ -44,6 +112,7 @@ class KeycloakAPIClient:
         master_realm="master",
         mfa_realm="mfa",
         guest_realm="guest",
+        max_workers=8,
     ):
         """
         Initialize the class with the params needed to use the API.
@@ -53,6 +122,7 @@ class KeycloakAPIClient:
         client_secret: client_id secret
         internal_domains_regex: RegEx to filter out CERN URLs
         master_realm: master (needed it for admin API calls, admin token...)
+        max_workers: maximum number of concurrent requests sent by a single operation
         """
         self.keycloak_server = server
         self.realm = realm
@@ -63,6 +133,11 @@ class KeycloakAPIClient:
         self.guest_realm = guest_realm
         self.log_dir = log_dir
         self.mfa_migrated_role = mfa_migrated_role
+        self.max_workers = max_workers
+        # Keep enough pooled connections for the concurrent requests
+        adapter = HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         self.logger = configure_logging(self.log_dir)
 
@@ -91,6 +166,7 @@ class KeycloakAPIClient:
         self.master_realm = None
         self.mfa_realm = None
         self.guest_realm = None
+        self.max_workers = 8
         self.base_url = None
         self.headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
@@ -105,8 +181,21 @@ class KeycloakAPIClient:
         self.REQUIRED_ACTION_WEBAUTHN_REGISTER = "webauthn-register"
         self.access_token_object = None
         self.master_realm_client = None
+        # Per-thread state, e.g. the request counters used by `_count_requests`
+        # or the explicit read memos of `read_memo`
+        self._local = threading.local()
+        # Called after every successful write, see `add_write_listener`
+        self.write_listeners = []
+        # Maximum number of responses memoized by a request, see `read_memo`
+        self.read_memo_size = 256
+        # The memos in use by any thread, all invalidated by every write
+        self._read_memos = weakref.WeakSet()
+        self._read_memos_lock = threading.Lock()
 
     def __send_authorized_request(self, request_type, url, **kwargs):
+        counter = getattr(self._local, "request_counter", None)
+        if counter is not None:
+            counter["requests"] += 1
         # if there is 'headers' in kwargs use it instead of default class one
         r_headers = deepcopy(self.headers)
         if "headers" in kwargs:
@@ -126,6 +215,46 @@ class KeycloakAPIClient:
 
     def __send_request(self, request_type, url, **kwargs):
         """ Call the private method __send_request and retry in case the access_token has expired"""
+        memo = self.__get_read_memo()
+        memo_key = None
+        # Pages of large listings are not memoized, to keep the memory bounded
+        memoize = kwargs.pop("memoize", True)
+        if request_type.lower() != "get":
+            try:
+                ret = self.__send_request_with_retry(request_type, url, **kwargs)
+            finally:
+                # Also when the write failed, as it may have been partially applied
+                self.__invalidate_read_memos(url)
+            self.__notify_write_listeners(request_type, url, ret)
+            return ret
+        if memo is not None and memoize and not kwargs.get("stream"):
+            memo_key = (url, json.dumps(kwargs.get("params"), sort_keys=True))
+            memoized = memo.get(memo_key)
+            if memoized is not None:
+                self.logger.debug("Reusing response of GET {0}".format(url))
+                return memoized
+        ret = self.__send_request_with_retry(request_type, url, **kwargs)
+        if memo_key is not None:
+            memo.put(memo_key, ret)
+        return ret
+
+    def add_write_listener(self, listener):
+        """
+        Registers listener(request_type, url, response), called after every successful write request
+        sent to Keycloak, e.g. to keep caches of Keycloak resources fresh
+        """
+        if listener not in self.write_listeners:
+            self.write_listeners.append(listener)
+
+    def __notify_write_listeners(self, request_type, url, response):
+        for listener in self.write_listeners:
+            try:
+                listener(request_type.lower(), url, response)
+            except Exception:
+                # The write itself succeeded
+                self.logger.exception("Write listener failed for {0} {1}".format(request_type, url))
+
+    def __send_request_with_retry(self, request_type, url, **kwargs):
         try:
             ret = self.__send_authorized_request(request_type, url, **kwargs)
         except requests.exceptions.ConnectionError:
@@ -145,6 +274,77 @@ class KeycloakAPIClient:
             self.__handle_http_errors(ret)
             return ret
 
+    @contextmanager
+    def read_memo(self):
+        """
+        Memoizes the GET requests sent by the current thread inside the block, until a write
+        to the same resources by any thread. Within a Flask request, reads are memoized on flask.g
+        automatically. Only the parsed JSON of the last `read_memo_size` responses is kept.
+        """
+        previous = getattr(self._local, "read_memo", None)
+        self._local.read_memo = self.__new_read_memo()
+        try:
+            yield
+        finally:
+            self._local.read_memo = previous
+
+    def __get_read_memo(self):
+        memo = getattr(self._local, "read_memo", None)
+        if memo is None and has_request_context():
+            if "keycloak_read_memo" not in g:
+                g.keycloak_read_memo = self.__new_read_memo()
+            memo = g.keycloak_read_memo
+        return memo
+
+    def __new_read_memo(self):
+        memo = _ReadMemo(self.read_memo_size)
+        with self._read_memos_lock:
+            self._read_memos.add(memo)
+        return memo
+
+    def _bind_read_memo(self, func):
+        """
+        Wraps func so that it shares the read memo of the calling thread when run on a worker thread.
+        Without it, the reads of the worker are not memoized.
+        """
+        memo = self.__get_read_memo()
+
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, "read_memo", None)
+            self._local.read_memo = memo
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.read_memo = previous
+
+        return wrapper
+
+    def __memo_scope(self, url):
+        """
+        Returns the (realm, collection) a URL belongs to, e.g. ("cern", "clients"),
+        or None if it is not an admin API URL
+        """
+        parts = urlparse(url).path.split("/admin/realms/", 1)
+        if len(parts) != 2:
+            return None
+        return tuple(parts[1].strip("/").split("/")[:2])
+
+    def __invalidate_read_memos(self, url):
+        """
+        Drops the memoized reads of the collection written to by a request to `url`, in the memos
+        of all the threads: the writes of worker threads must not leave stale reads in the request's memo
+        """
+        scope = self.__memo_scope(url)
+        if scope is None:
+            return
+        if scope[1:] == ("partialImport",):
+            # An import can write to any collection of the realm
+            scope = scope[:1]
+        with self._read_memos_lock:
+            memos = list(self._read_memos)
+        for memo in memos:
+            memo.invalidate(lambda key: (self.__memo_scope(key[0]) or ())[:len(scope)] == scope)
+
     def __handle_http_errors(self, response):
         if response.status_code not in range(200, 300):
             data = json.loads(response.text)
@@ -171,6 +371,22 @@ class KeycloakAPIClient:
 
         return headers
 
+    @contextmanager
+    def _count_requests(self):
+        """
+        Counts the requests sent to Keycloak by the current thread inside the block.
+        Nested counters also add their count to the enclosing one.
+        """
+        counter = {"requests": 0}
+        parent = getattr(self._local, "request_counter", None)
+        self._local.request_counter = counter
+        try:
+            yield counter
+        finally:
+            self._local.request_counter = parent
+            if parent is not None:
+                parent["requests"] += counter["requests"]
+
     def set_client_fine_grain_permission(self, clientid, status):
         """
         Enable/disable fine grain permissions for the given client
@@ -299,6 +515,21 @@ class KeycloakAPIClient:
         response = self.__send_request("get", url, headers=headers)
         return response.json()
 
+    def save_client_scope(self, definition, scope_id=None):
+        """
+        Creates the client scope, or replaces the one with the given ID
+        definition: the client scope representation
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = f"{self.base_url}/admin/realms/{self.realm}/client-scopes"
+        if scope_id is None:
+            self.logger.info(f"Creating scope '{definition['name']}'")
+            return self.__send_request("post", url, headers=headers, data=json.dumps(definition))
+        self.logger.info(f"Updating scope '{definition['name']}'")
+        return self.__send_request(
+            "put", f"{url}/{scope_id}", headers=headers, data=json.dumps(definition)
+        )
+
     def get_client_default_scopes(self, client_id):
         """
         Get the Client's default scopes
@@ -321,12 +552,10 @@ class KeycloakAPIClient:
         """
         Add a scope to a client
         """
-        headers = self.__get_admin_access_token_headers()
         client_object = self.get_client_by_client_id(client_id)
         self.logger.info(f"Adding Scope '{scope_id}' to client '{client_id}'")
         if client_object:
-            url = f"{self.base_url}/admin/realms/{self.realm}/clients/{client_object['id']}/default-client-scopes/{scope_id}"
-            return self.__send_request("put", url, headers=headers)
+            return self.set_client_default_scope(client_object["id"], scope_id, "put")
         else:
             self.logger.info(
                 f"Cannot add Scope '{scope_id}' to Client '{client_id}'. Client not found"
@@ -335,37 +564,93 @@ class KeycloakAPIClient:
 
     def delete_client_scope(self, client_id, scope_id):
         """
-        Add a scope to a client
+        Delete a scope from a client
         """
-        headers = self.__get_admin_access_token_headers()
         client_object = self.get_client_by_client_id(client_id)
         self.logger.info(f"Deleting Scope '{scope_id}' from Client '{client_id}'")
         if client_object:
-            url = f"{self.base_url}/admin/realms/{self.realm}/clients/{client_object['id']}/default-client-scopes/{scope_id}"
-            return self.__send_request("delete", url, headers=headers)
+            return self.set_client_default_scope(client_object["id"], scope_id, "delete")
         else:
             self.logger.info(
                 f"Cannot delete Scope '{scope_id}' from Client '{client_id}'. Client not found"
             )
             return
 
-    def assign_default_scopes(self, new_scopes, original_scopes, client_id):
+    def set_client_default_scope(self, clientid, scope_id, request_type):
+        """
+        Adds ("put") or removes ("delete") a default scope of the client with the given ID
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = f"{self.base_url}/admin/realms/{self.realm}/clients/{clientid}/default-client-scopes/{scope_id}"
+        return self.__send_request(request_type, url, headers=headers)
+
+    def assign_default_scopes(self, new_scopes, original_scopes, client_id, clientid=None):
+        """
+        Adds and removes the client's default scopes so that they match `new_scopes`.
+        The changes are sent concurrently.
+        client_id: The client ID
+        clientid: ID string of the client, looked up from client_id if not given
+        Returns: Dict of scope name -> {"action", "success", "error"} for every changed scope
+        Raises a KeycloakAPIError listing the failed scopes, once all the changes have been sent
+        """
         scopes_to_add = set(new_scopes) - set(original_scopes)
         scopes_to_delete = set(original_scopes) - set(new_scopes)
-        if scopes_to_add or scopes_to_delete:
-            all_scopes = self.get_scopes()
-            for scope in scopes_to_add:
-                target_scope = next(
-                    (x["id"] for x in all_scopes if x["name"] == scope), None
-                )
-                if target_scope:
-                    self.add_client_scope(client_id, target_scope)
-            for scope in scopes_to_delete:
-                target_scope = next(
-                    (x["id"] for x in all_scopes if x["name"] == scope), None
+        results = {}
+        if not scopes_to_add and not scopes_to_delete:
+            return results
+        if not clientid:
+            client_object = self.get_client_by_client_id(client_id)
+            if not client_object:
+                self.logger.info(
+                    f"Cannot update scopes of Client '{client_id}'. Client not found"
                 )
-                if target_scope:
-                    self.delete_client_scope(client_id, target_scope)
+                return results
+            clientid = client_object["id"]
+
+        scope_ids = {x["name"]: x["id"] for x in self.get_scopes()}
+        changes = self._get_default_scope_changes(scopes_to_add, scopes_to_delete, scope_ids, client_id)
+
+        def apply(change):
+            action, scope = change
+            return self.set_client_default_scope(clientid, scope_ids[scope], action)
+
+        errors = {}
+        for (action, scope), _, error in run_concurrently(
+            self._bind_read_memo(apply), changes, self.max_workers
+        ):
+            results[scope] = {
+                "action": action,
+                "success": error is None,
+                "error": str(error) if error else None,
+            }
+            if error is not None:
+                errors[scope] = error
+        if errors:
+            self.logger.error(
+                f"Cannot update Scopes {sorted(errors)} of Client '{client_id}': {results}"
+            )
+            status_code = next(
+                (e.status_code for e in errors.values() if isinstance(e, KeycloakAPIError)), 500
+            )
+            raise KeycloakAPIError(
+                status_code=status_code,
+                message=f"Cannot update scopes {sorted(errors)} of client '{client_id}'",
+            )
+        return results
+
+    def _get_default_scope_changes(self, scopes_to_add, scopes_to_delete, scope_ids, client_id):
+        """
+        Returns the (action, scope name) pairs of the default scope changes, skipping the unknown scopes
+        """
+        changes = []
+        for action, scopes in [("put", scopes_to_add), ("delete", scopes_to_delete)]:
+            for scope in scopes:
+                if scope in scope_ids:
+                    changes.append((action, scope))
+                else:
+                    self.logger.warning(f"Scope '{scope}' of Client '{client_id}' not found. Skipping...")
+        return changes
 
     def assign_single_scope(self, scope_name, client_id):
         all_scopes = self.get_scopes()
@@ -381,7 +666,7 @@ class KeycloakAPIClient:
         client_id: The client ID
         request_client: A Client with a partial or full definition
         client_type: The client type
-        Returns: Updated client object
+        Returns: Updated client object, with `changed` set to False if it already matched the request
         """
         headers = self.__get_admin_access_token_headers()
         existing_client = self.get_client_object(client_id, client_type=client_type)
@@ -392,37 +677,46 @@ class KeycloakAPIClient:
                 "Updating client {0} with the following new properties: {1}".format(client_id, request_client.definition)
             )
             existing_client.update_definition(request_client.definition)
-            url = "{0}/admin/realms/{1}/clients/{2}".format(
-                self.base_url, self.realm, existing_client.definition["id"]
-            )
-            self.__send_request(
-                "put", url, data=json.dumps(existing_client.definition), headers=headers
+            properties_changed = not definition_matches(
+                {key: value for key, value in existing_client.definition.items() if key != "defaultClientScopes"},
+                original_client.definition,
             )
+            scopes_changed = "defaultClientScopes" in request_client.definition and set(
+                request_client.definition["defaultClientScopes"]
+            ) != set(original_client.definition.get("defaultClientScopes") or [])
+            if not properties_changed and not scopes_changed:
+                # Nothing to write, which also spares Keycloak its cache invalidations
+                self.logger.info("Client '{0}' already up to date".format(client_id))
+                original_client.changed = False
+                return original_client
+            if properties_changed:
+                url = "{0}/admin/realms/{1}/clients/{2}".format(
+                    self.base_url, self.realm, existing_client.definition["id"]
+                )
+                self.__send_request(
+                    "put", url, data=json.dumps(existing_client.definition), headers=headers
+                )
 
-            # Update the signing certificate.
-            signing_certificate = existing_client.get_saml_signing_certificate()
-            existing_signing_certificate = original_client.get_saml_signing_certificate()
-            if signing_certificate != existing_signing_certificate and signing_certificate is not None:
-                self._update_client_certificate(existing_client.definition["id"], 'saml.signing', headers, signing_certificate)
-
-            # Update the encryption certificate.
-            encryption_certificate = existing_client.get_saml_encryption_certificate()
-            existing_encryption_certificate = original_client.get_saml_encryption_certificate()
-            if encryption_certificate != existing_encryption_certificate and encryption_certificate is not None:
-                self._update_client_certificate(existing_client.definition["id"], 'saml.encryption', headers, encryption_certificate)
+                self._update_changed_certificates(
+                    existing_client.definition["id"], existing_client, original_client, headers
+                )
 
             # If default scopes are in the request client and are different to the ones in
             # the existing client, cycle through and update the scopes
-            if "defaultClientScopes" in request_client.definition:
+            if scopes_changed:
                 new_scopes = request_client.definition["defaultClientScopes"]
                 original_scopes = deepcopy(original_client.definition["defaultClientScopes"])
-                self.assign_default_scopes(new_scopes, original_scopes, client_id)
+                self.assign_default_scopes(
+                    new_scopes, original_scopes, client_id, existing_client.definition["id"]
+                )
             if "clientId" in request_client.definition:
                 client_id = request_client.definition["clientId"]
             updated_client = self.get_client_object(client_id, client_type=client_type)
             self.logger.info(
                 "Client '{0}' updated: {1}".format(client_id, updated_client)
             )
+            if updated_client:
+                updated_client.changed = True
             return updated_client
         else:
             self.logger.info(
@@ -432,6 +726,46 @@ class KeycloakAPIClient:
             )
             return
 
+    def apply_client_changes(self, current_client: Client, changes) -> Client:
+        """
+        Applies the changed properties to the client with a single update, without reading it from Keycloak first
+        current_client: the client as currently stored in Keycloak, e.g. freshly read: its other properties
+        are sent back as they are
+        changes: the properties to change, e.g. from Client.get_changed_properties. The default scopes are not changed.
+        Returns: the updated client
+        """
+        headers = self.__get_admin_access_token_headers()
+        updated_client = deepcopy(current_client)
+        updated_client.update_definition(changes)
+        self.logger.info(
+            "Updating client {0} properties: {1}".format(current_client.definition["clientId"], sorted(changes))
+        )
+        url = "{0}/admin/realms/{1}/clients/{2}".format(
+            self.base_url, self.realm, current_client.definition["id"]
+        )
+        self.__send_request("put", url, data=json.dumps(updated_client.definition), headers=headers)
+        self._update_changed_certificates(
+            current_client.definition["id"], updated_client, current_client, headers
+        )
+        return updated_client
+
+    def _update_changed_certificates(self, clientid, new_client: Client, original_client: Client, headers):
+        """
+        Uploads the SAML certificates of `new_client` that differ from the ones in `original_client`
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        """
+        # Update the signing certificate.
+        signing_certificate = new_client.get_saml_signing_certificate()
+        existing_signing_certificate = original_client.get_saml_signing_certificate()
+        if signing_certificate != existing_signing_certificate and signing_certificate is not None:
+            self._update_client_certificate(clientid, 'saml.signing', headers, signing_certificate)
+
+        # Update the encryption certificate.
+        encryption_certificate = new_client.get_saml_encryption_certificate()
+        existing_encryption_certificate = original_client.get_saml_encryption_certificate()
+        if encryption_certificate != existing_encryption_certificate and encryption_certificate is not None:
+            self._update_client_certificate(clientid, 'saml.encryption', headers, encryption_certificate)
+
     def client_description_converter(self, payload):
         """
         Create a new client via its client description (xml or json)
@@ -478,15 +812,10 @@ class KeycloakAPIClient:
         Regenerate client secret of the given client
         """
         self.logger.info("Attempting to regenerate '{0}' secret...".format(client_id))
-        headers = self.__get_admin_access_token_headers()
         client_object = self.get_client_by_client_id(client_id)
         if client_object:
             if client_object["protocol"] == "openid-connect":
-                url = "{0}/admin/realms/{1}/clients/{2}/client-secret".format(
-                    self.base_url, self.realm, client_object["id"]
-                )
-
-                ret = self.__send_request("post", url, headers=headers)
+                ret = self.regenerate_client_secret_by_id(client_object["id"])
                 self.logger.info("Client '{0}' secret regenerated".format(client_id))
             else:
                 ret = requests.Response  # new empty response
@@ -502,23 +831,50 @@ class KeycloakAPIClient:
                 )
             )
 
+    def regenerate_client_secret_by_id(self, clientid):
+        """
+        Regenerate the secret of the OIDC client with the given ID
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/clients/{2}/client-secret".format(
+            self.base_url, self.realm, clientid
+        )
+        return self.__send_request("post", url, headers=headers)
+
+    def update_client_definition(self, clientid, definition):
+        """
+        Replaces the client's representation
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        """
+        self.logger.info("Updating client '{0}'".format(definition.get("clientId", clientid)))
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/clients/{2}".format(self.base_url, self.realm, clientid)
+        return self.__send_request("put", url, headers=headers, data=json.dumps(definition))
+
     def delete_client_by_client_id(self, client_id):
         """
         Delete client with the given clientID name
         """
-        headers = self.__get_admin_access_token_headers()
         client_object = self.get_client_by_client_id(client_id)
         if client_object:
-            url = "{0}/admin/realms/{1}/clients/{2}".format(
-                self.base_url, self.realm, client_object["id"]
-            )
-
-            ret = self.__send_request("delete", url, headers=headers)
+            ret = self.delete_client_by_id(client_object["id"])
             self.logger.info("Deleted client '{0}'".format(client_id))
             return ret
         else:
             self.logger.info("Cannot delete '{0}'. Client not found".format(client_id))
 
+    def delete_client_by_id(self, clientid):
+        """
+        Delete the client with the given ID
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/clients/{2}".format(
+            self.base_url, self.realm, clientid
+        )
+        return self.__send_request("delete", url, headers=headers)
+
     def get_client_by_client_id(self, client_id, realm=None) -> Dict[str, Any]:
         """
         Get the list of clients that match the given clientID name
@@ -542,6 +898,19 @@ class KeycloakAPIClient:
             self.logger.info("Client '{0}' NOT found".format(client_id))
             return client
 
+    def get_client_by_id(self, clientid, realm=None) -> Dict[str, Any]:
+        """
+        Get the client with the given ID
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        """
+        if not realm:
+            realm = self.realm
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/clients/{2}".format(self.base_url, realm, clientid)
+        self.logger.info("Getting client with ID '{0}'".format(clientid))
+        ret = self.__send_request("get", url, headers=headers)
+        return json.loads(ret.text)
+
     def get_client_object(self, client_id, realm=None, client_type=ClientTypes.OIDC) -> Client:
         client_definition = self.get_client_by_client_id(client_id, realm)
         if client_definition:
@@ -581,18 +950,43 @@ class KeycloakAPIClient:
         """
         Create client policy for the given clientid
         clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        Returns: the response, or None if the client was already subscribed to the policy
         """
         self.logger.info(
             "Creating policy new '{0}' for client {1}".format(policy_name, clientid)
         )
+        self.logger.info("Checking if '{0}' already exists...".format(policy_name))
+        client_policy = self.get_client_policy_by_name(policy_name)
+        ret, _ = self._save_client_policy(
+            clientid,
+            policy_name,
+            client_policy,
+            policy_description,
+            policy_logic,
+            policy_strategy,
+        )
+        return ret
+
+    def _save_client_policy(
+        self,
+        clientid,
+        policy_name,
+        client_policy,
+        policy_description="",
+        policy_logic="POSITIVE",
+        policy_strategy="UNANIMOUS",
+    ):
+        """
+        Creates the client policy, or subscribes the client to the existing one
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        client_policy: the policies matching policy_name, as returned by get_client_policy_by_name
+        Returns: the response, None if no request was needed, and the saved policy
+        """
         headers = self.__get_admin_access_token_headers()
         url = "{0}/admin/realms/{1}/clients/{2}/authz/resource-server/policy/client".format(
             self.base_url, self.realm, self.master_realm_client["id"]
         )
 
-        self.logger.info("Checking if '{0}' already exists...".format(policy_name))
-        client_policy = self.get_client_policy_by_name(policy_name)
-
         if len(client_policy) == 0:
             # create new policy
             self.logger.info(
@@ -604,6 +998,14 @@ class KeycloakAPIClient:
             subscribed_clients = [clientid]
 
         else:
+            subscribed_clients = json.loads(client_policy[0]["config"]["clients"])
+            if clientid in subscribed_clients:
+                self.logger.info(
+                    "Client '{0}' is already subscribed to policy {1}".format(
+                        clientid, policy_name
+                    )
+                )
+                return None, client_policy[0]
             # update already existing policy
             self.logger.info(
                 "There is an exisintg policy with name {0}. Updating it to subscribe client '{1}'".format(
@@ -612,7 +1014,6 @@ class KeycloakAPIClient:
             )
             url = url + "/{0}".format(client_policy[0]["id"])
             http_method = "put"
-            subscribed_clients = json.loads(client_policy[0]["config"]["clients"])
             subscribed_clients.append(clientid)
 
         data = {
@@ -627,7 +1028,27 @@ class KeycloakAPIClient:
         ret = self.__send_request(
             http_method, url, headers=headers, data=json.dumps(data)
         )
-        return ret
+        if http_method == "post":
+            # Keycloak answers with the created policy
+            return ret, json.loads(ret.text)
+        return ret, client_policy[0]
+
+    def save_client_policy_definition(self, definition, policy_id=None):
+        """
+        Creates the client policy, or replaces the one with the given ID
+        definition: the client policy representation, with the IDs of its "clients"
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/clients/{2}/authz/resource-server/policy/client".format(
+            self.base_url, self.realm, self.master_realm_client["id"]
+        )
+        if policy_id is None:
+            self.logger.info("Creating policy '{0}'".format(definition["name"]))
+            return self.__send_request("post", url, headers=headers, data=json.dumps(definition))
+        self.logger.info("Updating policy '{0}'".format(definition["name"]))
+        return self.__send_request(
+            "put", "{0}/{1}".format(url, policy_id), headers=headers, data=json.dumps(definition)
+        )
 
     def get_auth_permission_by_name(self, permission_name):
         """
@@ -683,28 +1104,38 @@ class KeycloakAPIClient:
         Grant token-exchange permission for target client to destination client
         target_client_object: Object of the target client
         requestor_client_object: Object of the requestor client
+        Returns: the response, or None if the permission was already granted
         """
         requestor_clientid = requestor_client_object.definition["clientId"]
         requestor_id = requestor_client_object.definition["id"]
         target_clientid = target_client_object.definition["clientId"]
         target_id = target_client_object.definition["id"]
 
-        self.set_client_fine_grain_permission(target_id, True)
-        client_token_exchange_permission = self.get_client_token_exchange_permission(
-            target_id
-        )
-        tep_associated_policies = self.get_permission_associated_policies(
-            client_token_exchange_permission["id"]
-        )
-        policies = [policy["id"] for policy in tep_associated_policies]
-
         policy_name = "allow token exchange for {0}".format(requestor_clientid)
         policy_description = "Allow token exchange for '{0}' client".format(
             requestor_clientid
         )
 
-        self.create_client_policy(requestor_id, policy_name, policy_description)
-        policy = self.get_client_policy_by_name(policy_name)[0]
+        # The requestor policy lookup does not depend on the target permission chain
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            client_policy = executor.submit(
+                self._bind_read_memo(self.get_client_policy_by_name), policy_name
+            )
+            client_token_exchange_permission, policies = self.__get_token_exchange_permission_and_policies(
+                target_id, enable_permissions=True
+            )
+            client_policy = client_policy.result()
+
+        _, policy = self._save_client_policy(
+            requestor_id, policy_name, client_policy, policy_description
+        )
+        if policy["id"] in policies:
+            self.logger.info(
+                "Token-exhange between client '{0}' and '{1}' already granted".format(
+                    target_clientid, requestor_clientid
+                )
+            )
+            return None
 
         self.logger.info(
             "Granting token-exhange between client '{0}' and '{1}'".format(
@@ -729,36 +1160,29 @@ class KeycloakAPIClient:
         target_clientid = target_client_object.definition["clientId"]
         target_id = target_client_object.definition["id"]
 
-        client_token_exchange_permission = self.get_client_token_exchange_permission(
-            target_id
-        )
-        tep_associated_policies = self.get_permission_associated_policies(
-            client_token_exchange_permission["id"]
-        )
-        policies = [policy["id"] for policy in tep_associated_policies]
         policy_name = "allow token exchange for {0}".format(requestor_clientid)
-        policy = self.get_client_policy_by_name(policy_name)
-
-        if len(policy) == 0:
-            # policy not found. It might be using the old naming convention...
-            policy_name_old = "allow token exchange for {0}".format(requestor_id)
-            self.logger.info(
-                "Policy '{0}' not found. Trying using the old naming convention '{1}'".format(
-                    policy_name, policy_name_old
-                )
+        # The policy might be using the old naming convention...
+        policy_name_old = "allow token exchange for {0}".format(requestor_id)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            get_policy = self._bind_read_memo(self.get_client_policy_by_name)
+            policy = executor.submit(get_policy, policy_name)
+            policy_old = executor.submit(get_policy, policy_name_old)
+            client_token_exchange_permission, policies = self.__get_token_exchange_permission_and_policies(
+                target_id
             )
-            policy = self.get_client_policy_by_name(policy_name_old)[0]
-        else:
-            policy = policy[0]
+            policy = policy.result() or policy_old.result()
 
+        not_found_error = ValueError(
+            "Token exchange permissions not found between client '{0}' and '{1}'".format(
+                target_clientid, requestor_clientid
+            )
+        )
+        if len(policy) == 0:
+            raise not_found_error
         try:
-            policies.remove(policy["id"])
+            policies.remove(policy[0]["id"])
         except ValueError:
-            raise ValueError(
-                "Token exchange permissions not found between client '{0}' and '{1}'".format(
-                    target_clientid, requestor_clientid
-                )
-            )
+            raise not_found_error
         self.logger.info(
             "Revoking token-exhange between client '{0}' and '{1}'".format(
                 target_clientid, requestor_clientid
@@ -768,6 +1192,157 @@ class KeycloakAPIClient:
             client_token_exchange_permission, policies
         )
 
+    def bulk_update_token_exchange_permissions(self, pairs, grant=True):
+        """
+        Grants or revokes token-exchange permissions for many (target, requestor) clientId pairs
+        The clients are resolved from a single listing, each requestor policy is saved or looked up
+        once, and each target permission gets at most one update. The targets are updated concurrently.
+        pairs: list of (target clientId, requestor clientId) tuples
+        grant: True to grant the permissions, False to revoke them
+        Returns: Dict of (target, requestor) -> error, None if the pair was granted or revoked
+        """
+        clientids = {client["clientId"]: client["id"] for client in self.stream_all_clients()}
+        errors = self._get_missing_client_errors(pairs, clientids)
+        valid_pairs = [pair for pair in dict.fromkeys(pairs) if pair not in errors]
+
+        def get_requestor_policy_id(requestor):
+            return self._get_requestor_policy_id(requestor, clientids, grant)
+
+        policy_ids = {}
+        for requestor, policy_id, error in run_concurrently(
+            self._bind_read_memo(get_requestor_policy_id),
+            {requestor for _, requestor in valid_pairs},
+            self.max_workers,
+        ):
+            if error is None:
+                policy_ids[requestor] = policy_id
+            else:
+                self.logger.error(
+                    "Cannot save token-exchange policy of client '{0}': {1}".format(requestor, error)
+                )
+                errors.update({pair: error for pair in valid_pairs if pair[1] == requestor})
+
+        requestors_by_target = {}
+        for target, requestor in valid_pairs:
+            if (target, requestor) not in errors:
+                requestors_by_target.setdefault(target, []).append(requestor)
+
+        def update_target(target):
+            return self._update_target_policies(
+                target, requestors_by_target[target], clientids, policy_ids, grant
+            )
+
+        for target, not_found, error in run_concurrently(
+            self._bind_read_memo(update_target), requestors_by_target, self.max_workers
+        ):
+            for requestor in requestors_by_target[target]:
+                errors[(target, requestor)] = error or not_found.get(requestor)
+        return {pair: errors.get(pair) for pair in pairs}
+
+    @staticmethod
+    def _get_missing_client_errors(pairs, clientids):
+        """
+        Returns: Dict of (target, requestor) -> ResourceNotFoundError, for the pairs with a client not found
+        """
+        errors = {}
+        for target, requestor in pairs:
+            missing = [client_id for client_id in (target, requestor) if client_id not in clientids]
+            if missing:
+                errors[(target, requestor)] = ResourceNotFoundError(
+                    "Client '{0}' not found".format(missing[0])
+                )
+        return errors
+
+    def _get_requestor_policy_id(self, requestor, clientids, grant):
+        """
+        Saves the token-exchange policy of the requestor when granting, or looks it up when revoking
+        clientids: the IDs of the clients, by clientId
+        Returns: the ID of the policy, None if there is none to revoke
+        """
+        policy_name = "allow token exchange for {0}".format(requestor)
+        client_policy = self.get_client_policy_by_name(policy_name)
+        if grant:
+            _, policy = self._save_client_policy(
+                clientids[requestor],
+                policy_name,
+                client_policy,
+                "Allow token exchange for '{0}' client".format(requestor),
+            )
+            return policy["id"]
+        # The policy might be using the old naming convention...
+        client_policy = client_policy or self.get_client_policy_by_name(
+            "allow token exchange for {0}".format(clientids[requestor])
+        )
+        return client_policy[0]["id"] if client_policy else None
+
+    def _update_target_policies(self, target, requestors, clientids, policy_ids, grant):
+        """
+        Adds or removes the policies of the requestors to the token-exchange permission of the target,
+        with a single update
+        policy_ids: the IDs of the requestor policies, by requestor clientId
+        Returns: Dict of requestor -> ResourceNotFoundError, for the permissions to revoke that do not exist
+        """
+        permission, policies = self.__get_token_exchange_permission_and_policies(
+            clientids[target], enable_permissions=grant
+        )
+        new_policies = list(policies)
+        not_found = {}
+        for requestor in requestors:
+            policy_id = policy_ids[requestor]
+            if grant and policy_id not in new_policies:
+                new_policies.append(policy_id)
+            elif not grant and policy_id in new_policies:
+                new_policies.remove(policy_id)
+            elif not grant:
+                not_found[requestor] = ResourceNotFoundError(
+                    "Token exchange permissions not found between client '{0}' and '{1}'".format(
+                        target, requestor
+                    )
+                )
+        if new_policies != policies:
+            self.logger.info(
+                "{0} token-exhange between client '{1}' and {2}".format(
+                    "Granting" if grant else "Revoking", target, requestors
+                )
+            )
+            self.update_token_exchange_permissions(permission, new_policies)
+        return not_found
+
+    def set_token_exchange_permission_policies(self, clientid, policy_ids):
+        """
+        Sets the policies of the client's token-exchange permission, enabling the client's
+        fine grain permissions first if the permission does not exist yet
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        Returns: False if the permission already had exactly these policies
+        """
+        existing = self.get_auth_permission_by_name(
+            "token-exchange.permission.client.{0}".format(clientid)
+        )
+        permission, policies = self.__get_token_exchange_permission_and_policies(
+            clientid, enable_permissions=not existing
+        )
+        if set(policies) == set(policy_ids):
+            return False
+        self.update_token_exchange_permissions(permission, list(policy_ids))
+        return True
+
+    def __get_token_exchange_permission_and_policies(self, clientid, enable_permissions=False):
+        """
+        Gets the token-exchange permission of the client and the IDs of its associated policies
+        clientid: ID string of the client. E.g: 6781736b-e1f7-4ff7-a883-f4168c4dbd8a
+        enable_permissions: enable the client's fine grain permissions first
+        """
+        if enable_permissions:
+            self.set_client_fine_grain_permission(clientid, True)
+        client_token_exchange_permission = self.get_client_token_exchange_permission(
+            clientid
+        )
+        tep_associated_policies = self.get_permission_associated_policies(
+            client_token_exchange_permission["id"]
+        )
+        policies = [policy["id"] for policy in tep_associated_policies]
+        return client_token_exchange_permission, policies
+
     def update_token_exchange_permissions(
         self, client_token_exchange_permission, policies
     ):
@@ -803,6 +1378,26 @@ class KeycloakAPIClient:
         ret = self.__send_request("get", url, headers=headers)
         return json.loads(ret.text)
 
+    def get_auth_policies_page(self, first=0, max_results=100):
+        """
+        Return a page of the REALM's authorization policies and permissions
+        first: position of the first policy of the page
+        max_results: maximum number of policies in the page
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/clients/{2}/authz/resource-server/policy".format(
+            self.base_url, self.realm, self.master_realm_client["id"]
+        )
+        payload = {"first": first, "max": max_results}
+        ret = self.__send_request("get", url, headers=headers, params=payload, memoize=False)
+        return json.loads(ret.text)
+
+    def iter_auth_policies(self, page_size=100):
+        """
+        Iterate over the REALM's authorization policies and permissions, one page at a time
+        """
+        return self.__iter_pages(self.get_auth_policies_page, page_size, False, 0)
+
     def get_all_clients(self):
         """
         Return list of clients
@@ -815,6 +1410,124 @@ class KeycloakAPIClient:
         # return clients as list of json instead of string
         return json.loads(ret.text)
 
+    def stream_all_clients(self):
+        """
+        Yield the realm's clients one by one, decoded incrementally from a single listing
+        Unlike `get_all_clients`, the memory used does not grow with the number of clients.
+        """
+        self.logger.info("Streaming all clients")
+        headers = self.__get_admin_access_token_headers()
+        payload = {"viewableOnly": "true"}
+        url = "{0}/admin/realms/{1}/clients".format(self.base_url, self.realm)
+        return self.__stream_json_array("get", url, headers=headers, params=payload)
+
+    def __stream_json_array(self, request_type, url, **kwargs):
+        """
+        Sends the request and yields the elements of the JSON array of the response as they arrive
+        """
+        ret = self.__send_request(request_type, url, stream=True, **kwargs)
+        try:
+            yield from iter_json_array(ret.iter_content(chunk_size=64 * 1024))
+        finally:
+            ret.close()
+
+    def get_clients_page(self, first=0, max_results=100):
+        """
+        Return a page of the realm's clients, using Keycloak's paging
+        first: position of the first client of the page
+        max_results: maximum number of clients in the page
+        """
+        self.logger.info("Getting clients {0} to {1}".format(first, first + max_results))
+        headers = self.__get_admin_access_token_headers()
+        payload = {"viewableOnly": "true", "first": first, "max": max_results}
+        url = "{0}/admin/realms/{1}/clients".format(self.base_url, self.realm)
+        ret = self.__send_request("get", url, headers=headers, params=payload, memoize=False)
+        return json.loads(ret.text)
+
+    def iter_clients(self, page_size=100, prefetch=False, first=0):
+        """
+        Iterate over the realm's clients, one page at a time, with a bounded memory
+        page_size: number of clients fetched in each request
+        prefetch: fetch the next page on a background thread while the current one is consumed
+        first: position of the first client
+        Note: the clients listing has no brief representation in Keycloak
+        """
+        return self.__iter_pages(self.get_clients_page, page_size, prefetch, first)
+
+    def get_users_page(self, first=0, max_results=100, realm=None, brief_representation=False):
+        """
+        Return a page of the realm's users, using Keycloak's paging
+        first: position of the first user of the page
+        max_results: maximum number of users in the page
+        brief_representation: only return the basic properties of the users, e.g. no attributes
+        """
+        if not realm:
+            realm = self.realm
+        self.logger.info(
+            "Getting users {0} to {1} of realm '{2}'".format(first, first + max_results, realm)
+        )
+        headers = self.__get_admin_access_token_headers()
+        payload = {
+            "first": first,
+            "max": max_results,
+            "briefRepresentation": "true" if brief_representation else "false",
+        }
+        url = "{0}/admin/realms/{1}/users".format(self.base_url, realm)
+        ret = self.__send_request("get", url, headers=headers, params=payload, memoize=False)
+        return json.loads(ret.text)
+
+    def iter_users(self, realm=None, page_size=100, prefetch=False, brief_representation=False, first=0):
+        """
+        Iterate over the realm's users, one page at a time, with a bounded memory
+        page_size: number of users fetched in each request
+        prefetch: fetch the next page on a background thread while the current one is consumed
+        brief_representation: only return the basic properties of the users, e.g. no attributes
+        first: position of the first user
+        """
+
+        def get_page(page_first, max_results):
+            return self.get_users_page(page_first, max_results, realm, brief_representation)
+
+        return self.__iter_pages(get_page, page_size, prefetch, first)
+
+    def __iter_pages(self, get_page, page_size, prefetch, first):
+        """
+        Yields the items of the pages returned by get_page(first, max_results), until a page is not full
+        """
+        if not prefetch:
+            while True:
+                page = get_page(first, page_size)
+                yield from page
+                if len(page) < page_size:
+                    return
+                first += page_size
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(get_page, first, page_size)
+            while True:
+                page = next_page.result()
+                if len(page) == page_size:
+                    first += page_size
+                    next_page = executor.submit(get_page, first, page_size)
+                yield from page
+                if len(page) < page_size:
+                    return
+
+    def get_admin_events(self, first=0, max_results=100, resource_types=None):
+        """
+        Return a page of the realm's admin events, newest first
+        first: position of the first event of the page
+        max_results: maximum number of events in the page
+        resource_types: only return the events of these resource types, e.g. ["CLIENT"]
+        Note: Keycloak only records them if the realm has admin events enabled
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/admin-events".format(self.base_url, self.realm)
+        payload = {"first": first, "max": max_results}
+        if resource_types:
+            payload["resourceTypes"] = resource_types
+        ret = self.__send_request("get", url, headers=headers, params=payload, memoize=False)
+        return json.loads(ret.text)
+
     def get_admin_access_token(self):
         """
         https://www.keycloak.org/docs/2.5/server_development/topics/admin-rest-api.html
@@ -892,66 +1605,182 @@ class KeycloakAPIClient:
         r = self.__send_request("post", url, data=payload)
         return json.loads(r.text)
 
-    def __create_client(self, access_token, **kwargs):
+    def __create_client(self, **kwargs):
         """Private method for adding a new client.
-        access_token: https://www.oauth.com/oauth2-servers/access-tokens/access-token-response/
-        #_clientrepresentation
         kwargs: See the full list of available params: https://www.keycloak.org/docs-api/3.4/rest-api/index.html
+        #_clientrepresentation
+        Returns: ID of the new client, taken from the 'Location' header of the response
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": "Bearer {0}".format(access_token),
-        }
+        headers = self.__get_admin_access_token_headers()
         url = "{0}/admin/realms/{1}/clients".format(self.base_url, self.realm)
         self.logger.info("Creating client '%s' --> %s", kwargs["clientId"], kwargs)
-        return self.__send_request("post", url, headers=headers, json=kwargs)
+        response = self.__send_request("post", url, headers=headers, json=kwargs)
+        return response.headers["Location"].rstrip("/").split("/")[-1]
 
-    def logout_user(self, user_id):
+    def __create_client_pipeline(self, client: Client, client_type) -> Dict:
+        """
+        Creates the client with all its settings and scopes in the initial payload, then sends
+        only the properties that Keycloak ignored on creation.
+        Returns: Definition of the new client
+        """
+        client_id = client.definition["clientId"]
+        with self._count_requests() as counter:
+            clientid = self.__create_client(**client.definition)
+            created = self.__complete_created_client(
+                client, client_type, clientid, self.get_client_by_id(clientid)
+            )
+
+        self.logger.info(
+            "Client '{0}' created with {1} Keycloak calls".format(
+                client_id, counter["requests"]
+            )
+        )
+        return Client(created, client_type).definition
+
+    def __complete_created_client(self, client: Client, client_type, clientid, created, app=None) -> Dict:
+        """
+        Sends the properties of `client` that Keycloak ignored when creating or importing it,
+        and makes sure an OIDC client has a secret
+        created: representation of the client as stored by Keycloak
+        app: the Flask app the client objects are built with, the current one if not given
+        Returns: the up to date representation of the client
+        """
+        client_id = client.definition["clientId"]
+        # Keycloak may ignore some properties on creation, e.g. consentRequired
+        # See: https://www.keycloak.org/docs/latest/securing_apps/index.html#client-registration-policies
+        # (Consent Required Policy) section
+        ignored = client.get_changed_properties(created)
+        # These cannot be changed through a client update
+        for key in ["protocolMappers", "optionalClientScopes"]:
+            ignored.pop(key, None)
+        new_scopes = ignored.pop("defaultClientScopes", None)
+        if ignored:
+            self.logger.info(
+                "Keycloak ignored {0} on creation of '{1}'. Updating them".format(
+                    list(ignored), client_id
+                )
+            )
+            headers = self.__get_admin_access_token_headers()
+            original_client = Client(deepcopy(created), client_type, app=app)
+            created.update(ignored)
+            url = "{0}/admin/realms/{1}/clients/{2}".format(
+                self.base_url, self.realm, clientid
+            )
+            self.__send_request("put", url, data=json.dumps(created), headers=headers)
+            self._update_changed_certificates(
+                clientid, Client(deepcopy(created), client_type, app=app), original_client, headers
+            )
+        if new_scopes is not None:
+            self.assign_default_scopes(
+                new_scopes, created.get("defaultClientScopes", []), client_id, clientid
+            )
+        if ignored or new_scopes is not None:
+            created = self.get_client_by_id(clientid)
+
+        if client_type == ClientTypes.OIDC and not created.get("secret"):
+            headers = self.__get_admin_access_token_headers()
+            url = "{0}/admin/realms/{1}/clients/{2}/client-secret".format(
+                self.base_url, self.realm, clientid
+            )
+            client_secret_json = self.__send_request("get", url, headers=headers).json()
+            if not client_secret_json.get("value") and not created.get("publicClient"):
+                # Imported confidential clients can end up without a secret
+                self.logger.info("Generating a secret for client '{0}'".format(client_id))
+                client_secret_json = self.__send_request("post", url, headers=headers).json()
+            created["secret"] = client_secret_json.get("value")
+        return created
+
+    def partial_import(self, resources: Dict[str, List[Dict]], if_resource_exists="SKIP") -> List[Dict]:
+        """
+        Imports the resources in the realm with a single partialImport request
+        resources: the representations to import by type, e.g. {"clients": [...]}
+        if_resource_exists: FAIL, SKIP or OVERWRITE
+        Returns: the import results, with the "action", "resourceType", "resourceName" and "id" of each resource
+        """
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/partialImport".format(self.base_url, self.realm)
+        payload = dict(resources, ifResourceExists=if_resource_exists)
+        self.logger.info(
+            "Importing {0} (ifResourceExists: {1})".format(
+                ", ".join("{0} {1}".format(len(items), name) for name, items in resources.items()),
+                if_resource_exists,
+            )
+        )
+        ret = self.__send_request("post", url, headers=headers, data=json.dumps(payload))
+        return ret.json().get("results", [])
+
+    def import_clients(
+        self, clients: List[Client], if_resource_exists="SKIP", app=None
+    ) -> List[Tuple[Dict, Exception]]:
+        """
+        Creates the clients with a single partialImport request, then fixes up the imported
+        clients the same way as the clients created one by one (ignored properties,
+        certificates, default scopes and secrets), concurrently.
+        clients: Clients already merged with the defaults, with unique clientIds
+        if_resource_exists: FAIL, SKIP or OVERWRITE. Note that overwriting an existing client
+        recreates it, with a new ID.
+        app: the Flask app the client objects are built with on the worker threads
+        Returns: a (result, error) tuple per client, in the same order as `clients`. The result
+        holds the import "action" (added, skipped or overwritten) and the definition of the "client"
+        """
+        imported = {
+            result["resourceName"]: result
+            for result in self.partial_import(
+                {"clients": [client.definition for client in clients]}, if_resource_exists
+            )
+            if result.get("resourceType") == "CLIENT"
+        }
+
+        def complete(client):
+            result = imported.get(client.definition["clientId"])
+            if result is None:
+                raise KeycloakAPIError(
+                    status_code=500,
+                    message="Client '{0}' missing from the import results".format(
+                        client.definition["clientId"]
+                    ),
+                )
+            action = result["action"].lower()
+            if action == "skipped":
+                return {"action": action}
+            created = self.__complete_created_client(
+                client, client.type, result["id"], self.get_client_by_id(result["id"]), app
+            )
+            return {"action": action, "client": Client(created, client.type, app=app).definition}
+
+        completed = {
+            id(client): (result, error)
+            for client, result, error in run_concurrently(
+                self._bind_read_memo(complete), clients, self.max_workers
+            )
+        }
+        return [completed[id(client)] for client in clients]
+
+    def logout_user(self, user_id, realm=None):
         """
         Logs out the user from all his sessions
+        user_id: the user id (GUID) in the realm
         """
+        if not realm:
+            realm = self.realm
+        headers = self.__get_admin_access_token_headers()
         url = "{0}/admin/realms/{1}/users/{2}/logout".format(
-            self.base_url, self.realm, user_id
+            self.base_url, realm, user_id
         )
-        self.logger.info("Logging out user ID '{0}'".format(user_id))
-        return self.__send_request("post", url)
+        self.logger.info("Logging out user ID '{0}' from realm '{1}'".format(user_id, realm))
+        return self.__send_request("post", url, headers=headers)
 
     def create_new_openid_client(self, client: Client) -> Dict:
         """Add new OPENID client.
         kwargs: See the full list of available params: https://www.keycloak.org/docs-api/3.4/rest-api/index.html#_clientrepresentation
         """
-        access_token = self.get_access_token()
-        response = self.__create_client(access_token, **client.definition)
-        if response.ok:
-            # Hack in order to set consent_required to false if it's actually specified, not just ignore it
-            # See: https://www.keycloak.org/docs/latest/securing_apps/index.html#client-registration-policies
-            # (Consent Required Policy) section
-            update_response = self.update_client_properties(
-                client.definition["clientId"], client, client_type=ClientTypes.OIDC
-            )
-            client_secret_json = self.display_client_secret(
-                update_response.definition["clientId"]
-            ).json()
-            update_response.definition["secret"] = (
-                client_secret_json["value"] if "value" in client_secret_json else None
-            )
-            return update_response.definition
-        return response.json()
+        return self.__create_client_pipeline(client, ClientTypes.OIDC)
 
     def create_new_saml_client(self, client: Client) -> Dict:
         """Add new SAML client.
         kwargs: See the full list of available params: https://www.keycloak.org/docs-api/3.4/rest-api/index.html#_clientrepresentation
         """
-        access_token = self.get_access_token()
-        response = self.__create_client(access_token, **client.definition)
-        if response.ok:
-            # Hack in order to set consent_required to false if it's actually specified, not just ignore it
-            # See: https://www.keycloak.org/docs/latest/securing_apps/index.html#client-registration-policies
-            # (Consent Required Policy) section
-            return self.update_client_properties(
-                client.definition["clientId"],
-                client, client_type=ClientTypes.SAML).definition
-        return response.json()
+        return self.__create_client_pipeline(client, ClientTypes.SAML)
 
     def create_new_client(self, client: Client) -> Dict:
         """Add new client.
@@ -993,21 +1822,9 @@ class KeycloakAPIClient:
         """
         Update user properties
         """
-        headers = self.__get_admin_access_token_headers()
         user_object = self.get_user_by_username(upn, is_guest, realm)
         if user_object:
-            url = "{0}/admin/realms/{1}/users/{2}".format(
-                self.base_url, realm, user_object["id"]
-            )
-            for key, value in kwargs.items():
-                if key in user_object:
-                    self.logger.debug("Changing value: {}".format(value))
-                    user_object[key] = value
-                else:
-                    self.logger.warning(
-                        "'{0}' not a valid client property. Skipping...".format(key)
-                    )
-            self.__send_request("put", url, data=json.dumps(user_object), headers=headers)
+            self.update_user_object(user_object, realm, **kwargs)
 
             if realm == keycloak_client.guest_realm:
                 updated_user = self.get_user_by_username(user_object["email"], is_guest, realm)
@@ -1021,20 +1838,75 @@ class KeycloakAPIClient:
             )
             return
 
+    def update_user_object(self, user_object, realm, **kwargs):
+        """
+        Update the properties of an already fetched user with a single PUT
+        The PUT is skipped if none of the properties actually changes.
+        user_object: the user representation, updated in place
+        Returns: the updated user object
+        """
+        changes = self.get_user_changes(user_object, **kwargs)
+        if not changes:
+            self.logger.info("User '{0}' properties unchanged".format(user_object["username"]))
+            return user_object
+        headers = self.__get_admin_access_token_headers()
+        url = "{0}/admin/realms/{1}/users/{2}".format(
+            self.base_url, realm, user_object["id"]
+        )
+        for key, value in changes.items():
+            self.logger.debug("Changing value: {}".format(value))
+            user_object[key] = value
+        self.__send_request("put", url, data=json.dumps(user_object), headers=headers)
+        return user_object
+
+    def get_user_changes(self, user_object, **kwargs):
+        """
+        Returns the properties in kwargs that differ from the ones of the user.
+        Properties that the user representation does not have are skipped.
+        """
+        changes = {}
+        for key, value in kwargs.items():
+            if key not in user_object:
+                self.logger.warning(
+                    "'{0}' not a valid client property. Skipping...".format(key)
+                )
+            elif user_object[key] != value:
+                changes[key] = value
+        return changes
+
     def get_user_and_mfa_credentials(self, username):
         """
         Gets user and credentials
         username: user's username in Keycloak
         """
+        snapshot = self.get_mfa_snapshot(username)
+        return snapshot.user, snapshot.credentials, snapshot.realm
+
+    def get_mfa_snapshot(self, username) -> UserMfaSnapshot:
+        """
+        Gets the user, realm, credentials and migration status needed by the MFA checks,
+        so that they can be shared by all the operations of a request
+        username: user's username in Keycloak
+        """
         headers = self.__get_admin_access_token_headers()
-        user, realm = self.get_mfa_user_and_realm(username)
+        user, realm, migrated = self._resolve_mfa_user(username)
         url = "{0}/admin/realms/{1}/users/{2}/credentials".format(
             self.base_url, realm, user["id"]
         )
         ret = self.__send_request("get", url, headers=headers)
         self.logger.info("Getting credentials for user '{0}'".format(username))
         credentials = json.loads(ret.text)
-        return user, credentials, realm
+        return UserMfaSnapshot(user, realm, credentials, migrated)
+
+    def get_mfa_snapshots(self, usernames):
+        """
+        Gets the MFA snapshots of many users concurrently. The migration status of every user is
+        checked like for a single user, so users migrated through a group or a composite role count too.
+        Yields (username, snapshot, error) tuples as they are fetched. error is None on success.
+        """
+        yield from run_concurrently(
+            self._bind_read_memo(self.get_mfa_snapshot), usernames, self.max_workers
+        )
 
     def update_user_preferred_credential_by_id(self, username, credential_id):
         """
@@ -1075,33 +1947,42 @@ class KeycloakAPIClient:
         )
         return ret
 
-    def delete_user_credential_by_type(self, username, credential_type):
+    def delete_user_credential_by_type(self, username, credential_type, snapshot=None):
         """
         Deletes user credential by credential type
         username: users's username in Keycloak
         credential_type: string that matches the 'type' attribute, e.g. "otp"
+        snapshot: the user's MFA snapshot, fetched if not given. It is kept up to date.
         """
-        user, credentials, realm = self.get_user_and_mfa_credentials(username)
-        for credential in credentials:
+        if snapshot is None:
+            snapshot = self.get_mfa_snapshot(username)
+        for credential in list(snapshot.credentials):
             if credential["type"] == credential_type:
-                self.delete_user_credential_by_id(user["id"], credential["id"], realm)
+                self.delete_user_credential_by_id(
+                    snapshot.user["id"], credential["id"], snapshot.realm
+                )
+                snapshot.credentials.remove(credential)
         return
 
-    def delete_user_required_action_if_exists(self, username, required_action):
+    def delete_user_required_action_if_exists(self, username, required_action, snapshot=None):
         """
         Deletes user required action if the required action exists
         username: users's username in Keycloak
         required_action: string that matches the action type, e.g. "CONFIGURE_TOTP"
+        snapshot: the user's MFA snapshot, fetched if not given. It is kept up to date.
         """
-        user, realm = self.get_mfa_user_and_realm(username)
+        if snapshot is None:
+            user, realm = self.get_mfa_user_and_realm(username)
+        else:
+            user, realm = snapshot.user, snapshot.realm
         required_actions = user["requiredActions"]
-        try:
-            required_actions.remove(required_action)
-        except Exception:
-            logging.error("Exception caught trying to remove user['requiredActions']")
-        self.update_user_properties(
-            username, realm, requiredActions=required_actions
-        )
+        if required_action not in required_actions:
+            self.logger.info(
+                "User '{0}' has no required action '{1}'".format(username, required_action)
+            )
+            return
+        required_actions = [action for action in required_actions if action != required_action]
+        self.update_user_object(user, realm, requiredActions=required_actions)
 
     def create_user(self, username, realm=None):
         """
@@ -1132,67 +2013,82 @@ class KeycloakAPIClient:
         ret = self.__send_request("delete", url, headers=headers)
         return ret
 
-    def enable_otp_for_user(self, username):
+    def enable_otp_for_user(self, username, snapshot=None):
         """
         Sets up a required action to configure OTP for a user
         username: users's username in Keycloak
+        snapshot: the user's MFA snapshot, fetched if not given. It is kept up to date.
         """
-        user, realm = self.get_mfa_user_and_realm(username)
-        required_actions = user["requiredActions"]
-        required_actions.append(self.REQUIRED_ACTION_CONFIGURE_OTP)
-        self.update_user_properties(
-            username, realm, requiredActions=required_actions
+        self.__add_user_required_action(
+            username, self.REQUIRED_ACTION_CONFIGURE_OTP, snapshot
         )
 
-    def enable_webauthn_for_user(self, username):
+    def enable_webauthn_for_user(self, username, snapshot=None):
         """
         Sets up a required action to configure WebAuthn for a user
         username: users's username in Keycloak
+        snapshot: the user's MFA snapshot, fetched if not given. It is kept up to date.
         """
-        user, realm = self.get_mfa_user_and_realm(username)
-        required_actions = user["requiredActions"]
-        required_actions.append(self.REQUIRED_ACTION_WEBAUTHN_REGISTER)
-        self.update_user_properties(
-            username, realm, requiredActions=required_actions
+        self.__add_user_required_action(
+            username, self.REQUIRED_ACTION_WEBAUTHN_REGISTER, snapshot
         )
 
-    def disable_otp_for_user(self, username):
+    def __add_user_required_action(self, username, required_action, snapshot):
+        if snapshot is None:
+            user, realm = self.get_mfa_user_and_realm(username)
+        else:
+            user, realm = snapshot.user, snapshot.realm
+        required_actions = user["requiredActions"] + [required_action]
+        self.update_user_object(user, realm, requiredActions=required_actions)
+
+    def disable_otp_for_user(self, username, snapshot=None):
         """
         Deletes all OTP-related credentials and required actions
         username: users's username in Keycloak
+        snapshot: the user's MFA snapshot, fetched if not given. It is kept up to date.
         """
-        self.delete_user_credential_by_type(username, self.CREDENTIAL_TYPE_OTP)
+        if snapshot is None:
+            snapshot = self.get_mfa_snapshot(username)
+        self.delete_user_credential_by_type(
+            username, self.CREDENTIAL_TYPE_OTP, snapshot=snapshot
+        )
         self.delete_user_required_action_if_exists(
-            username, self.REQUIRED_ACTION_CONFIGURE_OTP
+            username, self.REQUIRED_ACTION_CONFIGURE_OTP, snapshot=snapshot
         )
 
-    def disable_webauthn_for_user(self, username):
+    def disable_webauthn_for_user(self, username, snapshot=None):
         """
         Deletes all WebAuthn related credentials and required actions
         username: users's username in Keycloak
+        snapshot: the user's MFA snapshot, fetched if not given. It is kept up to date.
         """
-        self.delete_user_credential_by_type(username, self.CREDENTIAL_TYPE_WEBAUTHN)
+        if snapshot is None:
+            snapshot = self.get_mfa_snapshot(username)
+        self.delete_user_credential_by_type(
+            username, self.CREDENTIAL_TYPE_WEBAUTHN, snapshot=snapshot
+        )
         self.delete_user_required_action_if_exists(
-            username, self.REQUIRED_ACTION_WEBAUTHN_REGISTER
+            username, self.REQUIRED_ACTION_WEBAUTHN_REGISTER, snapshot=snapshot
         )
 
     def is_credential_enabled_for_user(
-        self, username, required_action_type, credential_type
+        self, username, required_action_type, credential_type, snapshot=None
     ):
         """
         Returns True if the required action type or credential type is present for a user, False otherwise
         username: users's username in Keycloak
         required_action_type: string that matches the action type, e.g. "CONFIGURE_TOTP"
         credential_type: string that matches the 'type' attribute, e.g. "otp"
+        snapshot: the user's MFA snapshot, fetched if not given
         :return: enabled (Boolean), requires_init (Boolean)
         """
-        user, credentials, _ = self.get_user_and_mfa_credentials(username)
+        if snapshot is None:
+            snapshot = self.get_mfa_snapshot(username)
         requires_init, enabled = False, False
-        required_actions = user["requiredActions"]
-        if required_action_type in required_actions:
+        if required_action_type in snapshot.required_actions:
             requires_init = True
             enabled = True
-        for credential in credentials:
+        for credential in snapshot.credentials:
             if credential["type"] == credential_type:
                 enabled = True
         return enabled, requires_init
@@ -1212,8 +2108,10 @@ class KeycloakAPIClient:
                 return True, False, credential["id"]
         return False, False, None
 
-    def get_user_mfa_settings(self, username):
-        user, credentials, _ = self.get_user_and_mfa_credentials(username)
+    def get_user_mfa_settings(self, username, snapshot=None):
+        if snapshot is None:
+            snapshot = self.get_mfa_snapshot(username)
+        user, credentials = snapshot.user, snapshot.credentials
         otp_must_initialize = (
             self.REQUIRED_ACTION_CONFIGURE_OTP in user["requiredActions"]
         )
@@ -1259,7 +2157,8 @@ class KeycloakAPIClient:
         url = "{0}/admin/realms/{1}/users/{2}/role-mappings/realm/composite".format(
             self.base_url, self.mfa_realm, user_id
         )
-        response = self.__send_request("get", url, headers=self.headers)
+        headers = self.__get_admin_access_token_headers()
+        response = self.__send_request("get", url, headers=headers)
         response_json = response.json()
         if isinstance(response_json, list):
             role_names = map(lambda list_obj: list_obj["name"], response_json)
@@ -1267,12 +2166,29 @@ class KeycloakAPIClient:
         else:
             return False
 
-    def get_mfa_user_and_realm(self, username):
-        mfa_user = self.get_user_by_username(username, False, self.mfa_realm)
-        if self._is_user_migrated_by_id(mfa_user["id"]):
-            return self.get_user_by_username(username, False, self.realm), self.realm
+    def _resolve_mfa_user(self, username):
+        """
+        Finds the realm holding the user's MFA settings.
+        The user is searched in the mfa and main realms concurrently, and the results are
+        reconciled once the migration status of the mfa user is known.
+        Returns: user, realm, migrated
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            main_user = executor.submit(
+                self._bind_read_memo(self.get_user_by_username), username, False, self.realm
+            )
+            mfa_user = self.get_user_by_username(username, False, self.mfa_realm)
+            migrated = self._is_user_migrated_by_id(mfa_user["id"])
+        if migrated:
+            # Raises ResourceNotFoundError if the user is missing from the main realm
+            return main_user.result(), self.realm, True
         else:
-            return mfa_user, self.mfa_realm
+            # The main realm user, or its absence, does not matter here
+            return mfa_user, self.mfa_realm, False
+
+    def get_mfa_user_and_realm(self, username):
+        user, realm, _ = self._resolve_mfa_user(username)
+        return user, realm
 
     def is_user_migrated_by_username(self, username):
         mfa_user = self.get_user_by_username(username, realm=self.mfa_realm)
@@ -6,6 +6,26 @@ from log_utils import configure_logging
 import json
 
 
+def definition_matches(desired, current):
+    """
+    Structural comparison of a (partial) definition against the one stored in Keycloak.
+    Dicts are only compared on the keys present in `desired`, since Keycloak fills in its own
+    defaults, and lists are compared regardless of their order.
+    """
+    if isinstance(desired, dict):
+        return isinstance(current, dict) and all(
+            key in current and definition_matches(value, current[key])
+            for key, value in desired.items()
+        )
+    if isinstance(desired, list):
+        return (
+            isinstance(current, list)
+            and len(desired) == len(current)
+            and all(any(definition_matches(d, c) for c in current) for d in desired)
+        )
+    return desired == current
+
+
 class ClientTypes:
     SAML = "saml"
     OIDC = "openid"
@@ -18,6 +38,8 @@ class Client:
     client_defaults = None
     partial_definition = False
     max_string_size = 255
+    # Whether the last update changed the client in Keycloak, None if unknown
+    changed = None
 
     def init_app(self, app=None):
         """Initialize the application object for this client"""
@@ -101,6 +123,15 @@ class Client:
                 output[k] = self.definition[k]
         self.definition = output
 
+    def get_changed_properties(self, current_definition):
+        """Returns the properties of this definition that differ from `current_definition`"""
+        return {
+            key: value
+            for key, value in self.definition.items()
+            if key != "id"
+            and (key not in current_definition or not definition_matches(value, current_definition[key]))
+        }
+
     def get_saml_signing_certificate(self):
         if self.definition.get("attributes"):
             return self.definition["attributes"].get("saml.signing.certificate")
@@ -157,3 +188,25 @@ class Client:
     def __truncate_string_field(self, field_name):
         if len(self.definition[field_name]) > self.max_string_size:
             self.definition[field_name] = self.definition[field_name][:self.max_string_size - 2] + '..'
+
+
+class UserMfaSnapshot:
+    """
+    MFA state of a user, fetched once and shared by all the checks and mutations of a request
+    """
+
+    def __init__(self, user, realm, credentials, migrated):
+        """Constructor. Keyword arguments:
+                - user: the user representation, from the realm holding the user's MFA settings
+                - realm: the realm holding the user's MFA settings
+                - credentials: the list of credentials of the user
+                - migrated: True if the user has the MFA migration role
+        """
+        self.user = user
+        self.realm = realm
+        self.credentials = credentials
+        self.migrated = migrated
+
+    @property
+    def required_actions(self):
+        return self.user["requiredActions"]
@@ -0,0 +1,174 @@
+from copy import deepcopy
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from flask import current_app
+
+from client_index import SECRET_PROPERTIES
+from keycloak_api_client.keycloak import keycloak_client
+from model import Client, definition_matches
+from snapshot import BUILTIN_CLIENT_IDS, SEPARATE_PROPERTIES
+from utils import RateLimiter, ResourceNotFoundError, run_concurrently
+
+# The order of the actions of a client
+ACTIONS = ["delete", "create", "update", "scopes"]
+
+
+def plan_reconciliation(desired: List[Client], current_clients: Iterable[Dict], prune=False) -> List[Dict[str, Any]]:
+    """
+    Compares the desired clients with the current ones, and plans only the changes needed
+    desired: the desired clients, merged with the defaults as they would be created
+    current_clients: the current client representations, e.g. from a single listing
+    prune: also delete the current clients that are not desired, except Keycloak's built-in ones
+    Returns: the actions of the plan, ordered by clientId. Every action has an "action"
+    (create, update, scopes or delete) and a "clientId".
+    """
+    desired_by_client_id = {client.definition["clientId"]: client for client in desired}
+    plan = []
+    for current in current_clients:
+        client = desired_by_client_id.pop(current["clientId"], None)
+        if client is not None:
+            plan.extend(_plan_client_changes(client, current))
+        elif prune and current["clientId"] not in BUILTIN_CLIENT_IDS:
+            plan.append({"action": "delete", "clientId": current["clientId"], "id": current["id"]})
+    for client_id, client in desired_by_client_id.items():
+        plan.append(
+            {"action": "create", "clientId": client_id, "protocol": client.type, "definition": client.definition}
+        )
+    return sorted(plan, key=lambda action: (action["clientId"], ACTIONS.index(action["action"])))
+
+
+def _with_default_protocol(current):
+    # Keycloak leaves the protocol out of some representations, the clients are then openid-connect ones
+    return current if current.get("protocol") else dict(current, protocol="openid-connect")
+
+
+def _plan_client_changes(client: Client, current):
+    actions = []
+    changes = {
+        key: value
+        for key, value in client.get_changed_properties(_with_default_protocol(current)).items()
+        # The representations of the client index have no secrets
+        if key not in SEPARATE_PROPERTIES and not (key in SECRET_PROPERTIES and key not in current)
+    }
+    if changes:
+        actions.append(
+            {
+                "action": "update",
+                "clientId": client.definition["clientId"],
+                "id": current["id"],
+                "protocol": client.type,
+                "changes": changes,
+                "current": current,
+            }
+        )
+    if "defaultClientScopes" in client.definition:
+        desired_scopes = set(client.definition["defaultClientScopes"])
+        current_scopes = set(current.get("defaultClientScopes") or [])
+        if desired_scopes != current_scopes:
+            actions.append(
+                {
+                    "action": "scopes",
+                    "clientId": client.definition["clientId"],
+                    "id": current["id"],
+                    "add": sorted(desired_scopes - current_scopes),
+                    "remove": sorted(current_scopes - desired_scopes),
+                }
+            )
+    return actions
+
+
+def describe_plan(plan) -> List[Dict[str, Any]]:
+    """
+    Returns the plan as shown to the users: without the current representations, and with the secrets masked
+    """
+    described = []
+    for action in plan:
+        action = {key: value for key, value in action.items() if key != "current"}
+        for key in ["changes", "definition"]:
+            if key in action:
+                action[key] = {
+                    name: "**********" if name in SECRET_PROPERTIES else value
+                    for name, value in action[key].items()
+                }
+        described.append(action)
+    return described
+
+
+def summarize_plan(plan) -> Dict[str, int]:
+    summary = dict.fromkeys(ACTIONS, 0)
+    for action in plan:
+        summary[action["action"]] += 1
+    return summary
+
+
+def apply_plan(
+    plan, create_client: Callable[[Client], Any], max_workers=8, rate_limit=None
+) -> Iterator[Tuple[Dict[str, Any], Exception]]:
+    """
+    Applies the actions of a plan, the clients in parallel and the actions of a client in order.
+    The remaining actions of a client are skipped once one fails.
+    create_client: creates a client of a "create" action, with the same pipeline as the API
+    Yields: an (action, error) tuple per action applied, error is None on success
+    """
+    app = current_app._get_current_object()
+    rate_limiter = RateLimiter(rate_limit)
+    scope_ids = {}
+    if any(action["action"] == "scopes" for action in plan):
+        scope_ids = {scope["name"]: scope["id"] for scope in keycloak_client.get_scopes()}
+    actions_by_client = {}
+    for action in plan:
+        actions_by_client.setdefault(action["clientId"], []).append(action)
+
+    def apply(client_id):
+        outcomes = []
+        with app.app_context():
+            for action in actions_by_client[client_id]:
+                try:
+                    _apply_action(action, create_client, scope_ids, rate_limiter)
+                except Exception as e:
+                    outcomes.append((action, e))
+                    break
+                outcomes.append((action, None))
+        return outcomes
+
+    for client_id, outcomes, error in run_concurrently(apply, actions_by_client, max_workers):
+        if error is not None:
+            outcomes = [(action, error) for action in actions_by_client[client_id]]
+        yield from outcomes
+
+
+def _apply_action(action, create_client, scope_ids, rate_limiter):
+    if action["action"] == "delete":
+        rate_limiter.wait()
+        keycloak_client.delete_client_by_id(action["id"])
+    elif action["action"] == "create":
+        rate_limiter.wait()
+        create_client(Client(deepcopy(action["definition"]), action["protocol"]))
+    elif action["action"] == "update":
+        _apply_update(action, rate_limiter)
+    else:
+        missing = [name for name in action["add"] if name not in scope_ids]
+        if missing:
+            raise ResourceNotFoundError("Scopes not found: {0}".format(missing))
+        for name in action["add"]:
+            rate_limiter.wait()
+            keycloak_client.set_client_default_scope(action["id"], scope_ids[name], "put")
+        for name in action["remove"]:
+            if name in scope_ids:
+                rate_limiter.wait()
+                keycloak_client.set_client_default_scope(action["id"], scope_ids[name], "delete")
+
+
+def _apply_update(action, rate_limiter):
+    """
+    Applies the planned changes on top of a fresh representation of the client, since the one of the plan
+    can be stale (e.g. from the mirror) and sending it back would revert the changes made since
+    """
+    rate_limiter.wait()
+    current = keycloak_client.get_client_by_id(action["id"])
+    if definition_matches(action["changes"], _with_default_protocol(current)):
+        return
+    rate_limiter.wait()
+    keycloak_client.apply_client_changes(
+        Client(current, action["protocol"], partial_definition=True), action["changes"]
+    )
@@ -0,0 +1,240 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from keycloak_api_client.keycloak import keycloak_client
+from log_utils import configure_logging
+from utils import RateLimiter, ResourceNotFoundError, run_concurrently
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RotationJobs:
+    """
+    Rotates the secrets of many OIDC clients in staggered batches, in a background thread.
+    Every job is persisted as a JSON file after each batch, so that it can be resumed after a restart.
+    """
+
+    def init_app(self, app):
+        """
+        Initialize the rotation jobs based on the app config, and resume the unfinished ones
+        """
+        self.jobs_dir = app.config["ROTATION_JOBS_DIR"]
+        self.batch_size = app.config["ROTATION_BATCH_SIZE"]
+        self.batch_interval = app.config["ROTATION_BATCH_INTERVAL"]
+        self.rate_limit = app.config["BULK_RATE_LIMIT"]
+        self.max_workers = app.config["BULK_MAX_WORKERS"]
+        self.logger = configure_logging(app.config["LOG_DIR"])
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        if app.config["ROTATION_JOBS_AUTO_RESUME"]:
+            for job in self.list_jobs():
+                if job["status"] in ["pending", "running"]:
+                    self.logger.info("Resuming secret rotation job '{0}'".format(job["id"]))
+                    self.start(job["id"])
+
+    def select_clients(self, client_ids=None) -> List[Dict[str, str]]:
+        """
+        Selects the confidential OIDC clients from a single client listing
+        client_ids: the clientIds to select, all the clients if None
+        Returns: list of {"clientId", "id"}
+        Raises ResourceNotFoundError if one of client_ids is not a confidential OIDC client
+        """
+        clients = {
+            client["clientId"]: client["id"]
+            for client in keycloak_client.stream_all_clients()
+            if client["protocol"] == "openid-connect" and not client.get("publicClient")
+        }
+        if client_ids is None:
+            client_ids = sorted(clients)
+        missing = [client_id for client_id in client_ids if client_id not in clients]
+        if missing:
+            raise ResourceNotFoundError(
+                "Confidential OpenID clients not found: {0}".format(missing)
+            )
+        return [{"clientId": client_id, "id": clients[client_id]} for client_id in dict.fromkeys(client_ids)]
+
+    def create_job(self, clients, batch_size=None, batch_interval=None, start_at=None) -> Dict[str, Any]:
+        """
+        Creates and starts a rotation job
+        clients: the clients to rotate, as returned by `select_clients`
+        batch_size: number of secrets rotated in each batch
+        batch_interval: seconds to wait between two batches
+        start_at: datetime before which the job does not start, UTC if it has no timezone
+        """
+        if start_at is not None and start_at.tzinfo is None:
+            start_at = start_at.replace(tzinfo=timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "pending",
+            "createdAt": _now(),
+            "updatedAt": _now(),
+            "startAt": start_at.isoformat() if start_at else None,
+            "batchSize": batch_size or self.batch_size,
+            "batchInterval": self.batch_interval if batch_interval is None else batch_interval,
+            "total": len(clients),
+            "next": 0,
+            "rotated": 0,
+            "failed": {},
+            "clients": clients,
+        }
+        self._save(job)
+        self.logger.info(
+            "Created secret rotation job '{0}' for {1} clients".format(job["id"], len(clients))
+        )
+        self.start(job["id"])
+        return job
+
+    def get_job(self, job_id) -> Dict[str, Any]:
+        """
+        Returns the persisted job. Raises ResourceNotFoundError if it does not exist
+        """
+        try:
+            with open(self._job_path(job_id)) as job_file:
+                return json.load(job_file)
+        except (FileNotFoundError, ValueError):
+            raise ResourceNotFoundError("Rotation job '{0}' not found".format(job_id))
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for file_name in sorted(os.listdir(self.jobs_dir)):
+            if file_name.endswith(".json"):
+                try:
+                    jobs.append(self.get_job(file_name[:-len(".json")]))
+                except ResourceNotFoundError:
+                    continue
+        return sorted(jobs, key=lambda job: job["createdAt"])
+
+    def pause(self, job_id) -> Dict[str, Any]:
+        """
+        Asks the job to stop before its next batch. Works from any process sharing the jobs directory.
+        """
+        job = self.get_job(job_id)
+        if job["status"] in ["pending", "running"]:
+            # A separate file, since the job file is rewritten by the process running the job
+            open(self._job_path(job_id, ".pause"), "w").close()
+        return job
+
+    def resume(self, job_id) -> Dict[str, Any]:
+        """
+        Restarts a paused or failed job from its last completed batch
+        """
+        job = self.get_job(job_id)
+        if os.path.exists(self._job_path(job_id, ".pause")):
+            os.remove(self._job_path(job_id, ".pause"))
+        if job["status"] in ["paused", "failed"]:
+            job["status"] = "pending"
+            job.pop("error", None)
+            self._save(job)
+        self.start(job_id)
+        return job
+
+    def start(self, job_id):
+        """
+        Runs the job in a background thread, unless it is already running
+        """
+        thread = threading.Thread(
+            target=self._run, args=(job_id,), name="rotation-{0}".format(job_id), daemon=True
+        )
+        thread.start()
+
+    def _run(self, job_id):
+        with self._job_lock(job_id) as acquired:
+            if not acquired:
+                self.logger.info("Secret rotation job '{0}' is already running".format(job_id))
+                return
+            job = self.get_job(job_id)
+            if job["status"] not in ["pending", "running"]:
+                return
+            try:
+                self._wait_for_start(job)
+                self._rotate_batches(job)
+            except Exception as e:
+                self.logger.exception("Secret rotation job '{0}' failed".format(job_id))
+                job.update(status="failed", error=str(e))
+                self._save(job)
+
+    def _wait_for_start(self, job):
+        if job["startAt"]:
+            delay = (datetime.fromisoformat(job["startAt"]) - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                self.logger.info(
+                    "Secret rotation job '{0}' starts in {1:.0f}s".format(job["id"], delay)
+                )
+                time.sleep(delay)
+
+    def _rotate_batches(self, job):
+        rate_limiter = RateLimiter(self.rate_limit)
+
+        def rotate(client):
+            rate_limiter.wait()
+            keycloak_client.regenerate_client_secret_by_id(client["id"])
+
+        while job["next"] < job["total"]:
+            if os.path.exists(self._job_path(job["id"], ".pause")):
+                os.remove(self._job_path(job["id"], ".pause"))
+                job["status"] = "paused"
+                self._save(job)
+                self.logger.info("Secret rotation job '{0}' paused".format(job["id"]))
+                return
+            job["status"] = "running"
+            batch = job["clients"][job["next"]:job["next"] + job["batchSize"]]
+            for client, _, error in run_concurrently(
+                rotate, batch, min(self.max_workers, len(batch))
+            ):
+                if error is None:
+                    job["rotated"] += 1
+                else:
+                    self.logger.error(
+                        "Cannot rotate secret of client '{0}': {1}".format(client["clientId"], error)
+                    )
+                    job["failed"][client["clientId"]] = str(error)
+            job["next"] += len(batch)
+            self._save(job)
+            self.logger.info(
+                "Secret rotation job '{0}': {1}/{2} clients done".format(
+                    job["id"], job["next"], job["total"]
+                )
+            )
+            if job["next"] < job["total"]:
+                # Stagger the batches, so that Keycloak and the applications are not all hit at once
+                time.sleep(job["batchInterval"])
+        job["status"] = "completed"
+        self._save(job)
+
+    @contextmanager
+    def _job_lock(self, job_id):
+        """
+        Holds an exclusive lock on the job, shared by all the processes using the jobs directory
+        Yields False if another thread or process holds it
+        """
+        with open(self._job_path(job_id, ".lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self, job):
+        job["updatedAt"] = _now()
+        path = self._job_path(job["id"])
+        with open(path + ".tmp", "w") as job_file:
+            json.dump(job, job_file)
+        os.replace(path + ".tmp", path)
+
+    def _job_path(self, job_id, extension=".json"):
+        return os.path.join(self.jobs_dir, os.path.basename(job_id) + extension)
+
+
+rotation_jobs: RotationJobs = RotationJobs()
@@ -0,0 +1,668 @@
+import fcntl
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List
+
+import click
+from flask.cli import AppGroup, with_appcontext
+
+from client_index import without_secrets
+from keycloak_api_client.keycloak import keycloak_client
+from model import definition_matches
+from log_utils import configure_logging
+from utils import RateLimiter, ResourceNotFoundError, run_concurrently
+
+MANIFEST_FILE = "manifest.json"
+IMPORT_REPORT_FILE = "import.json"
+SNAPSHOT_VERSION = 1
+TOKEN_EXCHANGE_PERMISSION_PREFIX = "token-exchange.permission.client."
+# Created by Keycloak in every realm, with realm specific URLs: never overwritten by an import
+BUILTIN_CLIENT_IDS = {
+    "account", "account-console", "admin-cli", "broker", "realm-management", "security-admin-console",
+}
+
+# Not changed by a client update in Keycloak: the default client scopes are reconciled by their own requests
+SEPARATE_PROPERTIES = ["defaultClientScopes", "optionalClientScopes", "protocolMappers"]
+
+snapshot_cli = AppGroup("snapshot", help="Export and import realm snapshots")
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def read_records(path) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the records of a gzip-compressed NDJSON file one by one
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as records_file:
+        for line in records_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def private_opener(path, flags):
+    """
+    Opener of the files only readable by the owner, e.g. the snapshots: they can hold client secrets
+    """
+    return os.open(path, flags, 0o600)
+
+
+def _make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # The mode of makedirs is subject to the umask, and not applied to existing directories
+    os.chmod(path, 0o700)
+
+
+@contextmanager
+def _lock(path):
+    """
+    Holds an exclusive lock on the file, shared by all the processes. Yields False if another one holds it.
+    """
+    with open(path, "w", opener=private_opener) as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _without_ids(definition):
+    """
+    Drops the IDs of the source realm from a client or client scope, and from its protocol mappers
+    """
+    definition = {key: value for key, value in definition.items() if key != "id"}
+    if "protocolMappers" in definition:
+        definition["protocolMappers"] = [
+            {key: value for key, value in mapper.items() if key != "id"}
+            for mapper in definition["protocolMappers"]
+        ]
+    return definition
+
+
+class SnapshotExporter:
+    """
+    Exports the realm's clients, client scopes, client policies and token-exchange permissions
+    to a directory, as one gzip-compressed NDJSON file per resource and a manifest.
+
+    Every page of records is appended as its own gzip member and recorded in the manifest,
+    so an interrupted export resumes from its last page when run again on the same directory.
+    The client secrets and private keys are left out, unless include_secrets is set. The snapshot
+    directory and files are only accessible by their owner.
+    """
+
+    def __init__(self, directory, page_size=100, max_workers=8, logger=None, include_secrets=False):
+        self.directory = directory
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.logger = logger
+        self.include_secrets = include_secrets
+        self._manifest_lock = threading.Lock()
+        # Maps the client IDs to their clientIds, to make the policies portable across realms
+        self._client_ids = {}
+        # Keycloak does not page the client scopes, so they are fetched once
+        self._scopes = None
+
+    def export(self) -> Dict[str, Any]:
+        """
+        Runs or resumes the export
+        Returns: the manifest of the snapshot
+        """
+        _make_private_dir(self.directory)
+        with _lock(os.path.join(self.directory, ".lock")) as acquired:
+            if not acquired:
+                raise RuntimeError("The snapshot '{0}' is already being exported".format(self.directory))
+            self.manifest = self.read_manifest(self.directory) or {
+                "version": SNAPSHOT_VERSION,
+                "realm": keycloak_client.realm,
+                "startedAt": _now(),
+                "secrets": self.include_secrets,
+                "resources": {},
+            }
+            # A resumed export goes on as it started
+            self.include_secrets = self.manifest.get("secrets", False)
+            self.manifest.update(status="running", error=None)
+            self._save_manifest()
+            try:
+                # The client policies and permissions refer to the clients, so export these first
+                self._export_resource("clients", keycloak_client.get_clients_page, self._export_clients)
+                resources = {
+                    "scopes": (self._get_scopes_page, None),
+                    "policies": (keycloak_client.get_auth_policies_page, self._client_policies),
+                    "permissions": (keycloak_client.get_auth_policies_page, self._token_exchange_permissions),
+                }
+                for name, _, error in run_concurrently(
+                    lambda name: self._export_resource(name, *resources[name]), resources, len(resources)
+                ):
+                    if error is not None:
+                        raise error
+            except Exception as e:
+                self.manifest.update(status="failed", error=str(e))
+                self._save_manifest()
+                raise
+            self.manifest.update(status="completed", completedAt=_now())
+            self._save_manifest()
+            return self.manifest
+
+    @staticmethod
+    def read_manifest(directory) -> Dict[str, Any]:
+        """
+        Returns the manifest of the snapshot in the directory, None if there is none
+        """
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE)) as manifest_file:
+                return json.load(manifest_file)
+        except FileNotFoundError:
+            return None
+
+    def _export_resource(self, name, get_page: Callable[[int, int], List], transform=None):
+        """
+        Appends the records of the resource to its file, one page at a time, from where a previous export stopped
+        get_page: returns the page of source items at (first, max_results)
+        transform: converts a page of source items to the records to write
+        """
+        with self._manifest_lock:
+            state = self.manifest["resources"].setdefault(
+                name,
+                {"file": "{0}.ndjson.gz".format(name), "count": 0, "position": 0, "offset": 0,
+                 "complete": False, "seconds": 0},
+            )
+        path = os.path.join(self.directory, state["file"])
+        if state["complete"]:
+            if name == "clients":
+                self._index_clients(read_records(path))
+            return
+        if name == "clients" and state["count"]:
+            # Resuming: the clients already exported are needed by the other resources
+            self._index_clients(read_records(path))
+        started = time.monotonic()
+        with open(path, "ab", opener=private_opener) as resource_file:
+            # Drop the records written after the last page recorded in the manifest
+            resource_file.truncate(state["offset"])
+            while True:
+                page = get_page(state["position"], self.page_size)
+                records = transform(page) if transform else page
+                with gzip.GzipFile(fileobj=resource_file, mode="wb") as member:
+                    for record in records:
+                        member.write((json.dumps(record) + "\n").encode("utf-8"))
+                resource_file.flush()
+                with self._manifest_lock:
+                    state["position"] += len(page)
+                    state["count"] += len(records)
+                    state["offset"] = resource_file.tell()
+                    state["seconds"] += time.monotonic() - started
+                    started = time.monotonic()
+                    state["complete"] = len(page) < self.page_size
+                    self._save_manifest()
+                if state["complete"]:
+                    break
+        if self.logger:
+            self.logger.info(
+                "Exported {0} {1} in {2:.1f}s".format(state["count"], name, state["seconds"])
+            )
+
+    def _get_scopes_page(self, first, max_results):
+        if self._scopes is None:
+            self._scopes = keycloak_client.get_scopes()
+        return self._scopes[first:first + max_results]
+
+    def _export_clients(self, clients):
+        self._index_clients(clients)
+        if self.include_secrets:
+            return clients
+        return [without_secrets(client) for client in clients]
+
+    def _index_clients(self, clients):
+        for client in clients:
+            self._client_ids[client["id"]] = client["clientId"]
+        return clients
+
+    def _client_policies(self, policies):
+        return [
+            {
+                "policy": policy,
+                "clientIds": [
+                    self._client_ids.get(clientid, clientid)
+                    for clientid in json.loads(policy.get("config", {}).get("clients", "[]"))
+                ],
+            }
+            for policy in policies
+            if policy.get("type") == "client"
+        ]
+
+    def _token_exchange_permissions(self, policies):
+        permissions = [
+            policy for policy in policies if policy["name"].startswith(TOKEN_EXCHANGE_PERMISSION_PREFIX)
+        ]
+        records = []
+        for permission, associated_policies, error in run_concurrently(
+            lambda permission: keycloak_client.get_permission_associated_policies(permission["id"]),
+            permissions,
+            self.max_workers,
+        ):
+            if error is not None:
+                raise error
+            clientid = permission["name"][len(TOKEN_EXCHANGE_PERMISSION_PREFIX):]
+            records.append(
+                {
+                    "permission": permission,
+                    "targetClientId": self._client_ids.get(clientid, clientid),
+                    "policies": [policy["name"] for policy in associated_policies],
+                }
+            )
+        return sorted(records, key=lambda record: record["permission"]["name"])
+
+    def _save_manifest(self):
+        self.manifest["updatedAt"] = _now()
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(path + ".tmp", "w", opener=private_opener) as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+class SnapshotImporter:
+    """
+    Imports a snapshot exported by `SnapshotExporter` in the realm: the client scopes, then the clients,
+    then the client policies and finally the token-exchange permissions, since each refers to the previous ones.
+
+    The files are read as streams and their records applied concurrently, within the rate limit.
+    The resources identical to the ones of the snapshot are skipped, so an import can be run again
+    until it succeeds. The clients and policies are matched by their clientId and name, since
+    their IDs differ from one realm to another. The default client scopes of the existing clients are
+    added and removed one by one, while their optional client scopes and the protocol mappers of the
+    clients and client scopes that already exist are neither compared nor updated.
+    """
+
+    def __init__(self, directory, chunk_size=100, max_workers=8, rate_limit=None, logger=None):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.logger = logger
+        self._report_lock = threading.Lock()
+
+    def import_snapshot(self) -> Dict[str, Any]:
+        """
+        Runs the import
+        Returns: the import report, with the outcome counts and the throughput of every resource
+        """
+        manifest = SnapshotExporter.read_manifest(self.directory)
+        if manifest is None or manifest["status"] != "completed":
+            raise ValueError("The snapshot '{0}' is not a completed export".format(self.directory))
+        with _lock(os.path.join(self.directory, ".import.lock")) as acquired:
+            if not acquired:
+                raise RuntimeError("The snapshot '{0}' is already being imported".format(self.directory))
+            self.report = {
+                "realm": keycloak_client.realm,
+                "sourceRealm": manifest["realm"],
+                "status": "running",
+                "startedAt": _now(),
+                "resources": {},
+            }
+            self._save_report()
+            try:
+                self._import_resource(
+                    manifest, "scopes", self._import_scopes,
+                    existing={scope["name"]: scope for scope in keycloak_client.get_scopes()},
+                )
+                self._scope_ids = {scope["name"]: scope["id"] for scope in keycloak_client.get_scopes()}
+                self._import_resource(
+                    manifest, "clients", self._import_clients, chunk_size=self.chunk_size,
+                    existing={client["clientId"]: client for client in keycloak_client.stream_all_clients()},
+                )
+                self._client_ids = {
+                    client["clientId"]: client["id"] for client in keycloak_client.stream_all_clients()
+                }
+                self._import_resource(
+                    manifest, "policies", self._import_policies,
+                    existing={
+                        policy["name"]: policy
+                        for policy in keycloak_client.iter_auth_policies()
+                        if policy.get("type") == "client"
+                    },
+                )
+                self._policy_ids = {
+                    policy["name"]: policy["id"] for policy in keycloak_client.iter_auth_policies()
+                }
+                self._import_resource(manifest, "permissions", self._import_permissions)
+            except Exception as e:
+                self.report.update(status="failed", error=str(e))
+                self._save_report()
+                raise
+            failed = any(state["failed"] for state in self.report["resources"].values())
+            self.report.update(status="completed with errors" if failed else "completed", completedAt=_now())
+            self._save_report()
+            return self.report
+
+    @staticmethod
+    def read_report(directory) -> Dict[str, Any]:
+        """
+        Returns the report of the last import of the snapshot in the directory, None if there is none
+        """
+        try:
+            with open(os.path.join(directory, IMPORT_REPORT_FILE)) as report_file:
+                return json.load(report_file)
+        except FileNotFoundError:
+            return None
+
+    def _import_resource(self, manifest, name, apply: Callable[[List, Dict], List], chunk_size=1, existing=None):
+        """
+        Applies the records of the resource file concurrently, one chunk per call
+        apply: applies a chunk of records, given the existing resources, and returns a
+        (name, outcome, error) tuple per record. The outcome is created, updated or skipped.
+        """
+        state = {"count": 0, "created": 0, "updated": 0, "skipped": 0, "failed": {}, "seconds": 0,
+                 "perSecond": 0}
+        self.report["resources"][name] = state
+        if name not in manifest["resources"]:
+            return
+        path = os.path.join(self.directory, manifest["resources"][name]["file"])
+        started = time.monotonic()
+        for chunk, outcomes, error in run_concurrently(
+            lambda chunk: apply(chunk, existing), _chunks(read_records(path), chunk_size), self.max_workers
+        ):
+            if error is not None:
+                # The whole chunk failed, e.g. its partialImport request
+                outcomes = [(self._record_name(name, record), None, error) for record in chunk]
+            with self._report_lock:
+                for record_name, outcome, record_error in outcomes:
+                    state["count"] += 1
+                    if record_error is None:
+                        state[outcome] += 1
+                    else:
+                        state["failed"][record_name] = str(record_error)
+                        if self.logger:
+                            self.logger.error(
+                                "Cannot import {0} '{1}': {2}".format(name, record_name, record_error)
+                            )
+                state["seconds"] = time.monotonic() - started
+                state["perSecond"] = round(state["count"] / state["seconds"], 1) if state["seconds"] else 0
+        self._save_report()
+        if self.logger:
+            self.logger.info(
+                "Imported {0} {1} in {2:.1f}s ({3}/s): {4} created, {5} updated, {6} skipped, {7} failed".format(
+                    state["count"], name, state["seconds"], state["perSecond"], state["created"],
+                    state["updated"], state["skipped"], len(state["failed"]),
+                )
+            )
+
+    @staticmethod
+    def _record_name(name, record):
+        if name == "clients":
+            return record["clientId"]
+        if name == "scopes":
+            return record["name"]
+        if name == "policies":
+            return record["policy"]["name"]
+        return record["targetClientId"]
+
+    def _apply_each(self, name, chunk, apply):
+        """
+        Applies the records of the chunk one by one. apply returns the outcome of a record.
+        """
+        outcomes = []
+        for record in chunk:
+            try:
+                outcomes.append((self._record_name(name, record), apply(record), None))
+            except Exception as e:
+                outcomes.append((self._record_name(name, record), None, e))
+        return outcomes
+
+    @staticmethod
+    def _matches(definition, current):
+        return definition_matches(
+            {key: value for key, value in definition.items() if key not in SEPARATE_PROPERTIES}, current
+        )
+
+    def _import_scopes(self, chunk, existing):
+        def apply(record):
+            scope = _without_ids(record)
+            current = existing.get(scope["name"])
+            if current is not None and self._matches(scope, current):
+                return "skipped"
+            self.rate_limiter.wait()
+            keycloak_client.save_client_scope(scope, current and current["id"])
+            return "updated" if current else "created"
+
+        return self._apply_each("scopes", chunk, apply)
+
+    def _import_clients(self, chunk, existing):
+        outcomes = {}
+        new_clients = []
+        for record in chunk:
+            client = _without_ids(record)
+            current = existing.get(client["clientId"])
+            if client["clientId"] in BUILTIN_CLIENT_IDS:
+                outcomes[client["clientId"]] = ("skipped", None)
+            elif current is None:
+                new_clients.append(client)
+            else:
+                try:
+                    outcomes[client["clientId"]] = (self._update_client(client, current), None)
+                except Exception as e:
+                    outcomes[client["clientId"]] = (None, e)
+        if new_clients:
+            # The new clients of the chunk are created with a single request
+            self.rate_limiter.wait()
+            for result in keycloak_client.partial_import({"clients": new_clients}, "SKIP"):
+                if result.get("resourceType") == "CLIENT":
+                    created = result["action"] == "ADDED"
+                    outcomes[result["resourceName"]] = ("created" if created else "skipped", None)
+        return [
+            (record["clientId"], *outcomes.get(
+                record["clientId"],
+                (None, ResourceNotFoundError("Client missing from the import results")),
+            ))
+            for record in chunk
+        ]
+
+    def _update_client(self, client, current):
+        """
+        Updates the properties and then the default client scopes of the existing client that differ
+        Returns: the outcome of the client, updated or skipped
+        """
+        updated = False
+        if not self._matches(client, current):
+            self.rate_limiter.wait()
+            keycloak_client.update_client_definition(current["id"], client)
+            updated = True
+        if "defaultClientScopes" in client:
+            desired_scopes = set(client["defaultClientScopes"])
+            current_scopes = set(current.get("defaultClientScopes") or [])
+            missing = sorted(desired_scopes - current_scopes - set(self._scope_ids))
+            if missing:
+                raise ResourceNotFoundError("Scopes not found: {0}".format(missing))
+            for name in sorted(desired_scopes - current_scopes):
+                self.rate_limiter.wait()
+                keycloak_client.set_client_default_scope(current["id"], self._scope_ids[name], "put")
+            for name in sorted(current_scopes - desired_scopes):
+                if name in self._scope_ids:
+                    self.rate_limiter.wait()
+                    keycloak_client.set_client_default_scope(current["id"], self._scope_ids[name], "delete")
+            updated = updated or desired_scopes != current_scopes
+        return "updated" if updated else "skipped"
+
+    def _import_policies(self, chunk, existing):
+        def apply(record):
+            policy = record["policy"]
+            missing = [client_id for client_id in record["clientIds"] if client_id not in self._client_ids]
+            if missing:
+                raise ResourceNotFoundError("Clients not found: {0}".format(missing))
+            definition = {
+                "name": policy["name"],
+                "type": "client",
+                "description": policy.get("description", ""),
+                "logic": policy.get("logic", "POSITIVE"),
+                "decisionStrategy": policy.get("decisionStrategy", "UNANIMOUS"),
+                "clients": [self._client_ids[client_id] for client_id in record["clientIds"]],
+            }
+            current = existing.get(policy["name"])
+            if current is not None and definition_matches(
+                dict(definition, clients=set(definition["clients"])),
+                dict(current, description=current.get("description", ""),
+                     clients=set(json.loads(current.get("config", {}).get("clients", "[]")))),
+            ):
+                return "skipped"
+            self.rate_limiter.wait()
+            keycloak_client.save_client_policy_definition(definition, current and current["id"])
+            return "updated" if current else "created"
+
+        return self._apply_each("policies", chunk, apply)
+
+    def _import_permissions(self, chunk, existing):
+        def apply(record):
+            target = record["targetClientId"]
+            if target not in self._client_ids:
+                raise ResourceNotFoundError("Client '{0}' not found".format(target))
+            missing = [name for name in record["policies"] if name not in self._policy_ids]
+            if missing:
+                raise ResourceNotFoundError("Policies not found: {0}".format(missing))
+            self.rate_limiter.wait()
+            changed = keycloak_client.set_token_exchange_permission_policies(
+                self._client_ids[target], [self._policy_ids[name] for name in record["policies"]]
+            )
+            return "updated" if changed else "skipped"
+
+        return self._apply_each("permissions", chunk, apply)
+
+    def _save_report(self):
+        with self._report_lock:
+            self.report["updatedAt"] = _now()
+            path = os.path.join(self.directory, IMPORT_REPORT_FILE)
+            with open(path + ".tmp", "w", opener=private_opener) as report_file:
+                json.dump(self.report, report_file, indent=2)
+            os.replace(path + ".tmp", path)
+
+
+class Snapshots:
+    """
+    Runs the snapshot exports and imports of the API in the background, in the configured snapshot directory
+    """
+
+    def init_app(self, app):
+        self.snapshot_dir = app.config["SNAPSHOT_DIR"]
+        self.page_size = app.config["SNAPSHOT_PAGE_SIZE"]
+        self.max_workers = app.config["KEYCLOAK_MAX_WORKERS"]
+        self.import_chunk_size = app.config["BULK_IMPORT_CHUNK_SIZE"]
+        self.import_max_workers = app.config["BULK_MAX_WORKERS"]
+        self.import_rate_limit = app.config["BULK_RATE_LIMIT"]
+        self.logger = configure_logging(app.config["LOG_DIR"])
+
+    def exporter(self, directory, include_secrets=False) -> SnapshotExporter:
+        return SnapshotExporter(directory, self.page_size, self.max_workers, self.logger, include_secrets)
+
+    def importer(self, directory) -> SnapshotImporter:
+        return SnapshotImporter(
+            directory, self.import_chunk_size, self.import_max_workers, self.import_rate_limit, self.logger
+        )
+
+    def start_export(self, snapshot_id=None, include_secrets=False) -> str:
+        """
+        Starts a new export, or resumes the given one, in a background thread
+        include_secrets: also export the client secrets and private keys of a new export
+        Returns: the ID of the snapshot
+        """
+        if snapshot_id is None:
+            snapshot_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        else:
+            self.get_manifest(snapshot_id)
+        _make_private_dir(self.snapshot_dir)
+        exporter = self.exporter(self.get_path(snapshot_id), include_secrets)
+
+        def export():
+            try:
+                exporter.export()
+            except Exception:
+                self.logger.exception("Snapshot '{0}' export failed".format(snapshot_id))
+
+        threading.Thread(target=export, name="snapshot-{0}".format(snapshot_id), daemon=True).start()
+        return snapshot_id
+
+    def start_import(self, snapshot_id):
+        """
+        Imports the snapshot in the realm, in a background thread
+        Raises ResourceNotFoundError if the snapshot does not exist, ValueError if its export is not completed
+        """
+        if self.get_manifest(snapshot_id)["status"] != "completed":
+            raise ValueError("The export of snapshot '{0}' is not completed".format(snapshot_id))
+        importer = self.importer(self.get_path(snapshot_id))
+
+        def import_snapshot():
+            try:
+                importer.import_snapshot()
+            except Exception:
+                self.logger.exception("Snapshot '{0}' import failed".format(snapshot_id))
+
+        threading.Thread(
+            target=import_snapshot, name="snapshot-import-{0}".format(snapshot_id), daemon=True
+        ).start()
+
+    def get_import_report(self, snapshot_id) -> Dict[str, Any]:
+        """
+        Returns the report of the last import of the snapshot. Raises ResourceNotFoundError if there is none
+        """
+        report = SnapshotImporter.read_report(self.get_path(snapshot_id))
+        if report is None:
+            raise ResourceNotFoundError("Snapshot '{0}' was never imported".format(snapshot_id))
+        return report
+
+    def get_path(self, snapshot_id):
+        return os.path.join(self.snapshot_dir, os.path.basename(snapshot_id))
+
+    def get_manifest(self, snapshot_id) -> Dict[str, Any]:
+        """
+        Returns the manifest of the snapshot. Raises ResourceNotFoundError if it does not exist
+        """
+        manifest = SnapshotExporter.read_manifest(self.get_path(snapshot_id))
+        if manifest is None:
+            raise ResourceNotFoundError("Snapshot '{0}' not found".format(snapshot_id))
+        return manifest
+
+
+snapshots: Snapshots = Snapshots()
+
+
+@snapshot_cli.command("export")
+@click.argument("directory")
+@click.option("--include-secrets", is_flag=True, help="Also export the client secrets and private keys")
+@with_appcontext
+def export_command(directory, include_secrets):
+    """Export the realm to DIRECTORY, or resume the export already in it"""
+    manifest = snapshots.exporter(directory, include_secrets).export()
+    for name, state in manifest["resources"].items():
+        click.echo("{0}: {1} in {2:.1f}s".format(name, state["count"], state["seconds"]))
+
+
+@snapshot_cli.command("import")
+@click.argument("directory")
+@with_appcontext
+def import_command(directory):
+    """Import the snapshot in DIRECTORY in the realm, skipping the identical resources"""
+    report = snapshots.importer(directory).import_snapshot()
+    for name, state in report["resources"].items():
+        click.echo(
+            "{0}: {1} created, {2} updated, {3} skipped, {4} failed in {5:.1f}s ({6}/s)".format(
+                name, state["created"], state["updated"], state["skipped"], len(state["failed"]),
+                state["seconds"], state["perSecond"],
+            )
+        )
+    click.echo("Status: {0}".format(report["status"]))
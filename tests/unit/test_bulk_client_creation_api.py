@@ -0,0 +1,279 @@
+import json
+from unittest.mock import patch
+
+from utils import KeycloakAPIError
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestBulkClientCreationApi(WebTestBase):
+    """
+    Test the bulk client creation endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/clients"
+
+    def _results(self, resp):
+        results = [json.loads(line) for line in resp.data.decode().splitlines()]
+        return {result["index"]: result for result in results}
+
+    def test_bulk_create_not_a_list(self):
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps({"clientId": "target", "protocol": "openid"}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+
+    def test_bulk_create_json_array(self):
+        # prepare
+        self.keycloak_api_mock.create_new_client.side_effect = lambda client: {
+            "clientId": client.definition["clientId"]
+        }
+
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps(
+                [
+                    {"clientId": "first", "protocol": "openid"},
+                    {"clientId": "second", "protocol": "openid"},
+                ]
+            ),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual(200, results[0]["status"])
+        self.assertEqual("first", results[0]["client"]["clientId"])
+        self.assertEqual(200, results[1]["status"])
+        self.assertEqual("second", results[1]["client"]["clientId"])
+        self.assertEqual(2, self.keycloak_api_mock.create_new_client.call_count)
+
+    def test_bulk_create_ndjson_with_errors(self):
+        # prepare
+        def create(client):
+            if client.definition["clientId"] == "broken":
+                raise KeycloakAPIError(409, "Client broken already exists")
+            return {"clientId": client.definition["clientId"]}
+
+        self.keycloak_api_mock.create_new_client.side_effect = create
+        body = "\n".join(
+            [
+                json.dumps({"clientId": "working", "protocol": "openid"}),
+                json.dumps({"clientId": "broken", "protocol": "openid"}),
+                json.dumps({"clientId": "no-protocol"}),
+                "{not json",
+            ]
+        )
+
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(), data=body, content_type="application/x-ndjson"
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual(200, results[0]["status"])
+        self.assertEqual(409, results[1]["status"])
+        self.assertTrue("already exists" in results[1]["error"])
+        self.assertEqual(400, results[2]["status"])
+        self.assertEqual(400, results[3]["status"])
+
+
+class TestBulkClientImportApi(WebTestBase):
+    """
+    Test the bulk client import endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/clients/import"
+
+    def _results(self, resp):
+        results = [json.loads(line) for line in resp.data.decode().splitlines()]
+        return {result["index"]: result for result in results}
+
+    def test_bulk_import_invalid_policy(self):
+        # act
+        resp = self.app_client.post(
+            f"{self._get_endpoint()}?ifResourceExists=MERGE",
+            data=json.dumps([{"clientId": "first", "protocol": "openid"}]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.keycloak_api_mock.import_clients.assert_not_called()
+
+    def test_bulk_import_in_chunks(self):
+        # prepare
+        self.keycloak_api_mock.import_clients.side_effect = lambda clients, policy, app: [
+            ({"action": "added", "client": {"clientId": client.definition["clientId"]}}, None)
+            for client in clients
+        ]
+
+        # act
+        resp = self.app_client.post(
+            f"{self._get_endpoint()}?chunkSize=2&ifResourceExists=overwrite",
+            data=json.dumps(
+                [
+                    {"clientId": "first", "protocol": "openid"},
+                    {"clientId": "second", "protocol": "openid"},
+                    {"clientId": "third", "protocol": "openid"},
+                    {"clientId": "first", "protocol": "openid"},
+                ]
+            ),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        for index, client_id in enumerate(["first", "second", "third"]):
+            self.assertEqual(200, results[index]["status"])
+            self.assertEqual("added", results[index]["action"])
+            self.assertEqual(client_id, results[index]["client"]["clientId"])
+        self.assertEqual(400, results[3]["status"])
+        self.assertEqual(2, self.keycloak_api_mock.import_clients.call_count)
+        first_chunk, policy = self.keycloak_api_mock.import_clients.call_args_list[0][0]
+        self.assertEqual(["first", "second"], [c.definition["clientId"] for c in first_chunk])
+        self.assertEqual("OVERWRITE", policy)
+
+    def test_bulk_import_failed_chunk(self):
+        # prepare
+        self.keycloak_api_mock.import_clients.side_effect = KeycloakAPIError(
+            409, "Client first already exists"
+        )
+
+        # act
+        resp = self.app_client.post(
+            f"{self._get_endpoint()}?ifResourceExists=FAIL",
+            data=json.dumps(
+                [
+                    {"clientId": "first", "protocol": "openid"},
+                    {"clientId": "second", "protocol": "openid"},
+                ]
+            ),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual(409, results[0]["status"])
+        self.assertEqual(409, results[1]["status"])
+
+
+class TestBulkClientDeletionApi(WebTestBase):
+    """
+    Test the bulk client deletion endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/clients"
+
+    def _results(self, resp):
+        results = [json.loads(line) for line in resp.data.decode().splitlines()]
+        return {result["index"]: result for result in results}
+
+    def test_bulk_delete(self):
+        # prepare
+        self.keycloak_api_mock.stream_all_clients.return_value = [
+            {"clientId": "first", "id": "1"},
+            {"clientId": "second", "id": "2"},
+            {"clientId": "kept", "id": "3"},
+        ]
+
+        # act
+        resp = self.app_client.delete(
+            self._get_endpoint(),
+            data=json.dumps(["first", "second", "missing", "first", 42]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual(200, results[0]["status"])
+        self.assertEqual(200, results[1]["status"])
+        self.assertEqual(404, results[2]["status"])
+        self.assertEqual(400, results[3]["status"])
+        self.assertEqual(400, results[4]["status"])
+        self.keycloak_api_mock.stream_all_clients.assert_called_once_with()
+        self.assertEqual(
+            ["1", "2"],
+            sorted(c[0][0] for c in self.keycloak_api_mock.delete_client_by_id.call_args_list),
+        )
+        self.keycloak_api_mock.get_client_by_client_id.assert_not_called()
+
+
+class TestBulkClientReconcileApi(WebTestBase):
+    """
+    Test the bulk client reconciliation endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/clients/reconcile"
+
+    def setUp(self):
+        super().setUp()
+        self.keycloak_api_mock.stream_all_clients.return_value = [
+            {"clientId": "account", "id": "1"},
+            {"clientId": "stale", "id": "2"},
+        ]
+
+    def test_reconcile_invalid_items(self):
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps([{"clientId": "first", "protocol": "openid"}, {"clientId": "second"}]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.assertEqual(1, resp.json["data"][0]["index"])
+        self.keycloak_api_mock.stream_all_clients.assert_not_called()
+
+    def test_reconcile_dry_run(self):
+        # act
+        resp = self.app_client.post(
+            f"{self._get_endpoint()}?dryRun=true&prune=true",
+            data=json.dumps([{"clientId": "first", "protocol": "openid", "secret": "s3cr3t"}]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({"delete": 1, "create": 1, "update": 0, "scopes": 0}, resp.json["data"]["summary"])
+        create, delete = resp.json["data"]["plan"]
+        self.assertEqual(("create", "first"), (create["action"], create["clientId"]))
+        self.assertEqual("**********", create["definition"]["secret"])
+        self.assertEqual({"action": "delete", "clientId": "stale", "id": "2"}, delete)
+        self.keycloak_api_mock.create_new_client.assert_not_called()
+        self.keycloak_api_mock.delete_client_by_id.assert_not_called()
+
+    def test_reconcile_from_mirror(self):
+        # prepare
+        client_index_mock = patch("api_definitions.client_index").start()
+        client_index_mock.get_clients.return_value = [{"clientId": "first", "id": "3"}]
+
+        # act
+        resp = self.app_client.post(
+            f"{self._get_endpoint()}?dryRun=true&source=mirror",
+            data=json.dumps([]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual([], resp.json["data"]["plan"])
+        client_index_mock.get_clients.assert_called_once_with(fresh=True)
+        self.keycloak_api_mock.stream_all_clients.assert_not_called()
@@ -0,0 +1,92 @@
+import json
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestBulkClientScopesApi(WebTestBase):
+    """
+    Test the bulk default client scope endpoints
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.keycloak_api_mock.get_scopes.return_value = [
+            {"id": "1", "name": "cern-new", "protocol": "openid-connect"},
+        ]
+        self.keycloak_api_mock.stream_all_clients.return_value = [
+            {"id": "a", "clientId": "with", "protocol": "openid-connect", "defaultClientScopes": ["cern-new"]},
+            {"id": "b", "clientId": "without", "protocol": "openid-connect", "defaultClientScopes": ["email"]},
+            {"id": "c", "clientId": "saml", "protocol": "saml", "defaultClientScopes": []},
+        ]
+
+    def _get_endpoint(self, scope_name="cern-new"):
+        return f"{API_ROOT}/bulk/default-scopes/{scope_name}"
+
+    def _results(self, resp):
+        return [json.loads(line) for line in resp.data.decode().splitlines()]
+
+    def test_invalid_selector(self):
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint(), data=json.dumps({}), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.keycloak_api_mock.set_client_default_scope.assert_not_called()
+
+    def test_selector_not_an_object(self):
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint(), data=json.dumps([{"all": True}]), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.keycloak_api_mock.stream_all_clients.assert_not_called()
+
+    def test_scope_not_found(self):
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint("missing"), data=json.dumps({"all": True}), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(404, resp.status_code)
+
+    def test_add_scope_to_all_clients(self):
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint(), data=json.dumps({"all": True}), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual("without", results[0]["clientId"])
+        self.assertEqual(200, results[0]["status"])
+        self.assertEqual({"done": 1, "total": 1}, results[0]["progress"])
+        self.assertEqual(
+            {"scope": "cern-new", "selected": 2, "unchanged": 1, "changed": 1, "failed": 0},
+            results[1]["summary"],
+        )
+        self.keycloak_api_mock.set_client_default_scope.assert_called_once_with("b", "1", "put")
+
+    def test_delete_scope_from_listed_clients(self):
+        # act
+        resp = self.app_client.delete(
+            self._get_endpoint(),
+            data=json.dumps({"clientIds": ["with", "without", "saml", "missing"]}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        statuses = {result["clientId"]: result["status"] for result in results if "clientId" in result}
+        self.assertEqual({"with": 200, "saml": 400, "missing": 404}, statuses)
+        self.assertEqual(
+            {"scope": "cern-new", "selected": 2, "unchanged": 1, "changed": 1, "failed": 2},
+            results[-1]["summary"],
+        )
+        self.keycloak_api_mock.set_client_default_scope.assert_called_once_with("a", "1", "delete")
@@ -0,0 +1,80 @@
+import json
+
+from utils import KeycloakAPIError, ResourceNotFoundError
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestBulkTokenExchangeApi(WebTestBase):
+    """
+    Test the bulk token exchange permissions endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/token-exchange-permissions"
+
+    def test_bulk_grant_invalid_body(self):
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint(), data=json.dumps([{"target": "a"}]), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.keycloak_api_mock.bulk_update_token_exchange_permissions.assert_not_called()
+
+    def test_bulk_grant(self):
+        # prepare
+        self.keycloak_api_mock.bulk_update_token_exchange_permissions.return_value = {
+            ("target-1", "requestor"): None,
+            ("target-2", "requestor"): ResourceNotFoundError("Client 'target-2' not found"),
+        }
+
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint(),
+            data=json.dumps(
+                [
+                    {"target": "target-1", "requestor": "requestor"},
+                    {"target": "target-2", "requestor": "requestor"},
+                ]
+            ),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(
+            [
+                {"target": "target-1", "requestor": "requestor", "status": 200},
+                {
+                    "target": "target-2",
+                    "requestor": "requestor",
+                    "status": 404,
+                    "error": "Client 'target-2' not found",
+                },
+            ],
+            resp.json["data"],
+        )
+        self.keycloak_api_mock.bulk_update_token_exchange_permissions.assert_called_once_with(
+            [("target-1", "requestor"), ("target-2", "requestor")], True
+        )
+
+    def test_bulk_revoke_listing_error(self):
+        # prepare
+        self.keycloak_api_mock.bulk_update_token_exchange_permissions.side_effect = KeycloakAPIError(
+            503, "Unavailable"
+        )
+
+        # act
+        resp = self.app_client.delete(
+            self._get_endpoint(),
+            data=json.dumps([{"target": "target-1", "requestor": "requestor"}]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(503, resp.status_code)
+        self.keycloak_api_mock.bulk_update_token_exchange_permissions.assert_called_once_with(
+            [("target-1", "requestor")], False
+        )
@@ -0,0 +1,205 @@
+import json
+
+from utils import ResourceNotFoundError
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestBulkMfaSettingsApi(WebTestBase):
+    """
+    Test the bulk MFA settings endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/users/authenticator"
+
+    def test_bulk_mfa_settings_not_a_list(self):
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(), data=json.dumps({"username": "cristi"}), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+
+    def test_bulk_mfa_settings(self):
+        # prepare
+        self.keycloak_api_mock.get_mfa_snapshots.return_value = [
+            ("cristi", "snapshot", None),
+            ("ghost", None, ResourceNotFoundError("User not found")),
+        ]
+        self.keycloak_api_mock.get_user_mfa_settings.return_value = (
+            True, True, "otp-id", False, False, False, None, True
+        )
+
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(), data=json.dumps(["cristi", "ghost", "cristi"]), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        data = resp.json["data"]
+        self.assertEqual(
+            {
+                "enabled": True,
+                "preferred": True,
+                "initialization_required": False,
+                "credential_id": "otp-id",
+                "text": "OTP (One Time Password)",
+            },
+            data["users"]["cristi"]["otp"],
+        )
+        self.assertTrue(data["users"]["cristi"]["webauthn"]["initialization_required"])
+        self.assertEqual({"ghost": {"status": 404, "error": "User not found"}}, data["errors"])
+        self.keycloak_api_mock.get_mfa_snapshots.assert_called_once_with({"cristi", "ghost"})
+        self.keycloak_api_mock.get_user_mfa_settings.assert_called_once_with("cristi", snapshot="snapshot")
+
+
+class TestBulkUserUpdateApi(WebTestBase):
+    """
+    Test the bulk user update endpoints
+    """
+
+    def _results(self, resp):
+        results = [json.loads(line) for line in resp.data.decode().splitlines()]
+        return {result["index"]: result for result in results}
+
+    def test_bulk_update_users(self):
+        # prepare
+        users = {
+            "changed": {"id": "1", "username": "changed", "enabled": True},
+            "unchanged": {"id": "2", "username": "unchanged", "enabled": False},
+        }
+
+        def get_user(username, is_guest, realm):
+            if username not in users:
+                raise ResourceNotFoundError("User not found")
+            return users[username]
+
+        self.keycloak_api_mock.get_user_by_username.side_effect = get_user
+        self.keycloak_api_mock.get_user_changes.side_effect = lambda user, **kwargs: {
+            key: value for key, value in kwargs.items() if user.get(key) != value
+        }
+
+        # act
+        resp = self.app_client.put(
+            f"{API_ROOT}/bulk/users",
+            data=json.dumps(
+                [
+                    {"username": "changed", "properties": {"enabled": False}},
+                    {"username": "unchanged", "properties": {"enabled": False}},
+                    {"username": "missing", "properties": {"enabled": False}},
+                    {"email": "wrong-key", "properties": {"enabled": False}},
+                ]
+            ),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual(200, results[0]["status"])
+        self.assertEqual(["enabled"], results[0]["changed"])
+        self.assertEqual(200, results[1]["status"])
+        self.assertEqual([], results[1]["changed"])
+        self.assertEqual(404, results[2]["status"])
+        self.assertEqual(400, results[3]["status"])
+        self.keycloak_api_mock.update_user_object.assert_called_once_with(
+            users["changed"], self.keycloak_api_mock.realm, enabled=False
+        )
+
+    def test_bulk_update_guest_users(self):
+        # prepare
+        user = {"id": "1", "username": "guest", "email": "guest@example.com", "firstName": "Old"}
+        self.keycloak_api_mock.get_user_by_username.return_value = user
+        self.keycloak_api_mock.get_user_changes.return_value = {"firstName": "New"}
+
+        # act
+        resp = self.app_client.put(
+            f"{API_ROOT}/bulk/users/guest",
+            data=json.dumps([{"email": "guest@example.com", "properties": {"firstName": "New"}}]),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        results = self._results(resp)
+        self.assertEqual("guest@example.com", results[0]["email"])
+        self.keycloak_api_mock.get_user_by_username.assert_called_once_with(
+            "guest@example.com", True, self.keycloak_api_mock.guest_realm
+        )
+        self.keycloak_api_mock.update_user_object.assert_called_once_with(
+            user, self.keycloak_api_mock.guest_realm, firstName="New"
+        )
+
+
+class TestBulkUserLogoutApi(WebTestBase):
+    """
+    Test the bulk user logout endpoint
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.keycloak_api_mock.realm = "cern"
+        self.keycloak_api_mock.mfa_realm = "mfa"
+        self.keycloak_api_mock.guest_realm = "guest"
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/logout"
+
+    def test_bulk_logout_invalid_realm(self):
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps({"userIds": ["1"], "realms": ["master"]}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.keycloak_api_mock.logout_user.assert_not_called()
+
+    def test_bulk_logout_by_id(self):
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(), data=json.dumps({"userIds": ["1", "2"]}), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(
+            [
+                {"user": "1", "realms": {"main": {"status": 200}}},
+                {"user": "2", "realms": {"main": {"status": 200}}},
+            ],
+            resp.json["data"],
+        )
+        self.assertEqual(2, self.keycloak_api_mock.logout_user.call_count)
+        self.keycloak_api_mock.logout_user.assert_any_call("1", "cern")
+
+    def test_bulk_logout_by_username_across_realms(self):
+        # prepare
+        def get_user(username, realm):
+            if realm == "guest":
+                raise ResourceNotFoundError("User not found")
+            return {"id": f"{realm}-{username}"}
+
+        self.keycloak_api_mock.get_user_by_username.side_effect = get_user
+
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps({"usernames": ["cristi"], "realms": ["main", "mfa", "guest"]}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        realms = resp.json["data"][0]["realms"]
+        self.assertEqual({"status": 200}, realms["main"])
+        self.assertEqual({"status": 200}, realms["mfa"])
+        self.assertEqual(404, realms["guest"]["status"])
+        self.keycloak_api_mock.logout_user.assert_any_call("cern-cristi", "cern")
+        self.keycloak_api_mock.logout_user.assert_any_call("mfa-cristi", "mfa")
+        self.assertEqual(2, self.keycloak_api_mock.logout_user.call_count)
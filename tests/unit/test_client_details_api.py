@@ -54,6 +54,24 @@ class TestClientDetailsApi(WebTestBase):
             self.client_id, Attrs(definition={"description": "test", "protocol": "openid-connect"}), client_type="openid"
         )
 
+    def test_put_openid_client_unchanged(self):
+        # prepare
+        mock_response = Client({"clientId": self.client_id, "description": "test"}, app=self.app)
+        mock_response.changed = False
+        self.keycloak_api_mock.update_client_properties.return_value = mock_response
+
+        # act
+        resp = self.app_client.put(
+            self._get_endpoint("openid"),
+            data=json.dumps({"description": "test"}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("false", resp.headers["X-Client-Changed"])
+        self.assertDictEqual(mock_response.definition, resp.json)
+
     def test_delete_openid_client_bad_protocol(self):
         # act
         resp = self.app_client.delete(self._get_endpoint("testprot"))
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from client_index import ClientIndex
+from utils import KeycloakAPIError
+
+CLIENTS_URL = "https://keycloak/auth/admin/realms/test/clients"
+
+
+class TestClientIndex(unittest.TestCase):
+    """
+    Test the in-memory client search index
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.keycloak_client_mock = patch("client_index.keycloak_client").start()
+        self.keycloak_client_mock.realm = "test"
+        self.clients = [
+            {"id": "1", "clientId": "app-one", "secret": "s3cr3t",
+             "redirectUris": ["https://App.cern.ch/*", "/*"],
+             "attributes": {"saml.signature": "true", "saml.signing.private.key": "key"}},
+            {"id": "2", "clientId": "app-two", "redirectUris": ["https://*.cern.ch/*"],
+             "attributes": {"saml.signature": "false"}},
+            {"id": "3", "clientId": "other", "redirectUris": ["https://app.cern.ch/callback"]},
+        ]
+        self.keycloak_client_mock.stream_all_clients.side_effect = lambda: iter(self.clients)
+        self.index = ClientIndex()
+        self.index.logger = MagicMock()
+
+    def _client_ids(self, result):
+        return [client["clientId"] for client in result["clients"]]
+
+    def test_search_by_client_id(self):
+        result = self.index.search(client_id="app-two")
+
+        self.assertEqual({"total": 1, "clients": [self.clients[1]]}, result)
+        self.assertEqual({"total": 0, "clients": []}, self.index.search(client_id="app"))
+
+    def test_search_by_prefix(self):
+        result = self.index.search(prefix="app-", limit=1)
+
+        self.assertEqual(2, result["total"])
+        self.assertEqual(["app-one"], self._client_ids(result))
+        self.assertNotIn("secret", result["clients"][0])
+        self.assertEqual({"saml.signature": "true"}, result["clients"][0]["attributes"])
+        self.assertEqual(0, self.index.search(attributes=[("saml.signing.private.key", None)])["total"])
+
+    def test_search_by_redirect_host(self):
+        self.assertEqual(["app-one", "other"], self._client_ids(self.index.search(redirect_host="app.cern.ch")))
+        self.assertEqual(["app-two"], self._client_ids(self.index.search(redirect_host="*.cern.ch")))
+
+    def test_search_by_attributes(self):
+        self.assertEqual(
+            ["app-one", "app-two"], self._client_ids(self.index.search(attributes=[("saml.signature", None)]))
+        )
+        self.assertEqual(
+            ["app-one"],
+            self._client_ids(
+                self.index.search(redirect_host="app.cern.ch", attributes=[("saml.signature", "true")])
+            ),
+        )
+        self.assertEqual([], self._client_ids(self.index.search(prefix="o", attributes=[("saml.signature", None)])))
+
+    def test_index_is_built_once(self):
+        self.index.search(prefix="app")
+        self.index.search(prefix="other")
+
+        self.keycloak_client_mock.stream_all_clients.assert_called_once()
+
+    def test_writes_refresh_the_index(self):
+        self.index.search(prefix="app")
+        created = MagicMock(headers={"Location": f"{CLIENTS_URL}/4"})
+        self.index.on_write("post", CLIENTS_URL, created)
+        self.index.on_write("put", f"{CLIENTS_URL}/1", MagicMock())
+        self.index.on_write("delete", f"{CLIENTS_URL}/2", MagicMock())
+        self.index.on_write("put", "https://keycloak/auth/admin/realms/mfa/clients/3", MagicMock())
+        fetched = {
+            "1": {"id": "1", "clientId": "renamed", "redirectUris": []},
+            "4": {"id": "4", "clientId": "app-new", "attributes": {"saml.signature": "true"}},
+        }
+
+        def get_client_by_id(clientid):
+            if clientid not in fetched:
+                raise KeycloakAPIError(404, "Could not find client")
+            return fetched[clientid]
+
+        self.keycloak_client_mock.get_client_by_id.side_effect = get_client_by_id
+
+        result = self.index.search(prefix="")
+
+        self.assertEqual(["app-new", "other", "renamed"], self._client_ids(result))
+        self.assertEqual(["other"], self._client_ids(self.index.search(redirect_host="app.cern.ch")))
+        self.assertEqual(
+            ["app-new"], self._client_ids(self.index.search(attributes=[("saml.signature", "true")]))
+        )
+        self.assertEqual(3, self.keycloak_client_mock.get_client_by_id.call_count)
+        self.keycloak_client_mock.stream_all_clients.assert_called_once()
+
+    def test_partial_import_rebuilds_the_index(self):
+        self.index.search(prefix="app")
+        self.index.on_write("post", "https://keycloak/auth/admin/realms/test/partialImport", MagicMock())
+
+        self.index.search(prefix="app")
+
+        self.assertEqual(2, self.keycloak_client_mock.stream_all_clients.call_count)
+
+    def test_refresh_errors_without_a_logger(self):
+        self.index.logger = None
+        self.index.search(prefix="app")
+        self.index.on_write("put", f"{CLIENTS_URL}/1", MagicMock())
+        self.keycloak_client_mock.get_client_by_id.side_effect = KeycloakAPIError(500, "Error")
+
+        result = self.index.search(prefix="app")
+
+        # The previous version is served, and fetched again on the next search
+        self.assertEqual(["app-one", "app-two"], self._client_ids(result))
+        self.index.search(prefix="app")
+        self.assertEqual(2, self.keycloak_client_mock.get_client_by_id.call_count)
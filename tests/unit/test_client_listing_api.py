@@ -0,0 +1,85 @@
+import json
+
+from utils import encode_cursor
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestClientListingApi(WebTestBase):
+    """
+    Test the client listing endpoint
+    """
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/client"
+
+    def _mock_pages(self, client_count):
+        clients = [{"clientId": f"client-{i}"} for i in range(client_count)]
+        self.keycloak_api_mock.get_clients_page.side_effect = (
+            lambda first, max_results: clients[first:first + max_results]
+        )
+
+    def test_list_first_page(self):
+        # prepare
+        self._mock_pages(5)
+
+        # act
+        resp = self.app_client.get(f"{self._get_endpoint()}?pageSize=2")
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        data = resp.json["data"]
+        self.assertEqual(["client-0", "client-1"], [c["clientId"] for c in data["clients"]])
+        self.assertEqual(encode_cursor({"first": 2}), data["nextCursor"])
+        self.keycloak_api_mock.get_clients_page.assert_called_once_with(0, 2)
+
+    def test_list_last_page(self):
+        # prepare
+        self._mock_pages(5)
+
+        # act
+        resp = self.app_client.get(
+            f"{self._get_endpoint()}?pageSize=2&cursor={encode_cursor({'first': 4})}"
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        data = resp.json["data"]
+        self.assertEqual(["client-4"], [c["clientId"] for c in data["clients"]])
+        self.assertIsNone(data["nextCursor"])
+
+    def test_list_invalid_cursor(self):
+        # act
+        resp = self.app_client.get(f"{self._get_endpoint()}?cursor=not-a-cursor")
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+
+    def test_stream_json_array(self):
+        # prepare
+        self.keycloak_api_mock.iter_clients.return_value = iter(
+            [{"clientId": f"client-{i}"} for i in range(5)]
+        )
+
+        # act
+        resp = self.app_client.get(
+            f"{self._get_endpoint()}?pageSize=2&stream=json&cursor={encode_cursor({'first': 2})}"
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(
+            [f"client-{i}" for i in range(5)], [c["clientId"] for c in json.loads(resp.data)]
+        )
+        self.keycloak_api_mock.iter_clients.assert_called_once_with(2, prefetch=True, first=2)
+
+    def test_stream_ndjson_empty_realm(self):
+        # prepare
+        self.keycloak_api_mock.iter_clients.return_value = iter([])
+
+        # act
+        resp = self.app_client.get(f"{self._get_endpoint()}?stream=ndjson")
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(b"", resp.data)
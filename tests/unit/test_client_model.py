@@ -0,0 +1,52 @@
+from model import Client, definition_matches
+
+from tests.utils.tools import WebTestBase
+
+
+class TestClientModel(WebTestBase):
+    """
+    Test the change detection of the client model
+    """
+
+    def test_definition_matches_ignores_extra_keys(self):
+        desired = {"attributes": {"saml.encrypt": "false"}}
+        current = {"attributes": {"saml.encrypt": "false", "saml.signature.algorithm": "RSA_SHA256"}}
+
+        self.assertTrue(definition_matches(desired, current))
+
+    def test_definition_matches_ignores_list_order(self):
+        self.assertTrue(definition_matches(["email", "profile"], ["profile", "email"]))
+        self.assertFalse(definition_matches(["email", "profile"], ["profile"]))
+
+    def test_get_changed_properties(self):
+        client = Client(
+            {"clientId": "target", "consentRequired": False, "redirectUris": ["https://a.cern.ch"]},
+            app=self.app,
+        )
+        current = {
+            "id": "6781736b-e1f7-4ff7-a883-f4168c4dbd8a",
+            "clientId": "target",
+            "consentRequired": True,
+            "protocol": "openid-connect",
+            "publicClient": False,
+            "redirectUris": ["https://a.cern.ch"],
+            "attributes": {"pkce.code.challenge.method": ""},
+            "protocolMappers": [
+                {
+                    "id": "8edc78fe-0b96-467f-acb9-8b846a237504",
+                    "protocol": "openid-connect",
+                    "config": {
+                        "id.token.claim": "false",
+                        "access.token.claim": "true",
+                        "included.client.audience": "target",
+                    },
+                    "name": "audience",
+                    "protocolMapper": "oidc-audience-mapper",
+                    "consentRequired": False,
+                }
+            ],
+        }
+
+        changes = client.get_changed_properties(current)
+
+        self.assertDictEqual({"consentRequired": False}, changes)
@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestClientSearchApi(WebTestBase):
+    """
+    Test the indexed client search endpoint
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client_index_mock = patch("api_definitions.client_index").start()
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/client/search"
+
+    def test_search_without_criteria(self):
+        # act
+        resp = self.app_client.get(self._get_endpoint())
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.client_index_mock.search.assert_not_called()
+
+    def test_search(self):
+        # prepare
+        result = {"total": 1, "clients": [{"id": "1", "clientId": "app"}]}
+        self.client_index_mock.search.return_value = result
+
+        # act
+        resp = self.app_client.get(
+            self._get_endpoint(),
+            query_string=[("redirectHost", "app.cern.ch"), ("attribute", "saml.signature=true"),
+                          ("attribute", "pkce.code.challenge.method"), ("limit", "10")],
+        )
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(result, resp.json["data"])
+        self.client_index_mock.search.assert_called_once_with(
+            attributes=[("saml.signature", "true"), ("pkce.code.challenge.method", None)],
+            limit=10,
+            client_id=None,
+            prefix=None,
+            redirect_host="app.cern.ch",
+        )
+
+    def test_search_invalid_limit(self):
+        # act
+        resp = self.app_client.get(self._get_endpoint(), query_string={"prefix": "app", "limit": 0})
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+
+    def test_search_status(self):
+        # prepare
+        with patch("api_definitions.client_sync") as client_sync_mock:
+            client_sync_mock.status.return_value = {"enabled": True, "lagSeconds": 1.5}
+
+            # act
+            resp = self.app_client.get(f"{self._get_endpoint()}/status")
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({"enabled": True, "lagSeconds": 1.5}, resp.json["data"])
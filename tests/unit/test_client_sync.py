@@ -0,0 +1,127 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from client_index import ClientIndex
+from client_sync import ClientSync
+from utils import KeycloakAPIError
+
+
+class TestClientSync(unittest.TestCase):
+    """
+    Test the sync of the client index from the admin events
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.keycloak_client_mock = MagicMock(realm="test")
+        patch("client_sync.keycloak_client", self.keycloak_client_mock).start()
+        patch("client_index.keycloak_client", self.keycloak_client_mock).start()
+        self.index = ClientIndex()
+        self.index.logger = MagicMock()
+        patch("client_sync.client_index", self.index).start()
+        self.clients = {
+            "1": {"id": "1", "clientId": "first"},
+            "2": {"id": "2", "clientId": "second"},
+        }
+        self.keycloak_client_mock.stream_all_clients.side_effect = lambda: iter(list(self.clients.values()))
+
+        def get_client_by_id(clientid):
+            if clientid not in self.clients:
+                raise KeycloakAPIError(404, "Could not find client")
+            return self.clients[clientid]
+
+        self.keycloak_client_mock.get_client_by_id.side_effect = get_client_by_id
+        # Newest first, as returned by Keycloak
+        self.events = [{"time": 1000, "operationType": "CREATE", "resourcePath": "clients/2"}]
+        self.keycloak_client_mock.get_admin_events.side_effect = (
+            lambda first, max_results, resource_types: self.events[first:first + max_results]
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.mirror_file = os.path.join(directory.name, "mirror.ndjson.gz")
+        self.sync = self._create_sync()
+
+    def _create_sync(self):
+        sync = ClientSync()
+        sync.page_size = 2
+        sync.max_events = 10
+        sync.save_interval = 0
+        sync.mirror_file = self.mirror_file
+        sync.logger = MagicMock()
+        return sync
+
+    def _client_ids(self):
+        return sorted(client["clientId"] for client in self.index.get_clients())
+
+    def test_load_without_saved_index_resyncs(self):
+        self.sync.load()
+
+        self.assertEqual(["first", "second"], self._client_ids())
+        self.assertEqual(1000, self.sync.cursor["time"])
+        self.assertEqual(1, self.sync.stats["fullResyncs"])
+        self.assertTrue(os.path.exists(self.sync.mirror_file))
+
+    def test_sync_applies_the_new_events(self):
+        self.sync.load()
+        self.clients["1"] = {"id": "1", "clientId": "renamed"}
+        self.clients["3"] = {"id": "3", "clientId": "third"}
+        del self.clients["2"]
+        self.events = [
+            {"time": 4000, "operationType": "UPDATE", "resourcePath": "clients/1/protocol-mappers/models/9"},
+            {"time": 3000, "operationType": "DELETE", "resourcePath": "clients/2"},
+            {"time": 2000, "operationType": "CREATE", "resourcePath": "clients/3"},
+            {"time": 2000, "operationType": "UPDATE", "resourcePath": "clients/2"},
+        ] + self.events
+        self.keycloak_client_mock.get_client_by_id.reset_mock()
+
+        applied = self.sync.sync()
+
+        self.assertEqual(4, applied)
+        self.assertEqual(["renamed", "third"], self._client_ids())
+        self.assertEqual({"time": 4000, "seen": ["4000:UPDATE:clients/1/protocol-mappers/models/9"]},
+                         self.sync.cursor)
+        # Only the changed clients are fetched, not the deleted one
+        self.assertEqual(
+            {"1", "2", "3"},
+            {call[0][0] for call in self.keycloak_client_mock.get_client_by_id.call_args_list},
+        )
+        self.keycloak_client_mock.stream_all_clients.assert_called_once()
+        self.assertEqual(4, self.sync.stats["events"])
+        self.assertEqual(0, self.sync.sync())
+
+    def test_lost_cursor_resyncs(self):
+        self.sync.load()
+        # The event at the cursor expired
+        self.events = [{"time": 5000, "operationType": "UPDATE", "resourcePath": "clients/1"}]
+
+        self.sync.sync()
+
+        self.assertEqual(2, self.sync.stats["fullResyncs"])
+        self.assertEqual(5000, self.sync.cursor["time"])
+
+    def test_load_saved_index(self):
+        self.sync.load()
+        self.sync.save()
+        restarted = self._create_sync()
+        self.index.load([])
+
+        restarted.load()
+
+        self.assertEqual(["first", "second"], self._client_ids())
+        self.assertEqual(1000, restarted.cursor["time"])
+        self.keycloak_client_mock.stream_all_clients.assert_called_once()
+
+    def test_saved_index_is_private(self):
+        self.clients["1"].update(secret="s3cr3t", attributes={"saml.encryption.private.key": "key"})
+        self.sync.load()
+
+        self.sync.save()
+
+        self.assertEqual(0o600, os.stat(self.mirror_file).st_mode & 0o777)
+        with gzip.open(self.mirror_file, "rt") as mirror_file:
+            content = mirror_file.read()
+        self.assertNotIn("s3cr3t", content)
+        self.assertNotIn("private.key", content)
@@ -0,0 +1,41 @@
+import json
+import unittest
+
+from keycloak_api_client.json_stream import iter_json_array
+
+
+class TestJsonStream(unittest.TestCase):
+    """
+    Test the incremental decoding of JSON arrays
+    """
+
+    def _chunks(self, document, size):
+        raw = json.dumps(document, ensure_ascii=False).encode()
+        return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+    def test_elements_split_across_chunks(self):
+        document = [
+            {"clientId": 'a,]}"\\b', "attributes": {"description": "é✓"}, "uris": ["x", ["y"]]},
+            "text",
+            None,
+            True,
+            1.5,
+            [],
+            {},
+        ]
+        for size in [1, 2, 3, 7, 1024]:
+            self.assertEqual(document, list(iter_json_array(self._chunks(document, size))))
+
+    def test_empty_array(self):
+        self.assertEqual([], list(iter_json_array([b" [ ] "])))
+
+    def test_elements_are_yielded_before_the_end(self):
+        elements = iter_json_array(iter([b'[{"id": 1}, {"id"', b': 2}']))
+
+        self.assertEqual({"id": 1}, next(elements))
+        with self.assertRaises(ValueError):
+            next(elements)
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"error": "unknown"}']))
@@ -0,0 +1,135 @@
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from keycloak_api_client.keycloak import KeycloakAPIClient
+from model import Client, ClientTypes
+
+CLIENTS_URL = "http://localhost:8081/auth/admin/realms/test/clients"
+SECRET_URL = f"{CLIENTS_URL}/new-id/client-secret"
+
+
+def _response(body=None, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.reason = "OK"
+    response.text = json.dumps(body)
+    response.json.return_value = body
+    response.headers = headers or {}
+    return response
+
+
+class TestKeycloakClientCreation(unittest.TestCase):
+    """
+    Test the client creation pipeline: a single creation request, then only the fix-ups needed
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        app = MagicMock()
+        app.config = {"CLIENT_DEFAULTS": {}, "LOG_DIR": tempfile.mkdtemp()}
+        patch("model.current_app", app).start()
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.realm = "test"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.assign_default_scopes = MagicMock()
+        self.client.session = MagicMock()
+        self.client.session.get.side_effect = self._get
+        self.client.session.post.side_effect = self._post
+        self.client.session.put.side_effect = self._put
+        # The client as stored by Keycloak, and the properties Keycloak ignores on creation
+        self.stored = None
+        self.ignored = {}
+        self.secret = {"type": "secret", "value": "s3cr3t"}
+
+    def _get(self, url, **kwargs):
+        if url == SECRET_URL:
+            return _response(self.secret)
+        return _response(self.stored)
+
+    def _post(self, url, **kwargs):
+        if url == SECRET_URL:
+            self.secret = {"type": "secret", "value": "generated"}
+            return _response(self.secret)
+        self.stored = dict(kwargs["json"], id="new-id", **self.ignored)
+        return _response(headers={"Location": f"{CLIENTS_URL}/new-id/"})
+
+    def _put(self, url, **kwargs):
+        self.stored = json.loads(kwargs["data"])
+        return _response()
+
+    def _create(self, definition, protocol=ClientTypes.OIDC):
+        return self.client.create_new_client(Client(definition, protocol))
+
+    def _requests(self, method):
+        return [call[1]["url"] for call in getattr(self.client.session, method).call_args_list]
+
+    def _assert_logged_calls(self, count):
+        self.client.logger.info.assert_any_call(f"Client 'app' created with {count} Keycloak calls")
+
+    def test_created_with_a_single_request(self):
+        created = self._create({"clientId": "app", "secret": "s3cr3t"})
+
+        self.assertEqual("new-id", created["id"])
+        self.assertEqual("s3cr3t", created["secret"])
+        self.assertEqual([CLIENTS_URL], self._requests("post"))
+        self.assertEqual([f"{CLIENTS_URL}/new-id"], self._requests("get"))
+        self.client.session.put.assert_not_called()
+        self.client.assign_default_scopes.assert_not_called()
+        self._assert_logged_calls(2)
+
+    def test_ignored_properties_are_updated(self):
+        self.ignored = {"consentRequired": False}
+
+        created = self._create({"clientId": "app", "consentRequired": True, "secret": "s3cr3t"})
+
+        self.assertTrue(created["consentRequired"])
+        self.assertEqual([f"{CLIENTS_URL}/new-id"], self._requests("put"))
+        sent = json.loads(self.client.session.put.call_args[1]["data"])
+        self.assertEqual(("new-id", True), (sent["id"], sent["consentRequired"]))
+        # Read again once updated
+        self.assertEqual(2, len(self._requests("get")))
+        self._assert_logged_calls(4)
+
+    def test_default_scopes_are_fixed_up(self):
+        self.ignored = {"defaultClientScopes": ["profile"]}
+
+        self._create({"clientId": "app", "defaultClientScopes": ["email"], "secret": "s3cr3t"})
+
+        self.client.assign_default_scopes.assert_called_once_with(["email"], ["profile"], "app", "new-id")
+        self.client.session.put.assert_not_called()
+        self.assertEqual(2, len(self._requests("get")))
+
+    def test_secret_is_fetched(self):
+        created = self._create({"clientId": "app"})
+
+        self.assertEqual("s3cr3t", created["secret"])
+        self.assertEqual([CLIENTS_URL], self._requests("post"))
+        self.assertEqual(SECRET_URL, self._requests("get")[-1])
+        self._assert_logged_calls(3)
+
+    def test_secret_is_generated_when_missing(self):
+        self.secret = {"type": "secret"}
+
+        created = self._create({"clientId": "app"})
+
+        self.assertEqual("generated", created["secret"])
+        self.assertEqual([CLIENTS_URL, SECRET_URL], self._requests("post"))
+        self._assert_logged_calls(4)
+
+    def test_no_secret_for_public_clients(self):
+        self.secret = {"type": "secret"}
+
+        created = self._create({"clientId": "app", "publicClient": True})
+
+        self.assertIsNone(created["secret"])
+        self.assertEqual([CLIENTS_URL], self._requests("post"))
+
+    def test_no_secret_for_saml_clients(self):
+        self._create({"clientId": "app"}, ClientTypes.SAML)
+
+        self.assertNotIn(SECRET_URL, self._requests("get"))
+        self._assert_logged_calls(2)
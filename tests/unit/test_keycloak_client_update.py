@@ -0,0 +1,120 @@
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from keycloak_api_client.keycloak import KeycloakAPIClient
+from model import Client
+from utils import KeycloakAPIError
+
+
+class TestKeycloakClientUpdate(unittest.TestCase):
+    """
+    Test that the client updates only write to Keycloak when something changed
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        app = MagicMock()
+        app.config = {"CLIENT_DEFAULTS": {}, "LOG_DIR": tempfile.mkdtemp()}
+        patch("model.current_app", app).start()
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.realm = "test"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.session = MagicMock()
+        response = self.client.session.get.return_value
+        response.status_code = 200
+        response.reason = "OK"
+        response.text = json.dumps(
+            [
+                {
+                    "id": "6781736b",
+                    "clientId": "target",
+                    "protocol": "openid-connect",
+                    "description": "test",
+                    "redirectUris": ["https://b.cern.ch", "https://a.cern.ch"],
+                    "attributes": {"post.logout.redirect.uris": "+", "pkce.code.challenge.method": ""},
+                    "defaultClientScopes": ["email", "profile"],
+                }
+            ]
+        )
+        self.client.session.put.return_value = response
+        self.client.assign_default_scopes = MagicMock()
+
+    def _update(self, definition):
+        return self.client.update_client_properties(
+            "target", Client(definition, partial_definition=True)
+        )
+
+    def test_no_op_update_is_skipped(self):
+        updated = self._update(
+            {
+                "description": "test",
+                "redirectUris": ["https://a.cern.ch", "https://b.cern.ch"],
+                "attributes": {"post.logout.redirect.uris": "+"},
+                "defaultClientScopes": ["profile", "email"],
+            }
+        )
+
+        self.assertFalse(updated.changed)
+        self.assertEqual("6781736b", updated.definition["id"])
+        self.client.session.put.assert_not_called()
+        self.client.assign_default_scopes.assert_not_called()
+        self.assertEqual(1, self.client.session.get.call_count)
+
+    def test_changed_properties_are_written(self):
+        updated = self._update({"description": "new", "defaultClientScopes": ["email", "profile"]})
+
+        self.assertTrue(updated.changed)
+        self.client.session.put.assert_called_once()
+        self.assertEqual("new", json.loads(self.client.session.put.call_args[1]["data"])["description"])
+        self.client.assign_default_scopes.assert_not_called()
+
+    def test_only_changed_scopes_are_written(self):
+        updated = self._update({"description": "test", "defaultClientScopes": ["email"]})
+
+        self.assertTrue(updated.changed)
+        self.client.session.put.assert_not_called()
+        self.client.assign_default_scopes.assert_called_once_with(
+            ["email"], ["email", "profile"], "target", "6781736b"
+        )
+
+
+class TestKeycloakDefaultScopes(unittest.TestCase):
+    """
+    Test the concurrent changes of the default scopes of a client
+    """
+
+    def setUp(self):
+        self.client = KeycloakAPIClient()
+        self.client.logger = MagicMock()
+        self.client.get_scopes = MagicMock(
+            return_value=[{"name": "email", "id": "s1"}, {"name": "profile", "id": "s2"}]
+        )
+        self.client.set_client_default_scope = MagicMock()
+
+    def test_scopes_are_added_and_removed(self):
+        results = self.client.assign_default_scopes(
+            ["email", "missing"], ["profile"], "target", "6781736b"
+        )
+
+        self.assertEqual({"email", "profile"}, set(results))
+        self.assertTrue(all(result["success"] for result in results.values()))
+        self.client.set_client_default_scope.assert_any_call("6781736b", "s1", "put")
+        self.client.set_client_default_scope.assert_any_call("6781736b", "s2", "delete")
+
+    def test_failed_scopes_are_raised(self):
+        def set_scope(clientid, scope_id, request_type):
+            if scope_id == "s2":
+                raise KeycloakAPIError(409, "Conflict")
+
+        self.client.set_client_default_scope.side_effect = set_scope
+
+        with self.assertRaises(KeycloakAPIError) as raised:
+            self.client.assign_default_scopes(["email", "profile"], [], "target", "6781736b")
+
+        self.assertEqual(409, raised.exception.status_code)
+        self.assertIn("profile", raised.exception.message)
+        self.assertEqual(2, self.client.set_client_default_scope.call_count)
@@ -0,0 +1,181 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from keycloak_api_client.keycloak import KeycloakAPIClient
+from model import UserMfaSnapshot
+from utils import KeycloakAPIError, ResourceNotFoundError
+
+MFA_USERS_URL = "http://localhost:8081/auth/admin/realms/mfa/users"
+MAIN_USERS_URL = "http://localhost:8081/auth/admin/realms/cern/users"
+
+
+def _response(body, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.reason = "OK" if status_code < 400 else "Error"
+    response.text = json.dumps(body)
+    response.json.return_value = body
+    return response
+
+
+class TestKeycloakMfaUsers(unittest.TestCase):
+    """
+    Test the lookup of the realm holding the users' MFA settings
+    """
+
+    def setUp(self):
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.realm = "cern"
+        self.client.mfa_realm = "mfa"
+        self.client.mfa_migrated_role = "mfa-migrated"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.session = MagicMock()
+        # URL prefix -> response body, or KeycloakAPIError
+        self.responses = {}
+        self.client.session.get.side_effect = self._get
+
+    def _get(self, url, **kwargs):
+        for prefix, body in sorted(self.responses.items(), key=lambda item: -len(item[0])):
+            if url.startswith(prefix):
+                if isinstance(body, KeycloakAPIError):
+                    return _response({"error": body.message}, body.status_code)
+                return _response(body)
+        return _response([])
+
+    def _set_user(self, users_url, user_id, roles=None):
+        self.responses[users_url + "?"] = [{"id": user_id, "username": "jdoe", "email": "jdoe@cern.ch"}]
+        if roles is not None:
+            self.responses["{0}/{1}/role-mappings".format(users_url, user_id)] = [
+                {"name": role} for role in roles
+            ]
+
+    def test_user_found_only_in_mfa_realm(self):
+        self._set_user(MFA_USERS_URL, "mfa-id", roles=[])
+
+        user, realm, migrated = self.client._resolve_mfa_user("jdoe")
+
+        self.assertEqual(("mfa-id", "mfa", False), (user["id"], realm, migrated))
+
+    def test_migrated_user_found_in_main_realm(self):
+        self._set_user(MFA_USERS_URL, "mfa-id", roles=["mfa-migrated"])
+        self._set_user(MAIN_USERS_URL, "main-id")
+
+        user, realm, migrated = self.client._resolve_mfa_user("jdoe")
+
+        self.assertEqual(("main-id", "cern", True), (user["id"], realm, migrated))
+
+    def test_user_found_only_in_main_realm(self):
+        self._set_user(MAIN_USERS_URL, "main-id")
+
+        with self.assertRaises(ResourceNotFoundError):
+            self.client._resolve_mfa_user("jdoe")
+
+    def test_user_found_in_neither_realm(self):
+        with self.assertRaises(ResourceNotFoundError):
+            self.client._resolve_mfa_user("jdoe")
+
+    def test_main_realm_error_ignored_for_non_migrated_users(self):
+        self._set_user(MFA_USERS_URL, "mfa-id", roles=[])
+        self.responses[MAIN_USERS_URL] = KeycloakAPIError(500, "Failed")
+
+        _, realm, _ = self.client._resolve_mfa_user("jdoe")
+
+        self.assertEqual("mfa", realm)
+
+    def test_main_realm_error_raised_for_migrated_users(self):
+        self._set_user(MFA_USERS_URL, "mfa-id", roles=["mfa-migrated"])
+        self.responses[MAIN_USERS_URL] = KeycloakAPIError(500, "Failed")
+
+        with self.assertRaises(KeycloakAPIError):
+            self.client._resolve_mfa_user("jdoe")
+
+    def test_mfa_realm_error_raised(self):
+        self._set_user(MAIN_USERS_URL, "main-id")
+        self.responses[MFA_USERS_URL] = KeycloakAPIError(500, "Failed")
+
+        with self.assertRaises(KeycloakAPIError):
+            self.client._resolve_mfa_user("jdoe")
+
+    def test_snapshots_of_users_migrated_through_a_group(self):
+        # The composite role mappings include the roles of the user's groups
+        self._set_user(MFA_USERS_URL, "mfa-id", roles=["default-roles-mfa", "mfa-migrated"])
+        self._set_user(MAIN_USERS_URL, "main-id")
+        # Not a direct member of the role
+        self.responses["http://localhost:8081/auth/admin/realms/mfa/roles/mfa-migrated/users"] = []
+        self.responses["{0}/main-id/credentials".format(MAIN_USERS_URL)] = [{"type": "otp"}]
+
+        results = list(self.client.get_mfa_snapshots({"jdoe"}))
+
+        self.assertEqual(1, len(results))
+        username, snapshot, error = results[0]
+        self.assertIsNone(error)
+        self.assertEqual(("cern", True, "main-id"), (snapshot.realm, snapshot.migrated, snapshot.user["id"]))
+        self.assertEqual([{"type": "otp"}], snapshot.credentials)
+        requested = [call[1]["url"] for call in self.client.session.get.call_args_list]
+        self.assertIn("{0}/mfa-id/role-mappings/realm/composite".format(MFA_USERS_URL), requested)
+        self.assertFalse(any("/roles/" in url for url in requested))
+
+    def test_snapshots_errors_are_per_user(self):
+        self._set_user(MFA_USERS_URL, "mfa-id", roles=[])
+
+        results = {username: error for username, _, error in self.client.get_mfa_snapshots({"jdoe", "ghost"})}
+
+        self.assertIsNone(results["jdoe"])
+        self.assertIsInstance(results["ghost"], ResourceNotFoundError)
+
+
+class TestKeycloakUserUpdate(unittest.TestCase):
+    """
+    Test the PUT-only updates of already fetched users
+    """
+
+    def setUp(self):
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.REQUIRED_ACTION_CONFIGURE_OTP = "CONFIGURE_TOTP"
+        self.client.session = MagicMock()
+        self.client.session.put.return_value = _response({})
+        self.user = {"id": "user-id", "username": "jdoe", "firstName": "John", "requiredActions": []}
+        self.snapshot = UserMfaSnapshot(self.user, "mfa", [], False)
+
+    def _sent_user(self):
+        self.client.session.put.assert_called_once()
+        self.assertEqual(f"{MFA_USERS_URL}/user-id", self.client.session.put.call_args[1]["url"])
+        return json.loads(self.client.session.put.call_args[1]["data"])
+
+    def test_unchanged_user_is_not_sent(self):
+        updated = self.client.update_user_object(self.user, "mfa", firstName="John", unknown="value")
+
+        self.assertEqual(self.user, updated)
+        self.client.session.put.assert_not_called()
+
+    def test_changed_user_is_sent(self):
+        updated = self.client.update_user_object(self.user, "mfa", firstName="Jane")
+
+        self.assertEqual("Jane", updated["firstName"])
+        self.assertEqual(dict(self.user, firstName="Jane"), self._sent_user())
+        self.client.session.get.assert_not_called()
+
+    def test_enable_otp_with_a_snapshot_is_a_single_put(self):
+        self.client.enable_otp_for_user("jdoe", self.snapshot)
+
+        self.assertEqual(["CONFIGURE_TOTP"], self._sent_user()["requiredActions"])
+        self.assertEqual(["CONFIGURE_TOTP"], self.snapshot.required_actions)
+        self.client.session.get.assert_not_called()
+
+    def test_missing_required_action_is_not_deleted(self):
+        self.client.delete_user_required_action_if_exists("jdoe", "CONFIGURE_TOTP", self.snapshot)
+
+        self.client.session.put.assert_not_called()
+
+    def test_required_action_is_deleted(self):
+        self.user["requiredActions"] = ["CONFIGURE_TOTP", "VERIFY_EMAIL"]
+
+        self.client.delete_user_required_action_if_exists("jdoe", "CONFIGURE_TOTP", self.snapshot)
+
+        self.assertEqual(["VERIFY_EMAIL"], self._sent_user()["requiredActions"])
@@ -0,0 +1,67 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from keycloak_api_client.keycloak import KeycloakAPIClient
+
+
+class TestKeycloakPaging(unittest.TestCase):
+    """
+    Test the iteration over the pages of the Keycloak listings
+    """
+
+    def setUp(self):
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.realm = "test"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.session = MagicMock()
+        self.items = [{"id": str(i)} for i in range(5)]
+
+        def get(url, headers, params):
+            response = MagicMock()
+            response.status_code = 200
+            response.reason = "OK"
+            response.text = json.dumps(self.items[params["first"]:params["first"] + params["max"]])
+            return response
+
+        self.client.session.get.side_effect = get
+
+    def test_iter_clients(self):
+        clients = list(self.client.iter_clients(page_size=2))
+
+        self.assertEqual(self.items, clients)
+        self.assertEqual(3, self.client.session.get.call_count)
+
+    def test_iter_users_with_prefetch(self):
+        users = list(self.client.iter_users(page_size=5, prefetch=True, brief_representation=True))
+
+        self.assertEqual(self.items, users)
+        # The last page is full, so an empty page is needed to find the end
+        self.assertEqual(2, self.client.session.get.call_count)
+        params = self.client.session.get.call_args_list[0][1]["params"]
+        self.assertEqual("true", params["briefRepresentation"])
+
+    def test_pages_are_not_memoized(self):
+        with self.client.read_memo():
+            list(self.client.iter_clients(page_size=2))
+            list(self.client.iter_clients(page_size=2))
+
+        self.assertEqual(6, self.client.session.get.call_count)
+
+    def test_stream_all_clients(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.reason = "OK"
+        raw = json.dumps(self.items).encode()
+        response.iter_content.return_value = [raw[i:i + 4] for i in range(0, len(raw), 4)]
+        self.client.session.get.side_effect = None
+        self.client.session.get.return_value = response
+
+        clients = self.client.stream_all_clients()
+
+        self.assertEqual(self.items[0], next(clients))
+        self.assertEqual(self.items[1:], list(clients))
+        self.assertTrue(self.client.session.get.call_args[1]["stream"])
+        response.close.assert_called_once_with()
@@ -0,0 +1,91 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from keycloak_api_client.keycloak import KeycloakAPIClient
+
+
+class TestKeycloakReadMemo(unittest.TestCase):
+    """
+    Test the memoization of the Keycloak reads
+    """
+
+    def setUp(self):
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.realm = "test"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.session = MagicMock()
+        response = self.client.session.get.return_value
+        response.status_code = 200
+        response.reason = "OK"
+        response.text = '{"id": "6781736b", "clientId": "target"}'
+        self.client.session.put.return_value = response
+        self.client.session.delete.return_value = response
+
+    def test_reads_are_memoized(self):
+        with self.client.read_memo():
+            first = self.client.get_client_by_id("6781736b")
+            second = self.client.get_client_by_id("6781736b")
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.client.session.get.call_count)
+
+    def test_only_writes_to_the_same_collection_invalidate_reads(self):
+        with self.client.read_memo():
+            self.client.get_client_by_id("6781736b")
+            self.client.delete_user("some-user")
+            self.client.get_client_by_id("6781736b")
+            self.client.set_client_fine_grain_permission("6781736b", True)
+            self.client.get_client_by_id("6781736b")
+
+        self.assertEqual(2, self.client.session.get.call_count)
+
+    def test_only_the_parsed_json_is_memoized(self):
+        with self.client.read_memo():
+            first = self.client.get_client_by_id("6781736b")
+            first["clientId"] = "changed"
+            second = self.client.get_client_by_id("6781736b")
+
+        self.assertEqual("target", second["clientId"])
+        self.assertEqual(1, self.client.session.get.call_count)
+
+    def test_memo_size_is_limited(self):
+        self.client.read_memo_size = 2
+        with self.client.read_memo():
+            for clientid in ["1", "2", "3", "1"]:
+                self.client.get_client_by_id(clientid)
+
+        self.assertEqual(4, self.client.session.get.call_count)
+
+    def test_writes_of_other_threads_invalidate_reads(self):
+        with self.client.read_memo():
+            self.client.get_client_by_id("6781736b")
+            writer = threading.Thread(target=self.client.delete_client_by_id, args=["6781736b"])
+            writer.start()
+            writer.join()
+            self.client.get_client_by_id("6781736b")
+
+        self.assertEqual(2, self.client.session.get.call_count)
+
+    def test_reads_are_not_memoized_outside_a_request(self):
+        self.client.get_client_by_id("6781736b")
+        self.client.get_client_by_id("6781736b")
+
+        self.assertEqual(2, self.client.session.get.call_count)
+
+    def test_writes_are_notified_to_the_listeners(self):
+        listener = MagicMock()
+        self.client.add_write_listener(listener)
+        self.client.add_write_listener(listener)
+        failing_listener = MagicMock(side_effect=ValueError)
+        self.client.add_write_listener(failing_listener)
+
+        self.client.get_client_by_id("6781736b")
+        ret = self.client.delete_client_by_id("6781736b")
+
+        listener.assert_called_once_with(
+            "delete", "http://localhost:8081/auth/admin/realms/test/clients/6781736b", ret
+        )
+        failing_listener.assert_called_once()
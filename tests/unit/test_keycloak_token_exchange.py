@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from keycloak_api_client.keycloak import KeycloakAPIClient
+
+TARGET_ID = "6781736b"
+REQUESTOR_ID = "8edc78fe"
+
+
+class TestKeycloakTokenExchange(unittest.TestCase):
+    """
+    Test the grant and revocation of token-exchange permissions
+    """
+
+    def setUp(self):
+        self.client = KeycloakAPIClient()
+        self.client.base_url = "http://localhost:8081/auth"
+        self.client.realm = "test"
+        self.client.logger = MagicMock()
+        self.client.access_token_object = {"access_token": "1234"}
+        self.client.master_realm_client = {"id": "realm-management"}
+        self.client.session = MagicMock()
+        response = self.client.session.put.return_value
+        response.status_code = 200
+        response.reason = "OK"
+        self.client.set_client_fine_grain_permission = MagicMock()
+        self.permission = {"id": "permission-id", "name": "token-exchange.permission.client.6781736b"}
+        self.client.get_client_token_exchange_permission = MagicMock(return_value=self.permission)
+        self.client.get_permission_associated_policies = MagicMock(return_value=[{"id": "other-policy"}])
+        self.client.update_token_exchange_permissions = MagicMock()
+        self.target = MagicMock(definition={"clientId": "target", "id": TARGET_ID})
+        self.requestor = MagicMock(definition={"clientId": "requestor", "id": REQUESTOR_ID})
+
+    def _set_policy(self, subscribed_clients, policy_id="requestor-policy"):
+        self.client.get_client_policy_by_name = MagicMock(
+            return_value=[{"id": policy_id, "config": {"clients": json.dumps(subscribed_clients)}}]
+        )
+
+    def test_grant(self):
+        self._set_policy([])
+
+        ret = self.client.grant_token_exchange_permissions(self.target, self.requestor)
+
+        self.assertEqual(self.client.update_token_exchange_permissions.return_value, ret)
+        self.client.set_client_fine_grain_permission.assert_called_once_with(TARGET_ID, True)
+        self.client.update_token_exchange_permissions.assert_called_once_with(
+            self.permission, ["other-policy", "requestor-policy"]
+        )
+        # The requestor is subscribed to the existing policy
+        data = json.loads(self.client.session.put.call_args[1]["data"])
+        self.assertEqual([REQUESTOR_ID], data["clients"])
+
+    def test_grant_already_granted(self):
+        self._set_policy([REQUESTOR_ID])
+        self.client.get_permission_associated_policies.return_value = [{"id": "requestor-policy"}]
+
+        ret = self.client.grant_token_exchange_permissions(self.target, self.requestor)
+
+        self.assertIsNone(ret)
+        self.client.update_token_exchange_permissions.assert_not_called()
+        self.client.session.put.assert_not_called()
+        self.client.session.post.assert_not_called()
+
+    def test_revoke(self):
+        self._set_policy([REQUESTOR_ID])
+        self.client.get_permission_associated_policies.return_value = [
+            {"id": "other-policy"}, {"id": "requestor-policy"}
+        ]
+
+        ret = self.client.revoke_token_exchange_permissions(self.target, self.requestor)
+
+        self.assertEqual(self.client.update_token_exchange_permissions.return_value, ret)
+        self.client.update_token_exchange_permissions.assert_called_once_with(
+            self.permission, ["other-policy"]
+        )
+        self.client.set_client_fine_grain_permission.assert_not_called()
+
+    def test_revoke_already_revoked(self):
+        self._set_policy([REQUESTOR_ID])
+
+        with self.assertRaises(ValueError):
+            self.client.revoke_token_exchange_permissions(self.target, self.requestor)
+
+        self.client.update_token_exchange_permissions.assert_not_called()
+
+    def test_revoke_policy_with_the_old_name(self):
+        policies = {"allow token exchange for {0}".format(REQUESTOR_ID): [{"id": "old-policy"}]}
+        self.client.get_client_policy_by_name = MagicMock(side_effect=lambda name: policies.get(name, []))
+        self.client.get_permission_associated_policies.return_value = [{"id": "old-policy"}]
+
+        self.client.revoke_token_exchange_permissions(self.target, self.requestor)
+
+        self.client.update_token_exchange_permissions.assert_called_once_with(self.permission, [])
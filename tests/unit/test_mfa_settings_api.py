@@ -35,6 +35,9 @@ class TestUserEndpointsApi(WebTestBase):
     def _get_otp_reset_endpoint(self):
         return f"{self._get_otp_endpoint()}/reset"
 
+    def _mfa_snapshot(self):
+        return self.keycloak_api_mock.get_mfa_snapshot.return_value
+
     def _mock_user_auth(self, multifactor=False):
         """
         Mocks the auth to simulate a user accessing his credentials
@@ -142,7 +145,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertDictEqual({"enabled": True, "initialization_required": False}, resp.json["data"])
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=None,
         )
 
     def test_post_otp_settings_not_found(self):
@@ -169,7 +175,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("otp enabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_post_otp_settings_not_enabled_user_mfa_auth(self):
@@ -184,7 +193,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("otp enabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_post_otp_settings_bad_creds(self):
@@ -228,7 +240,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("otp already enabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_delete_otp_settings_not_found(self):
@@ -259,11 +274,17 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertTrue("otp already disabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -274,7 +295,7 @@ class TestUserEndpointsApi(WebTestBase):
             (True, False),
             (False, False),
         ]
-        self.keycloak_api_mock.is_user_migrated_by_username.side_effect = [False]
+        self._mfa_snapshot().migrated = False
 
         # act
         resp = self.app_client.delete(self._get_otp_endpoint())
@@ -287,11 +308,17 @@ class TestUserEndpointsApi(WebTestBase):
         )
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -302,7 +329,7 @@ class TestUserEndpointsApi(WebTestBase):
             (True, False),
             (False, False),
         ]
-        self.keycloak_api_mock.is_user_migrated_by_username.side_effect = [True]
+        self._mfa_snapshot().migrated = True
 
         # act
         resp = self.app_client.delete(self._get_otp_endpoint())
@@ -310,13 +337,23 @@ class TestUserEndpointsApi(WebTestBase):
         # assert
         self.assertEqual(200, resp.status_code)
         self.assertTrue("OTP Disabled".casefold() in resp.json.casefold())
+        self.keycloak_api_mock.get_mfa_snapshot.assert_called_once_with(self.user_id)
+        self.keycloak_api_mock.disable_otp_for_user.assert_called_with(
+            self.user_id, snapshot=self._mfa_snapshot()
+        )
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -335,11 +372,17 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertTrue("OTP Disabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -356,7 +399,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(404, resp.status_code)
         self.assertTrue("not found".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_reset_otp_is_enabled_needs_reset(self):
@@ -368,10 +414,15 @@ class TestUserEndpointsApi(WebTestBase):
         # assert
         self.assertEqual(200, resp.status_code)
         self.assertTrue("otp Enabled and Reset".casefold() in resp.json.casefold())
-        self.keycloak_api_mock.disable_otp_for_user.assert_called_with(self.user_id)
-        self.keycloak_api_mock.enable_otp_for_user.assert_called_with(self.user_id)
+        self.keycloak_api_mock.disable_otp_for_user.assert_called_with(
+            self.user_id, snapshot=self._mfa_snapshot()
+        )
+        self.keycloak_api_mock.enable_otp_for_user.assert_called_with(self.user_id, snapshot=self._mfa_snapshot())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_reset_otp_is_enabled_not_enabled(self):
@@ -384,9 +435,14 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("otp Enabled and Reset".casefold() in resp.json.casefold())
         self.keycloak_api_mock.disable_otp_for_user.assert_not_called()
-        self.keycloak_api_mock.enable_otp_for_user.assert_called_with(self.user_id)
+        self.keycloak_api_mock.enable_otp_for_user.assert_called_with(
+            self.user_id, snapshot=self._mfa_snapshot()
+        )
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP
+            self.user_id,
+            REQUIRED_ACTION_CONFIGURE_OTP,
+            CREDENTIAL_TYPE_OTP,
+            snapshot=self._mfa_snapshot(),
         )
 
     # WebAuthN endpoints
@@ -415,7 +471,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertDictEqual({"enabled": True, "initialization_required": False}, resp.json["data"])
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_WEBAUTHN_REGISTER, CREDENTIAL_TYPE_WEBAUTHN
+            self.user_id,
+            REQUIRED_ACTION_WEBAUTHN_REGISTER,
+            CREDENTIAL_TYPE_WEBAUTHN,
+            snapshot=None,
         )
 
     def test_post_webauthn_settings_not_found(self):
@@ -442,7 +501,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("webauthn enabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_WEBAUTHN_REGISTER, CREDENTIAL_TYPE_WEBAUTHN
+            self.user_id,
+            REQUIRED_ACTION_WEBAUTHN_REGISTER,
+            CREDENTIAL_TYPE_WEBAUTHN,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_post_webauthn_settings_already_enabled(self):
@@ -456,7 +518,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("webauthn already enabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_WEBAUTHN_REGISTER, CREDENTIAL_TYPE_WEBAUTHN
+            self.user_id,
+            REQUIRED_ACTION_WEBAUTHN_REGISTER,
+            CREDENTIAL_TYPE_WEBAUTHN,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_delete_webauthn_settings_not_found(self):
@@ -488,11 +553,17 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertTrue("webauthn already disabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -503,7 +574,7 @@ class TestUserEndpointsApi(WebTestBase):
             (False, False),
             (True, False),
         ]
-        self.keycloak_api_mock.is_user_migrated_by_username.side_effect = [False]
+        self._mfa_snapshot().migrated = False
 
         # act
         resp = self.app_client.delete(self._get_webauthn_endpoint())
@@ -516,11 +587,17 @@ class TestUserEndpointsApi(WebTestBase):
         )
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -531,7 +608,7 @@ class TestUserEndpointsApi(WebTestBase):
             (False, False),
             (True, False),
         ]
-        self.keycloak_api_mock.is_user_migrated_by_username.side_effect = [True]
+        self._mfa_snapshot().migrated = True
 
         # act
         resp = self.app_client.delete(self._get_webauthn_endpoint())
@@ -541,11 +618,17 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertTrue("webauthn Disabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -565,11 +648,17 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertTrue("webauthn Disabled".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_has_calls(
             [
-                call(self.user_id, REQUIRED_ACTION_CONFIGURE_OTP, CREDENTIAL_TYPE_OTP),
+                call(
+                    self.user_id,
+                    REQUIRED_ACTION_CONFIGURE_OTP,
+                    CREDENTIAL_TYPE_OTP,
+                    snapshot=self._mfa_snapshot(),
+                ),
                 call(
                     self.user_id,
                     REQUIRED_ACTION_WEBAUTHN_REGISTER,
                     CREDENTIAL_TYPE_WEBAUTHN,
+                    snapshot=self._mfa_snapshot(),
                 ),
             ]
         )
@@ -586,7 +675,10 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(404, resp.status_code)
         self.assertTrue("not found".casefold() in resp.json.casefold())
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_WEBAUTHN_REGISTER, CREDENTIAL_TYPE_WEBAUTHN
+            self.user_id,
+            REQUIRED_ACTION_WEBAUTHN_REGISTER,
+            CREDENTIAL_TYPE_WEBAUTHN,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_reset_webauthn_is_enabled_needs_reset(self):
@@ -599,11 +691,16 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("WebAuthn Enabled and Reset".casefold() in resp.json.casefold())
         self.keycloak_api_mock.disable_webauthn_for_user.assert_called_with(
-            self.user_id
+            self.user_id, snapshot=self._mfa_snapshot()
+        )
+        self.keycloak_api_mock.enable_webauthn_for_user.assert_called_with(
+            self.user_id, snapshot=self._mfa_snapshot()
         )
-        self.keycloak_api_mock.enable_webauthn_for_user.assert_called_with(self.user_id)
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_WEBAUTHN_REGISTER, CREDENTIAL_TYPE_WEBAUTHN
+            self.user_id,
+            REQUIRED_ACTION_WEBAUTHN_REGISTER,
+            CREDENTIAL_TYPE_WEBAUTHN,
+            snapshot=self._mfa_snapshot(),
         )
 
     def test_reset_webauthn_is_enabled_not_enabled(self):
@@ -616,7 +713,12 @@ class TestUserEndpointsApi(WebTestBase):
         self.assertEqual(200, resp.status_code)
         self.assertTrue("WebAuthn Enabled and Reset".casefold() in resp.json.casefold())
         self.keycloak_api_mock.disable_webauthn_for_user.assert_not_called()
-        self.keycloak_api_mock.enable_webauthn_for_user.assert_called_with(self.user_id)
+        self.keycloak_api_mock.enable_webauthn_for_user.assert_called_with(
+            self.user_id, snapshot=self._mfa_snapshot()
+        )
         self.keycloak_api_mock.is_credential_enabled_for_user.assert_called_with(
-            self.user_id, REQUIRED_ACTION_WEBAUTHN_REGISTER, CREDENTIAL_TYPE_WEBAUTHN
+            self.user_id,
+            REQUIRED_ACTION_WEBAUTHN_REGISTER,
+            CREDENTIAL_TYPE_WEBAUTHN,
+            snapshot=self._mfa_snapshot(),
         )
@@ -0,0 +1,124 @@
+from unittest.mock import MagicMock, patch
+
+from model import Client
+from reconcile import apply_plan, describe_plan, plan_reconciliation, summarize_plan
+from utils import KeycloakAPIError
+
+from tests.utils.tools import WebTestBase
+
+
+class TestReconcile(WebTestBase):
+    """
+    Test the planning and the application of client reconciliations
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.reconcile_keycloak_mock = patch("reconcile.keycloak_client").start()
+        self.reconcile_keycloak_mock.get_scopes.return_value = [
+            {"name": "email", "id": "s1"},
+            {"name": "profile", "id": "s2"},
+        ]
+
+    def _client(self, definition):
+        # Only the given properties, to keep the representations short
+        return Client(definition, app=self.app, partial_definition=True)
+
+    def test_plan_only_the_changes(self):
+        desired = [
+            self._client({"clientId": "same", "consentRequired": False, "defaultClientScopes": ["email"]}),
+            self._client({"clientId": "changed", "consentRequired": False, "secret": "s3cr3t",
+                          "defaultClientScopes": ["email", "profile"]}),
+            self._client({"clientId": "new", "consentRequired": False}),
+        ]
+        current = [
+            {"id": "1", "clientId": "same", "protocol": "openid-connect", "consentRequired": False,
+             "defaultClientScopes": ["email"], "optionalClientScopes": ["phone"]},
+            # No secret, as in the client index
+            {"id": "2", "clientId": "changed", "protocol": "openid-connect", "consentRequired": True,
+             "defaultClientScopes": ["email", "web-origins"]},
+            {"id": "3", "clientId": "account"},
+            {"id": "4", "clientId": "unwanted"},
+        ]
+
+        plan = plan_reconciliation(desired, current, prune=True)
+
+        self.assertEqual(
+            [("changed", "update"), ("changed", "scopes"), ("new", "create"), ("unwanted", "delete")],
+            [(action["clientId"], action["action"]) for action in plan],
+        )
+        self.assertEqual({"consentRequired": False}, plan[0]["changes"])
+        self.assertEqual((["profile"], ["web-origins"]), (plan[1]["add"], plan[1]["remove"]))
+        self.assertEqual({"delete": 1, "create": 1, "update": 1, "scopes": 1}, summarize_plan(plan))
+        self.assertNotIn("current", describe_plan(plan)[0])
+        self.assertEqual([], plan_reconciliation(desired[:1], current[:1]))
+
+    def test_plan_clients_without_a_protocol(self):
+        # Keycloak leaves the protocol out of the representations of some openid-connect clients
+        current = [{"id": "1", "clientId": "same", "consentRequired": False}]
+
+        self.assertEqual([], plan_reconciliation([self._client({"clientId": "same", "consentRequired": False})], current))
+
+    def test_apply_plan(self):
+        plan = plan_reconciliation(
+            [
+                self._client({"clientId": "changed", "consentRequired": False,
+                              "defaultClientScopes": ["profile"]}),
+                self._client({"clientId": "new"}),
+            ],
+            [
+                {"id": "2", "clientId": "changed", "consentRequired": True, "defaultClientScopes": ["email"]},
+                {"id": "4", "clientId": "unwanted"},
+            ],
+            prune=True,
+        )
+        create_client = MagicMock()
+        # Changed by someone else since the plan
+        self.reconcile_keycloak_mock.get_client_by_id.return_value = {
+            "id": "2", "clientId": "changed", "consentRequired": True, "description": "Changed since",
+        }
+
+        with self.app.app_context():
+            results = list(apply_plan(plan, create_client, max_workers=2))
+
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(error is None for _, error in results))
+        self.assertEqual("new", create_client.call_args[0][0].definition["clientId"])
+        current_client, changes = self.reconcile_keycloak_mock.apply_client_changes.call_args[0]
+        self.assertEqual("2", current_client.definition["id"])
+        self.assertEqual("Changed since", current_client.definition["description"])
+        self.assertEqual({"consentRequired": False}, changes)
+        self.reconcile_keycloak_mock.set_client_default_scope.assert_any_call("2", "s2", "put")
+        self.reconcile_keycloak_mock.set_client_default_scope.assert_any_call("2", "s1", "delete")
+        self.reconcile_keycloak_mock.delete_client_by_id.assert_called_once_with("4")
+        self.reconcile_keycloak_mock.get_client_by_id.assert_called_once_with("2")
+
+    def test_apply_plan_skips_updates_already_applied(self):
+        plan = plan_reconciliation(
+            [self._client({"clientId": "changed", "consentRequired": False})],
+            [{"id": "2", "clientId": "changed", "consentRequired": True}],
+        )
+        self.reconcile_keycloak_mock.get_client_by_id.return_value = {
+            "id": "2", "clientId": "changed", "consentRequired": False,
+        }
+
+        with self.app.app_context():
+            results = list(apply_plan(plan, MagicMock()))
+
+        self.assertEqual([("update", None)], [(action["action"], error) for action, error in results])
+        self.reconcile_keycloak_mock.apply_client_changes.assert_not_called()
+
+    def test_apply_plan_skips_after_a_failure(self):
+        self.reconcile_keycloak_mock.apply_client_changes.side_effect = KeycloakAPIError(500, "Failed")
+        plan = plan_reconciliation(
+            [self._client({"clientId": "changed", "consentRequired": False, "defaultClientScopes": ["profile"]})],
+            [{"id": "2", "clientId": "changed", "consentRequired": True, "defaultClientScopes": []}],
+        )
+
+        with self.app.app_context():
+            results = list(apply_plan(plan, MagicMock()))
+
+        self.assertEqual(1, len(results))
+        self.assertEqual("update", results[0][0]["action"])
+        self.assertIsInstance(results[0][1], KeycloakAPIError)
+        self.reconcile_keycloak_mock.set_client_default_scope.assert_not_called()
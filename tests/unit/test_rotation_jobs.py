@@ -0,0 +1,75 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from rotation_jobs import RotationJobs
+from utils import KeycloakAPIError, ResourceNotFoundError
+
+
+class TestRotationJobs(unittest.TestCase):
+    """
+    Test the staggered client secret rotation jobs
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.keycloak_client_mock = patch("rotation_jobs.keycloak_client").start()
+        self.keycloak_client_mock.stream_all_clients.return_value = [
+            {"id": "1", "clientId": "first", "protocol": "openid-connect"},
+            {"id": "2", "clientId": "second", "protocol": "openid-connect"},
+            {"id": "3", "clientId": "third", "protocol": "openid-connect"},
+            {"id": "4", "clientId": "public", "protocol": "openid-connect", "publicClient": True},
+            {"id": "5", "clientId": "saml", "protocol": "saml"},
+        ]
+        jobs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(jobs_dir.cleanup)
+        self.jobs = RotationJobs()
+        self.jobs.jobs_dir = jobs_dir.name
+        self.jobs.batch_size = 2
+        self.jobs.batch_interval = 0
+        self.jobs.rate_limit = 0
+        self.jobs.max_workers = 2
+        self.jobs.logger = MagicMock()
+        # Run the jobs synchronously
+        self.jobs.start = self.jobs._run
+
+    def test_select_confidential_openid_clients(self):
+        clients = self.jobs.select_clients()
+
+        self.assertEqual(["first", "second", "third"], [client["clientId"] for client in clients])
+        with self.assertRaises(ResourceNotFoundError):
+            self.jobs.select_clients(["first", "public"])
+
+    def test_rotate_in_batches(self):
+        self.keycloak_client_mock.regenerate_client_secret_by_id.side_effect = [
+            None, KeycloakAPIError(500, "Failed"), None
+        ]
+
+        job = self.jobs.create_job(self.jobs.select_clients())
+
+        job = self.jobs.get_job(job["id"])
+        self.assertEqual("completed", job["status"])
+        self.assertEqual(3, job["next"])
+        self.assertEqual(2, job["rotated"])
+        self.assertEqual(1, len(job["failed"]))
+        self.assertEqual(3, self.keycloak_client_mock.regenerate_client_secret_by_id.call_count)
+
+    def test_pause_and_resume(self):
+        start = self.jobs.start
+        self.jobs.start = MagicMock()
+        job = self.jobs.create_job(self.jobs.select_clients())
+        self.jobs.pause(job["id"])
+        start(job["id"])
+
+        self.assertEqual("paused", self.jobs.get_job(job["id"])["status"])
+        self.keycloak_client_mock.regenerate_client_secret_by_id.assert_not_called()
+
+        self.jobs.start = start
+        self.jobs.resume(job["id"])
+
+        self.assertEqual("completed", self.jobs.get_job(job["id"])["status"])
+        self.assertEqual(3, self.keycloak_client_mock.regenerate_client_secret_by_id.call_count)
+
+    def test_job_not_found(self):
+        with self.assertRaises(ResourceNotFoundError):
+            self.jobs.get_job("missing")
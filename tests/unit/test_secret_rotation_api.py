@@ -0,0 +1,89 @@
+import json
+from unittest.mock import patch
+
+from utils import ResourceNotFoundError
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestSecretRotationApi(WebTestBase):
+    """
+    Test the client secret rotation job endpoints
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.rotation_jobs_mock = patch("api_definitions.rotation_jobs").start()
+
+    def _get_endpoint(self):
+        return f"{API_ROOT}/bulk/secret-rotations"
+
+    def test_create_job_invalid_selector(self):
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps({"all": True, "clientIds": ["first"]}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+        self.rotation_jobs_mock.create_job.assert_not_called()
+
+    def test_create_job(self):
+        # prepare
+        clients = [{"clientId": "first", "id": "1"}]
+        self.rotation_jobs_mock.select_clients.return_value = clients
+        self.rotation_jobs_mock.create_job.return_value = {
+            "id": "job", "status": "pending", "clients": clients
+        }
+
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(),
+            data=json.dumps({"clientIds": ["first"], "batchSize": 5}),
+            content_type="application/json",
+        )
+
+        # assert
+        self.assertEqual(202, resp.status_code)
+        self.assertEqual({"id": "job", "status": "pending"}, resp.json["data"])
+        self.rotation_jobs_mock.select_clients.assert_called_once_with(["first"])
+        self.rotation_jobs_mock.create_job.assert_called_once_with(clients, 5, None, None)
+
+    def test_create_job_client_not_found(self):
+        # prepare
+        self.rotation_jobs_mock.select_clients.side_effect = ResourceNotFoundError("not found")
+
+        # act
+        resp = self.app_client.post(
+            self._get_endpoint(), data=json.dumps({"clientIds": ["x"]}), content_type="application/json"
+        )
+
+        # assert
+        self.assertEqual(404, resp.status_code)
+
+    def test_get_job_status(self):
+        # prepare
+        self.rotation_jobs_mock.get_job.return_value = {
+            "id": "job", "status": "running", "next": 20, "total": 100, "clients": []
+        }
+
+        # act
+        resp = self.app_client.get(f"{self._get_endpoint()}/job")
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(
+            {"id": "job", "status": "running", "next": 20, "total": 100}, resp.json["data"]
+        )
+
+    def test_resume_job_not_found(self):
+        # prepare
+        self.rotation_jobs_mock.resume.side_effect = ResourceNotFoundError("not found")
+
+        # act
+        resp = self.app_client.post(f"{self._get_endpoint()}/missing/resume")
+
+        # assert
+        self.assertEqual(404, resp.status_code)
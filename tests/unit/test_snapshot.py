@@ -0,0 +1,271 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from snapshot import SnapshotExporter, SnapshotImporter, read_records
+from utils import KeycloakAPIError
+
+
+class TestSnapshotExport(unittest.TestCase):
+    """
+    Test the export of realm snapshots
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.keycloak_client_mock = patch("snapshot.keycloak_client").start()
+        self.keycloak_client_mock.realm = "test"
+        self.clients = [{"id": f"uuid-{i}", "clientId": f"client-{i}"} for i in range(5)]
+        self.keycloak_client_mock.get_clients_page.side_effect = (
+            lambda first, max_results: self.clients[first:first + max_results]
+        )
+        self.keycloak_client_mock.get_scopes.return_value = [{"id": "1", "name": "email"}]
+        policies = [
+            {"id": "p1", "name": "allow token exchange for client-1", "type": "client",
+             "config": {"clients": '["uuid-1"]'}},
+            {"id": "p2", "name": "token-exchange.permission.client.uuid-0", "type": "scope"},
+        ]
+        self.keycloak_client_mock.get_auth_policies_page.side_effect = (
+            lambda first, max_results: policies[first:first + max_results]
+        )
+        self.keycloak_client_mock.get_permission_associated_policies.return_value = [
+            {"id": "p1", "name": "allow token exchange for client-1"}
+        ]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _records(self, resource):
+        return list(read_records(os.path.join(self.directory, f"{resource}.ndjson.gz")))
+
+    def test_export(self):
+        manifest = SnapshotExporter(self.directory, page_size=2).export()
+
+        self.assertEqual("completed", manifest["status"])
+        self.assertEqual(5, manifest["resources"]["clients"]["count"])
+        self.assertEqual(self.clients, self._records("clients"))
+        self.assertEqual([{"id": "1", "name": "email"}], self._records("scopes"))
+        self.assertEqual(["client-1"], self._records("policies")[0]["clientIds"])
+        permission = self._records("permissions")[0]
+        self.assertEqual("client-0", permission["targetClientId"])
+        self.assertEqual(["allow token exchange for client-1"], permission["policies"])
+        self.assertEqual(SnapshotExporter.read_manifest(self.directory), manifest)
+
+    def test_export_leaves_secrets_out(self):
+        self.clients[0].update(secret="s3cr3t", attributes={"saml.signing.private.key": "key", "saml": "true"})
+
+        manifest = SnapshotExporter(self.directory, page_size=2).export()
+
+        self.assertFalse(manifest["secrets"])
+        client = self._records("clients")[0]
+        self.assertNotIn("secret", client)
+        self.assertEqual({"saml": "true"}, client["attributes"])
+
+    def test_export_includes_requested_secrets(self):
+        self.clients[0]["secret"] = "s3cr3t"
+
+        manifest = SnapshotExporter(self.directory, page_size=2, include_secrets=True).export()
+
+        self.assertTrue(manifest["secrets"])
+        self.assertEqual("s3cr3t", self._records("clients")[0]["secret"])
+
+    def test_export_is_only_accessible_by_its_owner(self):
+        directory = os.path.join(self.directory, "snapshot")
+
+        SnapshotExporter(directory, page_size=2).export()
+
+        self.assertEqual(0o700, os.stat(directory).st_mode & 0o777)
+        for name in os.listdir(directory):
+            self.assertEqual(0o600, os.stat(os.path.join(directory, name)).st_mode & 0o777, name)
+
+    def test_scopes_fetched_once(self):
+        self.keycloak_client_mock.get_scopes.return_value = [{"id": str(i), "name": f"scope-{i}"} for i in range(5)]
+
+        SnapshotExporter(self.directory, page_size=2).export()
+
+        self.assertEqual(5, len(self._records("scopes")))
+        self.keycloak_client_mock.get_scopes.assert_called_once()
+
+    def test_resume_interrupted_export(self):
+        get_page = self.keycloak_client_mock.get_clients_page.side_effect
+
+        def failing_get_page(first, max_results):
+            if first >= 4:
+                raise KeycloakAPIError(503, "Unavailable")
+            return get_page(first, max_results)
+
+        self.keycloak_client_mock.get_clients_page.side_effect = failing_get_page
+        with self.assertRaises(KeycloakAPIError):
+            SnapshotExporter(self.directory, page_size=2).export()
+        self.assertEqual("failed", SnapshotExporter.read_manifest(self.directory)["status"])
+
+        self.keycloak_client_mock.get_clients_page.side_effect = get_page
+        manifest = SnapshotExporter(self.directory, page_size=2).export()
+
+        self.assertEqual("completed", manifest["status"])
+        self.assertEqual(self.clients, self._records("clients"))
+        self.assertEqual(4, self.keycloak_client_mock.get_clients_page.call_args_list[-1][0][0])
+        self.assertEqual("client-0", self._records("permissions")[0]["targetClientId"])
+
+
+class TestSnapshotImport(unittest.TestCase):
+    """
+    Test the import of realm snapshots
+    """
+
+    def setUp(self):
+        self.addCleanup(patch.stopall)
+        self.keycloak_client_mock = patch("snapshot.keycloak_client").start()
+        self.keycloak_client_mock.realm = "test"
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # Export the source realm
+        clients = [
+            {"id": "src-1", "clientId": "same", "protocol": "openid-connect", "defaultClientScopes": ["email"]},
+            {"id": "src-2", "clientId": "changed", "protocol": "openid-connect", "enabled": True},
+            {"id": "src-3", "clientId": "new", "protocol": "saml"},
+            {"id": "src-4", "clientId": "account", "baseUrl": "/realms/source/account/"},
+        ]
+        policies = [
+            {"id": "p1", "name": "allow token exchange for new", "type": "client",
+             "logic": "POSITIVE", "decisionStrategy": "UNANIMOUS", "config": {"clients": '["src-3"]'}},
+            {"id": "p2", "name": "token-exchange.permission.client.src-2", "type": "scope"},
+        ]
+        self.keycloak_client_mock.get_clients_page.side_effect = (
+            lambda first, max_results: clients[first:first + max_results]
+        )
+        self.keycloak_client_mock.get_scopes.return_value = [
+            {"id": "s1", "name": "email", "protocol": "openid-connect"}
+        ]
+        self.keycloak_client_mock.get_auth_policies_page.side_effect = (
+            lambda first, max_results: policies[first:first + max_results]
+        )
+        self.keycloak_client_mock.get_permission_associated_policies.return_value = [
+            {"id": "p1", "name": "allow token exchange for new"}
+        ]
+        SnapshotExporter(self.directory, page_size=10).export()
+        # The target realm
+        self.keycloak_client_mock.reset_mock()
+        self.target_clients = [
+            {"id": "dst-1", "clientId": "same", "protocol": "openid-connect", "secret": "x",
+             "defaultClientScopes": ["email"]},
+            {"id": "dst-2", "clientId": "changed", "protocol": "openid-connect", "enabled": False},
+            {"id": "dst-4", "clientId": "account", "baseUrl": "/realms/test/account/"},
+        ]
+        self.keycloak_client_mock.get_scopes.return_value = [
+            {"id": "t1", "name": "email", "protocol": "openid-connect"}
+        ]
+        self.keycloak_client_mock.stream_all_clients.side_effect = lambda: iter(self.target_clients)
+        self.target_policies = []
+        self.keycloak_client_mock.iter_auth_policies.side_effect = lambda: iter(self.target_policies)
+
+        def partial_import(resources, if_resource_exists):
+            for client in resources["clients"]:
+                self.target_clients.append(dict(client, id="dst-" + client["clientId"]))
+            return [
+                {"action": "ADDED", "resourceType": "CLIENT", "resourceName": client["clientId"]}
+                for client in resources["clients"]
+            ]
+
+        def save_policy(definition, policy_id=None):
+            self.target_policies.append(
+                {"id": "t-" + definition["name"], "name": definition["name"], "type": "client",
+                 "logic": definition["logic"], "decisionStrategy": definition["decisionStrategy"],
+                 "config": {"clients": json.dumps(definition["clients"])}}
+            )
+
+        def set_client_default_scope(client_id, scope_id, request_type):
+            client = next(client for client in self.target_clients if client["id"] == client_id)
+            name = next(scope["name"] for scope in self.keycloak_client_mock.get_scopes() if scope["id"] == scope_id)
+            scopes = set(client.get("defaultClientScopes", []))
+            client["defaultClientScopes"] = sorted(scopes | {name} if request_type == "put" else scopes - {name})
+
+        self.keycloak_client_mock.partial_import.side_effect = partial_import
+        self.keycloak_client_mock.set_client_default_scope.side_effect = set_client_default_scope
+        self.keycloak_client_mock.save_client_policy_definition.side_effect = save_policy
+        self.keycloak_client_mock.set_token_exchange_permission_policies.return_value = True
+
+    def test_import(self):
+        report = SnapshotImporter(self.directory, chunk_size=2).import_snapshot()
+
+        self.assertEqual("completed", report["status"])
+        self.assertEqual({"count": 1, "created": 0, "updated": 0, "skipped": 1},
+                         {key: report["resources"]["scopes"][key] for key in ["count", "created", "updated", "skipped"]})
+        clients = report["resources"]["clients"]
+        self.assertEqual((1, 1, 2), (clients["created"], clients["updated"], clients["skipped"]))
+        self.keycloak_client_mock.save_client_scope.assert_not_called()
+        self.keycloak_client_mock.partial_import.assert_called_once_with(
+            {"clients": [{"clientId": "new", "protocol": "saml"}]}, "SKIP"
+        )
+        self.keycloak_client_mock.update_client_definition.assert_called_once_with(
+            "dst-2", {"clientId": "changed", "protocol": "openid-connect", "enabled": True}
+        )
+        self.assertEqual(
+            ["dst-new"],
+            self.keycloak_client_mock.save_client_policy_definition.call_args[0][0]["clients"],
+        )
+        self.keycloak_client_mock.set_token_exchange_permission_policies.assert_called_once_with(
+            "dst-2", ["t-allow token exchange for new"]
+        )
+        self.assertEqual(report, SnapshotImporter.read_report(self.directory))
+
+    def test_import_is_idempotent(self):
+        SnapshotImporter(self.directory).import_snapshot()
+        self.target_clients[1]["enabled"] = True
+        self.keycloak_client_mock.set_token_exchange_permission_policies.return_value = False
+        self.keycloak_client_mock.reset_mock()
+
+        report = SnapshotImporter(self.directory).import_snapshot()
+
+        self.assertEqual(
+            [0, 0], [report["resources"]["clients"]["created"], report["resources"]["policies"]["created"]]
+        )
+        self.assertEqual(4, report["resources"]["clients"]["skipped"])
+        self.assertEqual(1, report["resources"]["permissions"]["skipped"])
+        self.keycloak_client_mock.partial_import.assert_not_called()
+        self.keycloak_client_mock.update_client_definition.assert_not_called()
+        self.keycloak_client_mock.save_client_policy_definition.assert_not_called()
+
+    def test_import_reconciles_the_default_scopes(self):
+        self.target_clients[0]["defaultClientScopes"] = ["profile"]
+        self.target_clients[1]["enabled"] = True
+        self.keycloak_client_mock.get_scopes.return_value = [
+            {"id": "t1", "name": "email", "protocol": "openid-connect"},
+            {"id": "t2", "name": "profile", "protocol": "openid-connect"},
+        ]
+
+        report = SnapshotImporter(self.directory).import_snapshot()
+
+        self.assertEqual(1, report["resources"]["clients"]["updated"])
+        self.keycloak_client_mock.update_client_definition.assert_not_called()
+        self.assertEqual(
+            [("dst-1", "t1", "put"), ("dst-1", "t2", "delete")],
+            [call[0] for call in self.keycloak_client_mock.set_client_default_scope.call_args_list],
+        )
+        self.keycloak_client_mock.reset_mock()
+
+        report = SnapshotImporter(self.directory).import_snapshot()
+
+        self.assertEqual((0, 4), (report["resources"]["clients"]["updated"], report["resources"]["clients"]["skipped"]))
+        self.keycloak_client_mock.set_client_default_scope.assert_not_called()
+
+    def test_import_reports_missing_default_scopes(self):
+        self.target_clients[0]["defaultClientScopes"] = []
+        self.keycloak_client_mock.get_scopes.return_value = []
+
+        report = SnapshotImporter(self.directory).import_snapshot()
+
+        self.assertIn("same", report["resources"]["clients"]["failed"])
+        self.keycloak_client_mock.set_client_default_scope.assert_not_called()
+
+    def test_import_reports_failed_records(self):
+        self.keycloak_client_mock.update_client_definition.side_effect = KeycloakAPIError(500, "Error")
+
+        report = SnapshotImporter(self.directory).import_snapshot()
+
+        self.assertEqual("completed with errors", report["status"])
+        self.assertEqual(["changed"], list(report["resources"]["clients"]["failed"]))
+        self.assertEqual(1, report["resources"]["permissions"]["updated"])
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+from utils import ResourceNotFoundError
+
+from tests.utils.tools import API_ROOT, WebTestBase
+
+
+class TestSnapshotApi(WebTestBase):
+    """
+    Test the realm snapshot endpoints
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.snapshots_mock = patch("api_definitions.snapshots").start()
+
+    def _get_endpoint(self, path=""):
+        return f"{API_ROOT}/bulk/snapshots{path}"
+
+    def test_start_export(self):
+        # prepare
+        self.snapshots_mock.start_export.return_value = "20260101T000000Z"
+
+        # act
+        resp = self.app_client.post(self._get_endpoint())
+
+        # assert
+        self.assertEqual(202, resp.status_code)
+        self.assertEqual({"id": "20260101T000000Z"}, resp.json["data"])
+        self.snapshots_mock.start_export.assert_called_once_with(include_secrets=False)
+
+    def test_start_export_with_secrets(self):
+        # prepare
+        self.snapshots_mock.start_export.return_value = "20260101T000000Z"
+
+        # act
+        resp = self.app_client.post(self._get_endpoint("?includeSecrets=true"))
+
+        # assert
+        self.assertEqual(202, resp.status_code)
+        self.assertEqual({"id": "20260101T000000Z"}, resp.json["data"])
+        self.snapshots_mock.start_export.assert_called_once_with(include_secrets=True)
+
+    def test_get_manifest_not_found(self):
+        # prepare
+        self.snapshots_mock.get_manifest.side_effect = ResourceNotFoundError("not found")
+
+        # act
+        resp = self.app_client.get(self._get_endpoint("/missing"))
+
+        # assert
+        self.assertEqual(404, resp.status_code)
+
+    def test_start_import(self):
+        # act
+        resp = self.app_client.post(self._get_endpoint("/snap/import"))
+
+        # assert
+        self.assertEqual(202, resp.status_code)
+        self.snapshots_mock.start_import.assert_called_once_with("snap")
+
+    def test_start_import_incomplete_export(self):
+        # prepare
+        self.snapshots_mock.start_import.side_effect = ValueError("not completed")
+
+        # act
+        resp = self.app_client.post(self._get_endpoint("/snap/import"))
+
+        # assert
+        self.assertEqual(400, resp.status_code)
+
+    def test_get_import_report(self):
+        # prepare
+        report = {"status": "completed", "resources": {}}
+        self.snapshots_mock.get_import_report.return_value = report
+
+        # act
+        resp = self.app_client.get(self._get_endpoint("/snap/import"))
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(report, resp.json["data"])
+        self.snapshots_mock.get_import_report.assert_called_once_with("snap")
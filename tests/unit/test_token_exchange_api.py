@@ -16,12 +16,14 @@ class TestTokenExchangePermissions(WebTestBase):
     def _get_endpoint(self):
         return f"{API_ROOT}/client/openid/{self.target_client}/token-exchange-permissions/{self.requestor_client}"
 
+    def _set_clients(self, target, requestor):
+        # The clients are looked up concurrently
+        clients = {self.target_client: target, self.requestor_client: requestor}
+        self.keycloak_api_mock.get_client_object.side_effect = clients.get
+
     def test_delete_token_exchange_missing_client(self):
         # prepare
-        self.keycloak_api_mock.get_client_object.side_effect = [
-            Client(client_id=self.target_client, app=self.app),
-            None,
-        ]
+        self._set_clients(Client(client_id=self.target_client, app=self.app), None)
 
         # act
         resp = self.app_client.delete(self._get_endpoint())
@@ -31,10 +33,10 @@ class TestTokenExchangePermissions(WebTestBase):
 
     def test_delete_token_exchange_bad_response(self):
         # prepare
-        self.keycloak_api_mock.get_client_object.side_effect = [
+        self._set_clients(
             Client(client_id=self.target_client, app=self.app),
             Client(client_id=self.requestor_client, app=self.app),
-        ]
+        )
         self.keycloak_api_mock.revoke_token_exchange_permissions.side_effect = ValueError(
             "Clients not found"
         )
@@ -48,10 +50,7 @@ class TestTokenExchangePermissions(WebTestBase):
 
     def test_delete_token_exchange_ok(self):
         # prepare
-        self.keycloak_api_mock.get_client_object.side_effect = [
-            self.target_client,
-            self.requestor_client,
-        ]
+        self._set_clients(self.target_client, self.requestor_client)
         self.keycloak_api_mock.revoke_token_exchange_permissions.return_value.status_code = (
             200
         )
@@ -65,10 +64,10 @@ class TestTokenExchangePermissions(WebTestBase):
 
     def test_delete_token_exchange_problem_removing(self):
         # prepare
-        self.keycloak_api_mock.get_client_object.side_effect = [
+        self._set_clients(
             Client(client_id=self.target_client, app=self.app),
             Client(client_id=self.requestor_client, app=self.app),
-        ]
+        )
         self.keycloak_api_mock.revoke_token_exchange_permissions.return_value.status_code = (
             500
         )
@@ -85,10 +84,7 @@ class TestTokenExchangePermissions(WebTestBase):
 
     def test_grant_token_exchange_missing_client(self):
         # prepare
-        self.keycloak_api_mock.get_client_object.side_effect = [
-            Client(client_id=self.target_client, app=self.app),
-            None,
-        ]
+        self._set_clients(Client(client_id=self.target_client, app=self.app), None)
 
         # act
         resp = self.app_client.put(self._get_endpoint())
@@ -100,10 +96,7 @@ class TestTokenExchangePermissions(WebTestBase):
         # prepare
         target = Client(client_id=self.target_client, app=self.app)
         requestor = Client(client_id=self.requestor_client, app=self.app)
-        self.keycloak_api_mock.get_client_object.side_effect = [
-            target,
-            requestor,
-        ]
+        self._set_clients(target, requestor)
         self.keycloak_api_mock.grant_token_exchange_permissions.return_value.status_code = (
             400
         )
@@ -121,14 +114,26 @@ class TestTokenExchangePermissions(WebTestBase):
             target, requestor
         )
 
+    def test_grant_token_exchange_already_granted(self):
+        # prepare
+        self._set_clients(
+            Client(client_id=self.target_client, app=self.app),
+            Client(client_id=self.requestor_client, app=self.app),
+        )
+        self.keycloak_api_mock.grant_token_exchange_permissions.return_value = None
+
+        # act
+        resp = self.app_client.put(self._get_endpoint())
+
+        # assert
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual("already granted", resp.json.casefold())
+
     def test_grant_token_exchange_creation_ok(self):
         # prepare
         target = Client(client_id=self.target_client, app=self.app)
         requestor = Client(client_id=self.requestor_client, app=self.app)
-        self.keycloak_api_mock.get_client_object.side_effect = [
-            target,
-            requestor,
-        ]
+        self._set_clients(target, requestor)
         self.keycloak_api_mock.grant_token_exchange_permissions.return_value.status_code = (
             200
         )
@@ -0,0 +1,37 @@
+import unittest
+
+from utils import run_concurrently
+
+
+class TestUtils(unittest.TestCase):
+    """
+    Test the helpers shared by the API and the Keycloak client
+    """
+
+    def test_run_concurrently_reports_every_item(self):
+        def invert(value):
+            return 1 / value
+
+        results = {
+            item: (result, error)
+            for item, result, error in run_concurrently(invert, [1, 2, 0], max_workers=2)
+        }
+
+        self.assertEqual((1.0, None), results[1])
+        self.assertEqual((0.5, None), results[2])
+        self.assertIsNone(results[0][0])
+        self.assertIsInstance(results[0][1], ZeroDivisionError)
+
+    def test_run_concurrently_reads_items_lazily(self):
+        consumed = []
+
+        def items():
+            for item in range(100):
+                consumed.append(item)
+                yield item
+
+        results = run_concurrently(lambda item: item, items(), max_workers=2)
+        first, _, _ = next(results)
+
+        self.assertLess(len(consumed), 100)
+        self.assertEqual(list(range(100)), sorted([first] + [item for item, _, _ in results]))
@@ -55,6 +55,10 @@ class WebTestBase(unittest.TestCase, metaclass=ABCMeta):
         self.keycloak_api_init_mock = patch(
             "app_factory.keycloak_client.init_app"
         ).start()
+        self.rotation_jobs_init_mock = patch("app_factory.rotation_jobs.init_app").start()
+        self.client_index_init_mock = patch("app_factory.client_index.init_app").start()
+        self.client_sync_init_mock = patch("app_factory.client_sync.init_app").start()
+        self.snapshots_init_mock = patch("app_factory.snapshots.init_app").start()
         self.keycloak_api_mock = patch("api_definitions.keycloak_client").start()
         self.keycloak_api_mock.CREDENTIAL_TYPE_OTP = CREDENTIAL_TYPE_OTP
         self.keycloak_api_mock.CREDENTIAL_TYPE_WEBAUTHN = CREDENTIAL_TYPE_WEBAUTHN
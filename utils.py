@@ -1,8 +1,15 @@
+import base64
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from typing import Dict
 from xml.etree import ElementTree as ET
-from flask import make_response, jsonify, current_app
+from flask import make_response, jsonify, current_app, Response, stream_with_context
 
 JSON_MIME_TYPE = "application/json"
+NDJSON_MIME_TYPE = "application/x-ndjson"
 
 
 def get_supported_protocols() -> Dict[str, str]:
@@ -17,6 +24,67 @@ def json_response(data="", status=200, headers=None):
     return make_response(json_data, status, headers)
 
 
+def ndjson_response(items, status=200):
+    """
+    Streams the items as newline delimited JSON, as they are produced
+    """
+    lines = (json.dumps(item) + "\n" for item in items)
+    return Response(stream_with_context(lines), status, mimetype=NDJSON_MIME_TYPE)
+
+
+def json_array_response(items, status=200):
+    """
+    Streams the items as a JSON array, as they are produced
+    """
+
+    def chunks():
+        separator = "["
+        for item in items:
+            yield separator + json.dumps(item)
+            separator = ","
+        yield "[]" if separator == "[" else "]"
+
+    return Response(stream_with_context(chunks()), status, mimetype=JSON_MIME_TYPE)
+
+
+def encode_cursor(position):
+    """
+    Encodes a paging position as an opaque cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor created by `encode_cursor`. Raises ValueError if it is not valid.
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def get_request_items(request):
+    """
+    Gets the items of a bulk request, sent either as a JSON array or as newline delimited JSON
+    Lines that are not valid JSON are returned as strings. Returns None if there is no list.
+    """
+    if request.mimetype == NDJSON_MIME_TYPE:
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(line)
+        return items
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return None
+    return data
+
+
 def get_request_data(request):
     """
     Gets the data from the request
@@ -66,10 +134,67 @@ def validate_protocol_data(data, supported_protocols: Dict[str, str]):
     return validate_protocol(data["protocol"], supported_protocols)
 
 
+def run_concurrently(func, items, max_workers):
+    """
+    Calls `func` on every item using a bounded pool of threads
+    Yields (item, result, error) tuples as the calls finish. error is None on success.
+    The items are read lazily, a few calls ahead of the running ones, so they can be a stream.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+
+        def submit(count):
+            for item in islice(items, count):
+                futures[executor.submit(func, item)] = item
+
+        submit(2 * max_workers)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            submit(len(done))
+            for future in done:
+                error = future.exception()
+                result = None if error else future.result()
+                yield futures.pop(future), result, error
+
+
+class RateLimiter:
+    """
+    Spaces out calls shared by several threads to at most `rate` per second
+    A rate of 0 or None means no limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_call = time.monotonic()
+
+    def wait(self):
+        """
+        Blocks until the caller is allowed to make its call
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
 class ResourceNotFoundError(Exception):
     pass
 
 
+class ClientDefinitionError(Exception):
+    pass
+
+
+class UserDefinitionError(Exception):
+    pass
+
+
 class KeycloakAPIError(Exception):
     def __init__(self, status_code, message):
         obj = {"status_code": status_code, "message": message}